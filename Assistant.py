@@ -1,53 +1,174 @@
-import pickle
+import signal
+import threading
 from pathlib import Path
+from Backup import Backup
+from BaseClasses import ErrorWithMsg, EventBus, RWLock
+from Books import Books
 from CLIBot import CLIBot
+from client import get_socket_path, is_running
 from Contacts import Contacts
+from HTTPFront import HTTPFront
 from Notes import Notes
+from Scheduler import Scheduler
+from Search import Search
+from Sync import Sync
 
 
 class Assistant:
+    # how long to wait for other frontends when the main one finished
+    STOP_TIMEOUT = 5
+
     def __init__(self, filename: str) -> None:
         self.filename = Path(__file__).parent / filename
-        self.front_list = ["cli_bot"]
+        # the first frontend owns the terminal and runs in the main thread
+        self.front_list = ["cli_bot", "http"]
+        self.lock = RWLock()
+        self.file_lock = threading.Lock()
         self.items = {
             "cli_bot": CLIBot(),
-            "contacts": Contacts(),
-            "notes": Notes(),
+            "http": HTTPFront(),
         }
-        self.load_from_file()
-        items = self.items.values()
+        for i in self.front_list:
+            self.items[i].set_save_handler(self.save_to_file)
+            self.items[i].set_lock(self.lock)
+
+        # due events are shown by the main frontend
+        self.scheduler = Scheduler(
+            self.lock, self.items[self.front_list[0]].notify
+        )
+        # changes of records reschedule their events, update sync hashes and
+        # the search index
+        self.bus = EventBus()
+        self.bus.subscribe(self.records_changed)
+        self.books = Books(self.filename, self.new_book, self.file_lock)
+        self.books.set_handlers(
+            self.book_loaded, self.book_unloaded, self.book_used
+        )
+        self.sync = Sync(self.books)
+        self.sync.set_save_handler(self.save_to_file)
+        self.backup = Backup(self.books, self.file_lock)
+        self.search = Search(self.books)
+        # settings are loaded first, they configure the books
+        self.books.load_default_book(
+            {
+                "cli_bot": self.items["cli_bot"],
+                "sync": self.sync,
+                "backup": self.backup,
+                "search": self.search,
+            }
+        )
+        self.books.use(self.books.data["active"])
+
+    def new_book(self):
+        return {"contacts": Contacts(), "notes": Notes()}
+
+    def book_loaded(self, book):
+        for name, cmd_provider in book.cmd_providers.items():
+            cmd_provider.set_event_bus(self.bus)
+            self.scheduler.add_provider((book.name, name), cmd_provider)
+            self.search.add_provider((book.name, name), cmd_provider)
+        self.sync.add_book(book)
 
+    def book_unloaded(self, book):
+        for name in book.cmd_providers:
+            self.scheduler.remove_provider((book.name, name))
+            self.search.remove_provider((book.name, name))
+        self.sync.drop_book(book.name)
+
+    def book_used(self, book):
+        # items which keep data in the file
+        self.cmd_providers = self.books.get_cmd_providers()
+        self.items.update(self.cmd_providers)
+        items = list(self.cmd_providers.values())
         for i in self.front_list:
             self.items[i].set_cmd_providers(items)
-            self.items[i].set_save_handler(self.save_to_file)
 
     def load_from_file(self):
-        try:
-            with open(self.filename, "rb") as f:
-                data = pickle.load(f)
-                for d in data:
-                    if d in self.items:
-                        self.items[d].set_from_file(data[d])
-        except:
-            pass
-
-    def save_to_file(self):
-        # TODO: add lock mechanism for multi-frontend case
-        data = {}
-        for d in self.items:
-            data[d] = self.items[d].get_for_file()
-        with open(self.filename, "wb") as f:
-            pickle.dump(data, f)
+        """Reloads the book in use"""
+        self.books.active.load_from_file()
+        self.sync.drop_book(self.books.active.name)
+        self.sync.add_book(self.books.active)
+        self.search.drop_book(self.books.active.name)
 
-    def run(self, front_name="cli_bot"):
-        if front_name == "all":
-            print("#TODO: implement run all frontends in different threads")
+    def save_to_file(self, cmd_provider=None, keys=None):
+        """Saves all books or records with the keys of cmd_provider under
+        a read lock of the store, returns number of written bytes"""
+        if cmd_provider is None:
+            return self.books.save_all_to_file()
+        book = self.books.find_book(cmd_provider)
+        if book is None:
+            # another frontend unloaded the book while the command ran
+            raise ErrorWithMsg(Books.BOOK_UNLOADED_MSG)
+        return book.save_to_file(cmd_provider, keys)
+
+    def records_changed(self, events):
+        """Subscriber of the bus, the committing thread holds the lock"""
+        # providers may be unhashable (UserDict)
+        changed = {}
+        for event in events:
+            cmd_provider, keys = changed.setdefault(
+                id(event.cmd_provider), (event.cmd_provider, {})
+            )
+            keys[event.key] = True
+        for cmd_provider, keys in changed.values():
+            book = self.books.find_book(cmd_provider)
+            if book is None:
+                continue
+            name = book.item_name(cmd_provider)
+            self.scheduler.update((book.name, name), keys)
+            self.search.update((book.name, name), keys)
+            self.sync.update(
+                book.name, name, cmd_provider.get_for_file(), keys
+            )
+
+    def save_all_to_file(self):
+        return self.books.save_all_to_file()
+
+    def run_all(self):
+        threads = []
+        for name in self.front_list[1:]:
+            thread = threading.Thread(
+                target=self.items[name].run, name=name, daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+
+        self.items[self.front_list[0]].run()
+
+        for name in self.front_list[1:]:
+            self.items[name].stop()
+        for thread in threads:
+            thread.join(Assistant.STOP_TIMEOUT)
+        with self.lock.read_lock():
+            self.save_to_file()
+
+    def run_daemon(self):
+        """Keeps the store in memory and serves assistant-cmd clients"""
+        socket_path = get_socket_path()
+        if is_running(socket_path):
+            print(f'ERROR: Daemon is already running on "{socket_path}"')
             return False
+        front = self.items["http"]
+        front.unix_socket = socket_path
+        signal.signal(signal.SIGTERM, lambda signum, frame: front.stop())
+        front.run()
+        return True
 
-        if not front_name in self.front_list:
+    def run(self, front_name="cli_bot"):
+        if front_name == "all":
+            run_front = self.run_all
+        elif front_name == "daemon":
+            run_front = self.run_daemon
+        elif front_name in self.front_list:
+            run_front = self.items[front_name].run
+        else:
             print(f'ERROR: Can not find frontend "{front_name}"')
             return False
 
-        self.items[self.front_list[0]].run()
+        self.scheduler.start()
+        try:
+            ret = run_front()
+        finally:
+            self.scheduler.stop()
 
-        return True
+        return ret is not False
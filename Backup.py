@@ -0,0 +1,276 @@
+import os
+import pickle
+import re
+import sys
+import zlib
+from datetime import datetime
+from hashlib import blake2b
+from pathlib import Path
+
+from BaseClasses import *
+from Blobs import BlobStore
+from Books import Book
+
+# chunks are cut only before these bytes (MEMOIZE and a short string),
+# they start most of objects in pickles of records
+CUT_MARKER = re.compile(rb"\x94\x8c")
+# a marker is a cut point if crc32 of WINDOW bytes before it is divisible
+# by CUT_RATIO, so cut points depend only on the nearby content
+WINDOW = 32
+CUT_RATIO = 8
+MIN_CHUNK = 2 * 1024
+# data without markers (e.g. compressed blobs) is cut by this size
+MAX_CHUNK = 64 * 1024
+
+
+def split_chunks(data):
+    """Yields content-defined chunks, an insertion changes only chunks
+    around it"""
+    start = 0
+    for match in CUT_MARKER.finditer(data):
+        pos = match.start()
+        while pos - start > MAX_CHUNK:
+            yield data[start : start + MAX_CHUNK]
+            start += MAX_CHUNK
+        if pos - start < MIN_CHUNK:
+            continue
+        if zlib.crc32(data[pos - WINDOW : pos]) % CUT_RATIO == 0:
+            yield data[start:pos]
+            start = pos
+    while len(data) - start > MAX_CHUNK:
+        yield data[start : start + MAX_CHUNK]
+        start += MAX_CHUNK
+    if start < len(data):
+        yield data[start:]
+
+
+class ChunkStore:
+    """Chunks kept once in a BlobStore, found by their hashes"""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.blobs = BlobStore(self.directory / "chunks.blobs")
+        self.index_filename = self.directory / "chunks.index"
+        self.index = None
+
+    def load(self):
+        self.index = {}
+        if self.index_filename.exists():
+            with open(self.index_filename, "rb") as f:
+                self.index = pickle.load(f)
+        return self
+
+    def put(self, chunk):
+        """Returns hash of the chunk and number of written bytes"""
+        chunk_hash = blake2b(chunk, digest_size=16).digest()
+        if chunk_hash in self.index:
+            return chunk_hash, 0
+        ref = self.blobs.put(chunk)
+        self.index[chunk_hash] = ref
+        return chunk_hash, ref[1]
+
+    def get(self, chunk_hash):
+        return self.blobs.get(self.index[chunk_hash])
+
+    def save_index(self):
+        # chunks are written first, a broken backup leaves unused chunks
+        tmp_filename = self.index_filename.with_name("chunks.index.tmp")
+        with open(tmp_filename, "wb") as f:
+            pickle.dump(self.index, f)
+        os.replace(tmp_filename, self.index_filename)
+
+    def close(self):
+        self.blobs.close()
+
+
+def list_snapshots(directory):
+    """Returns {name: snapshot} of the backup directory, oldest first"""
+    snapshots = {}
+    for path in Path(directory).glob("*.snapshot"):
+        with open(path, "rb") as f:
+            snapshots[path.stem] = pickle.load(f)
+    return dict(sorted(snapshots.items(), key=lambda item: item[1]["time"]))
+
+
+def restore_snapshot(directory, name, target_dir):
+    """Writes files of the snapshot to target_dir, returns their names,
+    only the backup directory is needed"""
+    path = Path(directory) / f"{name}.snapshot"
+    if not path.exists():
+        raise ErrorWithMsg(f"Snapshot '{name}' is not found")
+    with open(path, "rb") as f:
+        snapshot = pickle.load(f)
+    target_dir = Path(target_dir)
+    target_dir.mkdir(parents=True, exist_ok=True)
+    chunks = ChunkStore(directory).load()
+    try:
+        for filename, chunk_hashes in snapshot["files"].items():
+            with open(target_dir / filename, "wb") as f:
+                for chunk_hash in chunk_hashes:
+                    f.write(chunks.get(chunk_hash))
+    finally:
+        chunks.close()
+    return list(snapshot["files"].keys())
+
+
+class SnapshotName(Field):
+    def validate(self, name: str):
+        name = name.strip()
+        if re.fullmatch(r"\d{8}-\d{6}(-\d+)?", name):
+            return name
+        raise ErrorWithMsg("Snapshot name must be like 20240101-120000")
+
+
+class DirName(Field):
+    def validate(self, name: str):
+        name = name.strip()
+        if len(name) == 0:
+            raise ErrorWithMsg("Directory can not be empty")
+        return name
+
+
+class Backup(CmdProvider):
+    """Incremental backups of the books, files are kept as content-defined
+    chunks and every chunk is written once"""
+
+    BACKUP_DONE_MSG = "Snapshot '{}': {} file(s), {} KB, {} KB written"
+    SNAPSHOT_FORMAT = "  {:<18} {:>12} {:>12}"
+    RESTORED_MSG = "Restored {} to '{}', copy them over the data files"
+    NO_SNAPSHOTS_MSG = "There are no backups"
+
+    cmds_help = (
+        Cmd(
+            "backup",
+            "backup",
+            "Take a snapshot of all books, only changed parts are written",
+        ),
+        Cmd("backups", "backups", "Show snapshots of the books"),
+        Cmd(
+            "restore-backup",
+            "restore-backup",
+            "Write files of a snapshot to a directory",
+            args=(
+                CmdArg("snapshot", SnapshotName, "Snapshot: "),
+                CmdArg("dir", DirName, "Directory: "),
+            ),
+        ),
+    )
+
+    def __init__(self, books, file_lock):
+        self.books = books
+        self.file_lock = file_lock
+        self.directory = books.filename.with_name(
+            books.filename.name + ".backup"
+        )
+        self.cmds = {
+            "backup": self.backup,
+            "backups": self.show_backups,
+            "restore-backup": self.restore_backup,
+        }
+
+    def help(self):
+        return Backup.cmds_help
+
+    def exe(self, cmd, args, get_extra_data_from_user_handler):
+        return self.cmds[cmd](args, get_extra_data_from_user_handler)
+
+    def get_for_file(self):
+        return {}
+
+    def set_from_file(self, data):
+        pass
+
+    def get_files(self):
+        """Existing files of all books, loaded or not"""
+        files = []
+        for name in self.books.get_names():
+            filenames = Book.get_filenames(self.books.get_filename(name))
+            files.extend(path for path in filenames if path.exists())
+        return files
+
+    def take_snapshot(self):
+        """Returns name and the new snapshot with its size and written
+        bytes"""
+        self.directory.mkdir(exist_ok=True)
+        name = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = self.directory / f"{name}.snapshot"
+        num = 0
+        while path.exists():
+            num += 1
+            path = self.directory / f"{name}-{num}.snapshot"
+        chunks = ChunkStore(self.directory).load()
+        snapshot = {"time": datetime.now(), "files": {}, "size": 0}
+        written = 0
+        try:
+            # nothing is written to the files meanwhile
+            with self.file_lock:
+                for filename in self.get_files():
+                    data = filename.read_bytes()
+                    chunk_hashes = []
+                    for chunk in split_chunks(data):
+                        chunk_hash, chunk_written = chunks.put(chunk)
+                        chunk_hashes.append(chunk_hash)
+                        written += chunk_written
+                    snapshot["files"][filename.name] = chunk_hashes
+                    snapshot["size"] += len(data)
+            snapshot["written"] = written
+            chunks.save_index()
+        finally:
+            chunks.close()
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(snapshot, f)
+        os.replace(tmp_path, path)
+        return path.stem, snapshot
+
+    def backup(self, args, get_extra_data_from_user_handler):
+        if len(args) > 0:
+            raise ValueError
+        name, snapshot = self.take_snapshot()
+        return Backup.BACKUP_DONE_MSG.format(
+            name,
+            len(snapshot["files"]),
+            (snapshot["size"] + 1023) // 1024,
+            (snapshot["written"] + 1023) // 1024,
+        )
+
+    def show_backups(self, args, get_extra_data_from_user_handler):
+        if len(args) > 0:
+            raise ValueError
+        snapshots = list_snapshots(self.directory)
+        if len(snapshots) == 0:
+            raise ErrorWithMsg(Backup.NO_SNAPSHOTS_MSG)
+        txt_list = [
+            Backup.SNAPSHOT_FORMAT.format("Snapshot", "Size", "Written")
+        ]
+        for name, snapshot in snapshots.items():
+            txt_list.append(
+                Backup.SNAPSHOT_FORMAT.format(
+                    name,
+                    f"{(snapshot['size'] + 1023) // 1024} KB",
+                    f"{(snapshot['written'] + 1023) // 1024} KB",
+                )
+            )
+        return txt_list
+
+    def restore_backup(self, args, get_extra_data_from_user_handler):
+        if len(args) > 0:
+            raise ValueError
+        list_of_types, list_of_prompts = self.cmd_args("restore-backup")
+        data = get_extra_data_from_user_handler(
+            list_of_types, list_of_prompts, mandatory_all_entries=True
+        )
+        target_dir = data[1].value
+        files = restore_snapshot(self.directory, data[0].value, target_dir)
+        return Backup.RESTORED_MSG.format(", ".join(files), target_dir)
+
+
+if __name__ == "__main__":
+    # offline restore: python Backup.py <backup dir> [<snapshot> <dir>]
+    if len(sys.argv) == 2:
+        for name, snapshot in list_snapshots(sys.argv[1]).items():
+            print(name, ", ".join(snapshot["files"]))
+    elif len(sys.argv) == 4:
+        print(restore_snapshot(*sys.argv[1:]))
+    else:
+        print("Usage: python Backup.py <backup dir> [<snapshot> <dir>]")
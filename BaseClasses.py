@@ -1,5 +1,9 @@
+import re
+import threading
 from abc import ABC, abstractmethod
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from copy import deepcopy
 from datetime import datetime, timedelta, time, date
 from calendar import isleap, day_name
 from rich.console import Console, Text
@@ -9,6 +13,36 @@ class ErrorWithMsg(Exception):
     pass
 
 
+# marks a record which did not exist before a command touched it
+MISSING = object()
+# time of events (birthdays, reminders) given without time of day
+DEFAULT_EVENT_TIME = time(9, 0)
+
+# the same values as strptime() with "%d.%m.%Y" and "%H:%M" accepts
+DATE_PATTERN = re.compile(r"(\d\d?| \d)\.(\d\d?)\.(\d{4})")
+TIME_PATTERN = re.compile(r"(\d\d?):(\d\d?)")
+
+
+def parse_date(text):
+    """Returns date of DD.MM.YYYY text, raises ValueError
+
+    It is several times faster than datetime.strptime().
+    """
+    match = DATE_PATTERN.fullmatch(text)
+    if match is None:
+        raise ValueError(f"Invalid date: {text}")
+    day, month, year = match.groups()
+    return date(int(year), int(month), int(day))
+
+
+def parse_time(text):
+    """Returns time of HH:MM text, raises ValueError"""
+    match = TIME_PATTERN.fullmatch(text)
+    if match is None:
+        raise ValueError(f"Invalid time: {text}")
+    return time(int(match[1]), int(match[2]))
+
+
 class Field(ABC):
     """Base class for every field"""
 
@@ -40,15 +74,162 @@ class Field(ABC):
         """Must raise an exception if not valid or return a value"""
         raise ErrorWithMsg("Unknown value validator")
 
+    @classmethod
+    def from_valid(cls, value):
+        """Field with a value returned by validate(), it is not validated
+        again"""
+        field = cls.__new__(cls)
+        field.__value = value
+        return field
+
+    @classmethod
+    def validate_column(cls, values):
+        """Returns validated values, valid mask and errors of raw values,
+        every distinct value is validated once"""
+        validate = cls.__new__(cls).validate
+        checked = {None: (None, None)}
+        results, mask, errors = [], [], []
+        for value in values:
+            result = checked.get(value)
+            if result is None:
+                try:
+                    result = (validate(value), None)
+                except ErrorWithMsg as e:
+                    result = (None, str(e))
+                checked[value] = result
+            results.append(result[0])
+            mask.append(result[1] is None)
+            errors.append(result[1])
+        return results, mask, errors
+
+
+class CmdArg:
+    """Argument of a command: its name, Field type and prompt for the user"""
+
+    def __init__(self, name, _type, prompt):
+        self.name = name
+        self.type = _type
+        self.prompt = prompt
+
+
+class Cmd:
+    """Command of CmdProvider, a mutating one runs inside a Transaction,
+    args are CmdArgs in the order they are asked"""
+
+    def __init__(self, name, usage, description, mutating=False, args=()):
+        self.name = name
+        self.usage = usage
+        self.description = description
+        self.mutating = mutating
+        self.args = args
+
+
+class ChangeEvent:
+    """Change of a field of a committed record, field "*" means the record
+    was added or deleted"""
+
+    def __init__(self, cmd_provider, key, field, old, new):
+        self.cmd_provider = cmd_provider
+        self.key = key
+        self.field = field
+        self.old = old
+        self.new = new
+
+    def __repr__(self):
+        return f"ChangeEvent({self.key!r}, {self.field!r})"
+
+
+def get_change_events(cmd_provider, key, old, new):
+    """ChangeEvents of a record, old or new is MISSING if there was none"""
+    if old is MISSING or new is MISSING or type(old) is not type(new):
+        old = None if old is MISSING else old
+        new = None if new is MISSING else new
+        return [ChangeEvent(cmd_provider, key, "*", old, new)]
+    if not hasattr(new, "__dict__"):
+        if old == new:
+            return []
+        return [ChangeEvent(cmd_provider, key, "*", old, new)]
+    old_fields, new_fields = vars(old), vars(new)
+    events = []
+    for field in sorted(old_fields.keys() | new_fields.keys()):
+        old_value = old_fields.get(field)
+        new_value = new_fields.get(field)
+        if old_value != new_value:
+            events.append(
+                ChangeEvent(cmd_provider, key, field, old_value, new_value)
+            )
+    return events
+
+
+class EventBus:
+    """Delivers ChangeEvents of committed records to subscribers, they are
+    called under the store lock, so they must be quick"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.handlers = []
+
+    def subscribe(self, handler):
+        """handler(events) gets the list of events of every commit"""
+        with self.lock:
+            self.handlers = self.handlers + [handler]
+
+    def unsubscribe(self, handler):
+        with self.lock:
+            self.handlers = [h for h in self.handlers if h != handler]
+
+    def publish(self, events):
+        for handler in self.handlers:
+            handler(events)
+
+
+class MemoCache:
+    """LRU cache of results until their data is changed, it has its own
+    lock as readers share the store lock"""
+
+    def __init__(self, size):
+        self.size = size
+        # the key of a result has the version of the data it was made of
+        self.version = 0
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        with self.lock:
+            self.version += 1
+            self.results.clear()
+
+    def get(self, key, compute):
+        """Returns a copy of the list compute() made for the key"""
+        with self.lock:
+            key = (self.version, *key)
+            if key in self.results:
+                self.results.move_to_end(key)
+            else:
+                self.results[key] = compute()
+                if len(self.results) > self.size:
+                    self.results.popitem(last=False)
+            return list(self.results[key])
+
 
 class CmdProvider(ABC):
-    #   __cmds_help_example = (
-    #        ("cmd1", "cmd1 <arg>",          "cmd1 is used to call cmd1"),
-    #        ("cmd2", "cmd1 <arg1>, <arg2>", "cmd2 is used to call cmd2"),
+    # errors of a rejected batch which are shown
+    BATCH_ERRORS_SHOWN = 10
+    BATCH_REJECTED_MSG = "Batch is rejected, {} invalid item(s):"
+    NO_SAVE_HANDLER_MSG = "Records can not be applied without saving"
+    # field -> weight in the search command, records are not searched if
+    # it is empty, see get_search_fields()
+    SEARCH_WEIGHTS = {}
+
+    #   cmds_help = (
+    #        Cmd("cmd1", "cmd1 <arg>", "cmd1 is used to call cmd1"),
+    #        Cmd("cmd2", "cmd2", "cmd2 changes a record", mutating=True,
+    #            args=(CmdArg("arg", Field, "Arg: "),)),
     #   )
 
     @abstractmethod
     def exe(self, cmd, args, get_extra_data_from_user_handler):
+        # returns a string, a list or an iterator (rendered lazily) of lines
         raise ErrorWithMsg("Unknown exe()")
         # if cmd == "cmd1":
         # return self.cmd1(args)
@@ -57,7 +238,7 @@ class CmdProvider(ABC):
     def help(self):
         raise ErrorWithMsg("Unknown help()")
         return []
-        # return _Your_class_name_.__cmds_example
+        # return _Your_class_name_.cmds_help
 
     @abstractmethod
     def get_for_file(self):
@@ -72,6 +253,266 @@ class CmdProvider(ABC):
     def welcome_message(self):
         return None
 
+    def get_next_event(self, key, after):
+        """Returns (datetime, text) of the next event of the record after
+        given datetime or None"""
+        return None
+
+    def get_search_fields(self, key):
+        """Returns [(field, text)] of the record for the search command,
+        fields are weighted by SEARCH_WEIGHTS"""
+        return []
+
+    def set_blob_store(self, store):
+        """Sets BlobStore of the book, large values may be kept there"""
+        pass
+
+    def set_event_bus(self, bus):
+        """Sets EventBus which gets ChangeEvents of committed records"""
+        self.__dict__["_event_bus"] = bus
+
+    def cmd_args(self, cmd):
+        """Returns list_of_types and list_of_prompts of the command"""
+        for item in self.help():
+            if item.name == cmd:
+                return (
+                    [arg.type for arg in item.args],
+                    [arg.prompt for arg in item.args],
+                )
+        raise ErrorWithMsg(f"Unknown command: {cmd}")
+
+    def __pop_touched(self):
+        # every thread (frontend) has its own set of touched records
+        touched = self.__dict__.setdefault("_touched", {})
+        return touched.pop(threading.get_ident(), {})
+
+    def touch(self, key):
+        """Must be called by a mutating command before it changes a record"""
+        touched = self.__dict__.setdefault("_touched", {})
+        touched = touched.setdefault(threading.get_ident(), {})
+        if key in touched:
+            return
+        records = self.get_for_file()
+        touched[key] = deepcopy(records[key]) if key in records else MISSING
+
+    def on_commit(self, events):
+        """Gets ChangeEvents of the committed records before the bus, e.g.
+        to update an index of the provider"""
+        pass
+
+    def get_lazy_index(self, name, build):
+        """Returns the index in the attribute, build() makes it on the first
+        use and it is set when complete as readers share the lock"""
+        index = getattr(self, name)
+        if index is None:
+            index = build()
+            setattr(self, name, index)
+        return index
+
+    def is_dirty(self):
+        """True if records were committed since the last full save"""
+        return self.__dict__.get("_dirty", False)
+
+    def set_dirty(self, dirty=True):
+        self.__dict__["_dirty"] = dirty
+
+    def commit_changes(self):
+        """Returns keys of the records touched since the last commit"""
+        touched = self.__pop_touched()
+        if touched:
+            self.set_dirty()
+            records = self.get_for_file()
+            events = []
+            for key, old in touched.items():
+                new = records.get(key, MISSING)
+                events.extend(get_change_events(self, key, old, new))
+            if events:
+                self.on_commit(events)
+                bus = self.__dict__.get("_event_bus")
+                if bus is not None:
+                    bus.publish(events)
+        return list(touched.keys())
+
+    def raise_batch_errors(self, errors):
+        """Raises ErrorWithMsg if {item index: error message} is not empty,
+        so nothing of the batch is applied"""
+        if errors:
+            raise ErrorWithMsg(
+                "\n".join(
+                    [CmdProvider.BATCH_REJECTED_MSG.format(len(errors))]
+                    + [
+                        f"  {ix}: {errors[ix]}"
+                        for ix in sorted(errors)[
+                            : CmdProvider.BATCH_ERRORS_SHOWN
+                        ]
+                    ]
+                )
+            )
+
+    def validate_rows(self, rows, key_name, key_type, field_types):
+        """Validates dicts {key_name: key, field: value} column by column,
+        returns [(key, {field: Field or None})]"""
+        rows = list(rows)
+        errors = {}
+        keys = [row.get(key_name) for row in rows]
+        keys, _, key_errors = key_type.validate_column(keys)
+        for ix, row in enumerate(rows):
+            unknown = [
+                f for f in row if f != key_name and not f in field_types
+            ]
+            if unknown:
+                errors[ix] = f"Unknown field: {unknown[0]}"
+            elif key_errors[ix] or keys[ix] is None:
+                errors[ix] = key_errors[ix] or f"{key_name} is missing"
+        batch = [(key, {}) for key in keys]
+        for field, field_type in field_types.items():
+            ixs = [ix for ix, row in enumerate(rows) if field in row]
+            if not ixs:
+                continue
+            values, mask, field_errors = field_type.validate_column(
+                [rows[ix][field] for ix in ixs]
+            )
+            for ix, value, valid, error in zip(
+                ixs, values, mask, field_errors
+            ):
+                if not valid:
+                    errors.setdefault(ix, error)
+                elif not value is None:
+                    batch[ix][1][field] = field_type.from_valid(value)
+                else:
+                    batch[ix][1][field] = None
+        self.raise_batch_errors(errors)
+        return batch
+
+    def apply_records(self, records, save_handler):
+        """Puts {key: record, None deletes it} in one transaction saved by
+        save_handler, the caller holds the write lock"""
+        if save_handler is None:
+            raise ErrorWithMsg(CmdProvider.NO_SAVE_HANDLER_MSG)
+        with Transaction(self, save_handler):
+            data = self.get_for_file()
+            for key, record in records.items():
+                self.touch(key)
+                if record is None:
+                    data.pop(key, None)
+                else:
+                    data[key] = record
+
+    def rollback_changes(self):
+        """Restores the records touched since the last commit"""
+        records = self.get_for_file()
+        for key, record in self.__pop_touched().items():
+            if record is MISSING:
+                records.pop(key, None)
+            else:
+                records[key] = record
+
+
+class CmdRegistry:
+    """Maps every command name to its provider and Cmd description"""
+
+    def __init__(self, cmd_providers=()):
+        self.cmds = {}
+        for cmd_provider in cmd_providers:
+            self.add_provider(cmd_provider)
+
+    def add_provider(self, cmd_provider):
+        for cmd in cmd_provider.help():
+            if cmd.name in self.cmds:
+                raise Exception(f"Command duplication: {cmd.name}")
+            self.cmds[cmd.name] = (cmd_provider, cmd)
+
+    def get(self, name):
+        """Returns (provider, Cmd) or (None, None) for unknown command"""
+        return self.cmds.get(name, (None, None))
+
+    def names(self):
+        return self.cmds.keys()
+
+
+class Transaction:
+    """Context of a mutating command: touched records are saved on
+    success and restored on error"""
+
+    def __init__(self, cmd_provider, save_handler=None):
+        self.cmd_provider = cmd_provider
+        self.save_handler = save_handler
+
+    def __enter__(self):
+        # forget records touched outside of a transaction
+        self.cmd_provider.commit_changes()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.cmd_provider.rollback_changes()
+            return False
+        keys = self.cmd_provider.commit_changes()
+        if keys and self.save_handler is not None:
+            self.save_handler(self.cmd_provider, keys)
+        return False
+
+
+class RWLock:
+    """Reentrant readers-writer lock, waiting writers go before new
+    readers"""
+
+    def __init__(self):
+        self.__cond = threading.Condition()
+        self.__readers = 0
+        self.__writer = False
+        self.__writers_waiting = 0
+        self.__local = threading.local()
+
+    def __acquire(self, write):
+        local = self.__local
+        if getattr(local, "depth", 0) > 0:
+            if write and not local.write:
+                raise RuntimeError("Can not upgrade a read lock")
+            local.depth += 1
+            return
+        with self.__cond:
+            if write:
+                self.__writers_waiting += 1
+                while self.__writer or self.__readers > 0:
+                    self.__cond.wait()
+                self.__writers_waiting -= 1
+                self.__writer = True
+            else:
+                while self.__writer or self.__writers_waiting > 0:
+                    self.__cond.wait()
+                self.__readers += 1
+        local.depth = 1
+        local.write = write
+
+    def __release(self):
+        local = self.__local
+        local.depth -= 1
+        if local.depth > 0:
+            return
+        with self.__cond:
+            if local.write:
+                self.__writer = False
+            else:
+                self.__readers -= 1
+            self.__cond.notify_all()
+
+    @contextmanager
+    def read_lock(self):
+        self.__acquire(False)
+        try:
+            yield
+        finally:
+            self.__release()
+
+    @contextmanager
+    def write_lock(self):
+        self.__acquire(True)
+        try:
+            yield
+        finally:
+            self.__release()
+
 
 class FrontBase(ABC):
     @abstractmethod
@@ -82,10 +523,31 @@ class FrontBase(ABC):
     def set_save_handler(self, handler):
         raise ErrorWithMsg("Unknown set_save_handler()")
 
+    def set_lock(self, lock):
+        """Sets RWLock of the store shared by all frontends"""
+        self.lock = lock
+
+    def stop(self):
+        """Asks the running frontend to finish"""
+        pass
+
+    def notify(self, text):
+        """Shows a due event to the user, may be called from other thread"""
+        pass
+
     @abstractmethod
     def run(self, handler):
         raise ErrorWithMsg("Unknown run()")
 
+    def get_validators(self, assert_validator, num):
+        """One validator or a list of them for every entry"""
+        validators = [None] * num
+        if type(assert_validator) is list:
+            return (assert_validator + validators)[:num]
+        if num > 0:
+            validators[0] = assert_validator
+        return validators
+
     @abstractmethod
     def get_extra_data_from_user(
         list_of_types,
@@ -93,6 +555,7 @@ class FrontBase(ABC):
         assert_validator=None,
         mandatory_first_entry=True,
         mandatory_all_entries=False,
+        completers=None,
     ):
         raise ErrorWithMsg("Unknown get_extra_data_from_user()")
 
@@ -0,0 +1,74 @@
+import lzma
+import mmap
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class BlobStore:
+    """Append-only file of optionally compressed blobs read through mmap"""
+
+    # codec of new blobs: "none", "zlib" or "lzma"
+    CODEC = "zlib"
+    CODECS = {
+        "none": (bytes, bytes),
+        "zlib": (zlib.compress, zlib.decompress),
+        "lzma": (lzma.compress, lzma.decompress),
+    }
+
+    # store which is written or read by a Book in this thread
+    __persisting = threading.local()
+
+    def __init__(self, filename):
+        self.filename = Path(filename)
+        self.lock = threading.Lock()
+        self.__map = None
+
+    @staticmethod
+    def get_persisting():
+        return getattr(BlobStore.__persisting, "store", None)
+
+    @contextmanager
+    def persisting(self):
+        """Objects kept in this store are pickled as references inside"""
+        previous = BlobStore.get_persisting()
+        BlobStore.__persisting.store = self
+        try:
+            yield
+        finally:
+            BlobStore.__persisting.store = previous
+
+    def put(self, data: bytes):
+        """Appends the blob, returns its reference"""
+        codec = BlobStore.CODEC
+        packed = BlobStore.CODECS[codec][0](data)
+        if len(packed) >= len(data):
+            codec, packed = "none", data
+        with self.lock:
+            with open(self.filename, "ab") as f:
+                offset = f.tell()
+                f.write(packed)
+        return (offset, len(packed), codec)
+
+    def get(self, ref) -> bytes:
+        offset, length, codec = ref
+        with self.lock:
+            if self.__map is None or offset + length > len(self.__map):
+                # the file grew since it was mapped
+                self.__close()
+                with open(self.filename, "rb") as f:
+                    self.__map = mmap.mmap(
+                        f.fileno(), 0, access=mmap.ACCESS_READ
+                    )
+            packed = self.__map[offset : offset + length]
+        return BlobStore.CODECS[codec][1](packed)
+
+    def __close(self):
+        if self.__map is not None:
+            self.__map.close()
+            self.__map = None
+
+    def close(self):
+        with self.lock:
+            self.__close()
@@ -0,0 +1,353 @@
+import os
+import pickle
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from BaseClasses import *
+from Blobs import BlobStore
+
+
+class BookName(Field):
+    """Name of an address book, used in the name of its data file"""
+
+    def validate(self, name: str):
+        name = name.strip()
+        if re.fullmatch(r"[\w-]{1,32}", name, re.ASCII):
+            return name
+        raise ErrorWithMsg(
+            "Book name must be a single word of letters, digits, '-' or '_'"
+        )
+
+
+class Book:
+    """Command providers whose records are kept in one data file, commits
+    are appended to its journal"""
+
+    # journal is merged into the data file when it becomes bigger
+    JOURNAL_MAX_SIZE = 1024 * 1024
+
+    def __init__(self, name, filename, cmd_providers, file_lock=None):
+        self.name = name
+        self.filename, self.journal_filename, blobs_filename = (
+            Book.get_filenames(filename)
+        )
+        self.cmd_providers = cmd_providers
+        self.file_lock = file_lock if file_lock else threading.Lock()
+        # estimated memory of the records: size of their pickled data
+        self.size = 0
+        # large values are kept out of the data file and the memory
+        self.blobs = BlobStore(blobs_filename)
+        for cmd_provider in cmd_providers.values():
+            cmd_provider.set_blob_store(self.blobs)
+
+    @staticmethod
+    def get_filenames(filename):
+        """Data, journal and blobs files of a book"""
+        filename = Path(filename)
+        return (
+            filename,
+            filename.with_name(filename.name + ".journal"),
+            filename.with_name(filename.name + ".blobs"),
+        )
+
+    def __contains__(self, cmd_provider):
+        items = self.cmd_providers.values()
+        return any(item is cmd_provider for item in items)
+
+    def load_from_file(self):
+        self.size = 0
+        try:
+            with open(self.filename, "rb") as f, self.blobs.persisting():
+                data = pickle.load(f)
+                self.size = f.tell()
+                for d in data:
+                    if d in self.cmd_providers:
+                        self.cmd_providers[d].set_from_file(data[d])
+        except:
+            pass
+        self.replay_journal()
+
+    def replay_journal(self):
+        """Applies records saved by commands after the last full save"""
+        changed = set()
+        try:
+            f = open(self.journal_filename, "rb")
+            with f, self.blobs.persisting():
+                while True:
+                    try:
+                        name, updated, deleted = pickle.load(f)
+                    except (EOFError, pickle.UnpicklingError):
+                        # the last entry may be cut by a crash
+                        break
+                    if not name in self.cmd_providers:
+                        continue
+                    records = self.cmd_providers[name].get_for_file()
+                    records.update(updated)
+                    for key in deleted:
+                        records.pop(key, None)
+                    changed.add(name)
+                self.size += f.tell()
+        except FileNotFoundError:
+            pass
+        for name in changed:
+            cmd_provider = self.cmd_providers[name]
+            cmd_provider.set_from_file(cmd_provider.get_for_file())
+            # the data file does not have the records of the journal
+            cmd_provider.set_dirty()
+
+    def item_name(self, cmd_provider):
+        for name, item in self.cmd_providers.items():
+            if item is cmd_provider:
+                return name
+        raise Exception("Unknown command provider")
+
+    def save_to_file(self, cmd_provider=None, keys=None):
+        """Saves everything or records with the keys of cmd_provider under
+        a read lock, returns number of written bytes"""
+        with self.file_lock:
+            if cmd_provider is None:
+                return self.save_all_to_file()
+            records = cmd_provider.get_for_file()
+            updated = {k: records[k] for k in keys if k in records}
+            deleted = [k for k in keys if not k in records]
+            entry = (self.item_name(cmd_provider), updated, deleted)
+            with self.blobs.persisting():
+                entry_data = pickle.dumps(entry)
+            with open(self.journal_filename, "ab") as f:
+                f.write(entry_data)
+                journal_size = f.tell()
+            self.size += len(entry_data)
+            if journal_size > Book.JOURNAL_MAX_SIZE:
+                return len(entry_data) + self.save_all_to_file()
+            return len(entry_data)
+
+    def is_dirty(self):
+        return any(item.is_dirty() for item in self.cmd_providers.values())
+
+    def save_all_to_file(self):
+        if self.filename.exists() and not self.is_dirty():
+            # nothing was committed since the last full save
+            return 0
+        data = {}
+        for d in self.cmd_providers:
+            data[d] = self.cmd_providers[d].get_for_file()
+        tmp_filename = self.filename.with_name(self.filename.name + ".tmp")
+        with open(tmp_filename, "wb") as f, self.blobs.persisting():
+            pickle.dump(data, f)
+            written = f.tell()
+        os.replace(tmp_filename, self.filename)
+        self.journal_filename.unlink(missing_ok=True)
+        for cmd_provider in self.cmd_providers.values():
+            cmd_provider.set_dirty(False)
+        self.size = written
+        return written
+
+
+class Books(CmdProvider):
+    """Named address books, each one in its own file, loaded on first use
+
+    Least recently used books are unloaded over MEMORY_BUDGET_MB. The book
+    in use is one for all frontends, 'use' switches it for every client.
+    """
+
+    DEFAULT_BOOK = "default"
+    MEMORY_BUDGET_MB = 64
+    BOOKS_FORMAT = "  {} {:<20} {:>10} {}"
+    BOOK_USED_MSG = "Book '{}' is in use by all frontends: {}"
+    BOOK_UNLOADED_MSG = "Book of the command was unloaded, changes are lost"
+
+    cmds_help = (
+        Cmd(
+            "use",
+            "use <book>",
+            "Switch all frontends to an address book, a new one is created",
+            mutating=True,
+            args=(CmdArg("book", BookName, "Book: "),),
+        ),
+        Cmd("books", "books", "Show address books"),
+    )
+
+    def __init__(self, filename, new_cmd_providers, file_lock=None):
+        """new_cmd_providers() returns dict name -> CmdProvider of a book"""
+        self.filename = Path(filename)
+        self.new_cmd_providers = new_cmd_providers
+        self.file_lock = file_lock if file_lock else threading.Lock()
+        self.data = {"active": Books.DEFAULT_BOOK}
+        # names of command providers which every book has
+        self.book_items = ()
+        # least recently used books go first
+        self.loaded = OrderedDict()
+        self.load_handler = None
+        self.unload_handler = None
+        self.use_handler = None
+        self.cmds = {
+            "use": self.use_book,
+            "books": self.show_books,
+        }
+
+    def set_handlers(self, load=None, unload=None, use=None):
+        """Handlers get the Book which was loaded, unloaded or put in use"""
+        self.load_handler = load
+        self.unload_handler = unload
+        self.use_handler = use
+
+    def help(self):
+        return Books.cmds_help
+
+    def exe(self, cmd, args, get_extra_data_from_user_handler):
+        return self.cmds[cmd](args, get_extra_data_from_user_handler)
+
+    def get_for_file(self):
+        return self.data
+
+    def set_from_file(self, data):
+        self.data.update(data)
+
+    @property
+    def default(self):
+        return self.loaded[Books.DEFAULT_BOOK]
+
+    @property
+    def active(self):
+        return self.loaded[self.data["active"]]
+
+    def get_filename(self, name):
+        if name == Books.DEFAULT_BOOK:
+            return self.filename
+        return self.filename.with_name(
+            f"{self.filename.stem}.{name}{self.filename.suffix}"
+        )
+
+    def get_names(self):
+        """Names of loaded books and books saved to files"""
+        names = set(self.loaded.keys())
+        names.add(Books.DEFAULT_BOOK)
+        pattern = f"{self.filename.stem}.*{self.filename.suffix}"
+        for path in self.filename.parent.glob(pattern):
+            name = path.name[len(self.filename.stem) + 1 :]
+            name = name[: len(name) - len(self.filename.suffix)]
+            if re.fullmatch(r"[\w-]{1,32}", name, re.ASCII):
+                names.add(name)
+        return sorted(names)
+
+    def load_default_book(self, cmd_providers):
+        """Loads the main data file, cmd_providers (settings, books) are
+        kept in it along with records of the default book"""
+        cmd_providers = dict(cmd_providers)
+        book_items = self.new_cmd_providers()
+        self.book_items = tuple(book_items.keys())
+        cmd_providers.update(book_items)
+        cmd_providers["books"] = self
+        book = Book(
+            Books.DEFAULT_BOOK, self.filename, cmd_providers, self.file_lock
+        )
+        self.__load(book)
+        return book
+
+    def __load(self, book):
+        book.load_from_file()
+        self.loaded[book.name] = book
+        if self.load_handler:
+            self.load_handler(book)
+
+    def get_book(self, name):
+        """Returns the book, it is loaded if needed"""
+        if name in self.loaded:
+            self.loaded.move_to_end(name)
+            return self.loaded[name]
+        book = Book(
+            name,
+            self.get_filename(name),
+            self.new_cmd_providers(),
+            self.file_lock,
+        )
+        self.__load(book)
+        return book
+
+    def find_book(self, cmd_provider):
+        """Returns loaded book of the command provider or None"""
+        for book in self.loaded.values():
+            if cmd_provider in book:
+                return book
+        return None
+
+    def get_cmd_providers(self):
+        """Command providers of the book in use, the default book gives
+        the common ones"""
+        cmd_providers = dict(self.default.cmd_providers)
+        cmd_providers.update(self.active.cmd_providers)
+        return cmd_providers
+
+    def get_loaded_size(self):
+        return sum(book.size for book in self.loaded.values())
+
+    def unload_books(self):
+        """Unloads least recently used books while they exceed the budget"""
+        budget = Books.MEMORY_BUDGET_MB * 1024 * 1024
+        for name in list(self.loaded.keys()):
+            if self.get_loaded_size() <= budget:
+                break
+            if name in (Books.DEFAULT_BOOK, self.data["active"]):
+                continue
+            book = self.loaded.pop(name)
+            with book.file_lock:
+                book.save_all_to_file()
+            book.blobs.close()
+            if self.unload_handler:
+                self.unload_handler(book)
+
+    def use(self, name):
+        """Puts the book in use, returns it"""
+        book = self.get_book(name)
+        self.data["active"] = name
+        self.unload_books()
+        if self.use_handler:
+            self.use_handler(book)
+        return book
+
+    def save_all_to_file(self):
+        written = 0
+        for book in list(self.loaded.values()):
+            with book.file_lock:
+                written += book.save_all_to_file()
+        return written
+
+    def use_book(self, args, get_extra_data_from_user_handler):
+        if len(args) > 1:
+            raise ValueError
+        if len(args) == 1:
+            name = BookName(args[0]).value
+        else:
+            list_of_types, list_of_prompts = self.cmd_args("use")
+            data = get_extra_data_from_user_handler(
+                list_of_types, list_of_prompts
+            )
+            name = data[0].value
+        self.touch("active")
+        book = self.use(name)
+        records = ", ".join(
+            f"{len(book.cmd_providers[item_name].get_for_file())} {item_name}"
+            for item_name in self.book_items
+        )
+        return Books.BOOK_USED_MSG.format(name, records)
+
+    def show_books(self, args, get_extra_data_from_user_handler):
+        if len(args) > 0:
+            raise ValueError
+        txt_list = []
+        for name in self.get_names():
+            mark = "*" if name == self.data["active"] else " "
+            if name in self.loaded:
+                size, state = self.loaded[name].size, "loaded"
+            else:
+                filename = self.get_filename(name)
+                size = filename.stat().st_size if filename.exists() else 0
+                state = ""
+            txt_list.append(
+                Books.BOOKS_FORMAT.format(
+                    mark, name, f"{(size + 1023) // 1024} KB", state
+                )
+            )
+        return txt_list
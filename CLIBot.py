@@ -1,4 +1,5 @@
-from collections import defaultdict, OrderedDict
+from collections import OrderedDict
+from itertools import islice
 import platform
 import requests
 from prompt_toolkit import prompt
@@ -6,8 +7,10 @@ from prompt_toolkit.completion import Completer, Completion
 from rich.console import Text
 
 from BaseClasses import *
+from Books import Books
 from Contacts import Contacts, Name, Number, YesNo
 from Notes import Notes
+from Stats import CmdStats
 
 
 class CLI:
@@ -84,6 +87,10 @@ class Settings:
             CLI.curr_color_scheme,
         )
         self.add_setting("Use prompt", YesNo, None, True)
+        self.add_setting("Trace allocations", YesNo, None, False)
+        self.add_setting(
+            "Books memory (MB)", Number, None, Books.MEMORY_BUDGET_MB
+        )
 
     def add_setting(self, name, _type, checker=None, default=None):
         self.data[name] = default
@@ -91,6 +98,14 @@ class Settings:
         self.order.append(name)
 
 
+class InputNeeded(Exception):
+    """Raised by a command which asks the user while it holds the lock of
+    the store"""
+
+    def __init__(self, request):
+        self.request = request
+
+
 class CLIBot(CmdProvider, FrontBase):
     HELLO_MSG = "Hi{}, this is your assistant"
     HELLO_HELP_MSG = "write your command ('h|help' for details)"
@@ -102,59 +117,60 @@ class CLIBot(CmdProvider, FrontBase):
     PARSING_ERROR_MSG_CMDS_FORMAT = "{}\nExpected format: {}"
     SHOW_WELCOME_QUOTE = True
 
-    SAVE_PATTERNS = ("add", "edit", "delete", "rename", "settings")
-
     __cmds_help = (
-        ("quote", "quote", "Show random quote from https://zenquotes.io/"),
-        ("help", "h|help", "Show this message"),
-        ("h", "h|help", "Show this message"),
-        ("settings", "settings", "Configure assistant"),
-        ("exit", "q|exit|close", "Finish to work with an assistant"),
-        ("close", "q|exit|close", "Finish to work with an assistant"),
-        ("q", "q|exit|close", "Finish to work with an assistant"),
+        Cmd("quote", "quote", "Show random quote from https://zenquotes.io/"),
+        Cmd("help", "h|help", "Show this message"),
+        Cmd("h", "h|help", "Show this message"),
+        Cmd(
+            "settings",
+            "settings",
+            "Configure assistant",
+            mutating=True,
+        ),
+        Cmd("stats", "stats", "Show latency of executed commands"),
+        Cmd(
+            "stats-export",
+            "stats-export <file>",
+            "Save measurements of executed commands to a file",
+        ),
+        Cmd("exit", "q|exit|close", "Finish to work with an assistant"),
+        Cmd("close", "q|exit|close", "Finish to work with an assistant"),
+        Cmd("q", "q|exit|close", "Finish to work with an assistant"),
     )
 
     def __init__(self):
         self.save_handler = None
+        self.lock = RWLock()
+        self.stats = CmdStats()
         self.name = ""
         self.use_prompt = True
         self.settings = Settings()
         self.apply_setting()
         self.__finish = False
         self.__is_error = False
+        # (prompts, data) given by the user to the running command
+        self.__answers = None
+        self.__answer_ix = 0
         self.cmds = {
             "quote": self.show_quote,
             "help": self.get_help_message,
             "h": self.get_help_message,
             "settings": self.configure_assistant_by_user,
+            "stats": self.show_stats,
+            "stats-export": self.export_stats,
             "exit": self.exit,
             "close": self.exit,
             "q": self.exit,
         }
 
-    def __add_exes(self, cmds_help, exe_handler):
-        for cmd_help in cmds_help:
-            cmd_txt = cmd_help[0]
-            if cmd_txt in self.exes.keys():
-                raise Exception(f"Command duplication: {cmd_txt}")
-            self.exes[cmd_txt] = tuple([exe_handler] + list(cmd_help[1:]))
-
-    def __update_exes_dict(self):
-        self.exes = defaultdict(lambda: [self.__unknown_cmd, "", ""])
-        for cmds_provider in self.__list_of_cmds_providers:
-            self.__add_exes(cmds_provider.help(), cmds_provider.exe)
-
-    def __get_cmds_list(self):
-        return self.exes.keys()
-
     def set_cmd_providers(self, cmd_providers):
         self.__list_of_cmds_providers = cmd_providers
-        self.__update_exes_dict()
-        all_cmds = sorted(list(self.__get_cmds_list()))
+        self.registry = CmdRegistry(cmd_providers)
+        all_cmds = sorted(list(self.registry.names()))
         self.cmd_completer = WordCompleter(all_cmds)
 
     def set_save_handler(self, handler):
-        self.save_handler = handler
+        self.save_handler = self.stats.wrap_save_handler(handler)
 
     def get_extra_data_from_user(
         self,
@@ -163,14 +179,48 @@ class CLIBot(CmdProvider, FrontBase):
         assert_validator=None,
         mandatory_first_entry=True,
         mandatory_all_entries=False,
+        completers=None,
+    ):
+        request = (
+            list_of_types,
+            list_of_prompts,
+            assert_validator,
+            mandatory_first_entry,
+            mandatory_all_entries,
+            completers,
+        )
+        if self.__answers is None:
+            # not called by a command, nothing is locked
+            return self.ask_user(*request)
+        ix = self.__answer_ix
+        if ix < len(self.__answers):
+            prompts, data = self.__answers[ix]
+            # the same question as in the previous run of the command
+            if prompts == list_of_prompts:
+                self.__answer_ix += 1
+                # the records may have been changed while the user answered
+                validators = self.get_validators(assert_validator, len(data))
+                for value, validator in zip(data, validators):
+                    if value is not None and validator:
+                        validator(value.value)
+                return list(data)
+        raise InputNeeded(request)
+
+    def ask_user(
+        self,
+        list_of_types,
+        list_of_prompts,
+        assert_validator=None,
+        mandatory_first_entry=True,
+        mandatory_all_entries=False,
+        completers=None,
     ):
         num = min(len(list_of_types), len(list_of_prompts))
         data = [None] * num
-        assert_validators = [None] * num
-        if type(assert_validator) is list:
-            assert_validators = assert_validator + assert_validators
-        else:
-            assert_validators[0] = assert_validator
+        assert_validators = self.get_validators(assert_validator, num)
+        if not completers:
+            completers = []
+        completers = completers + [None] * (num - len(completers))
         for i in range(num):
             is_current_entry_mandatory = (
                 mandatory_first_entry or mandatory_all_entries
@@ -181,7 +231,13 @@ class CLIBot(CmdProvider, FrontBase):
             while True:
                 user_data = ""
                 try:
-                    user_data = CLI.input(current_prompt)
+                    words = None
+                    if completers[i]:
+                        # completions are taken from the store
+                        with self.lock.read_lock():
+                            words = completers[i](data)
+                    with self.stats.waiting():
+                        user_data = self.arg_input(current_prompt, words)
                     user_data = user_data.strip()
                     if len(user_data) == 0 and (
                         not is_current_entry_mandatory
@@ -189,8 +245,10 @@ class CLIBot(CmdProvider, FrontBase):
                         break
                     good_data = list_of_types[i](user_data)
                     if assert_validators[i]:
-                        assert_validators[i](good_data.value)
-                    data[i] = list_of_types[i](user_data)
+                        # validators may look up the records
+                        with self.lock.read_lock():
+                            assert_validators[i](good_data.value)
+                    data[i] = good_data
                     mandatory_first_entry = False
                     break
                 except KeyboardInterrupt:
@@ -215,12 +273,14 @@ class CLIBot(CmdProvider, FrontBase):
         return self.settings.data
 
     def set_from_file(self, data):
-        self.settings.data = data
+        # settings added later keep their default values
+        self.settings.data.update(data)
         self.apply_setting()
 
     def save_to_file(self):
         if not self.save_handler is None:
-            self.save_handler()
+            with self.lock.read_lock():
+                self.save_handler()
 
     def apply_setting(self):
         if self.settings.data["Name"]:
@@ -237,6 +297,11 @@ class CLIBot(CmdProvider, FrontBase):
             CLI.apply_color_scheme(self.settings.data["Color theme"])
         if not self.settings.data["Use prompt"] is None:
             self.use_prompt = self.settings.data["Use prompt"]
+        if not self.settings.data["Books memory (MB)"] is None:
+            Books.MEMORY_BUDGET_MB = self.settings.data["Books memory (MB)"]
+        self.stats.set_trace_allocations(
+            self.settings.data["Trace allocations"]
+        )
 
     def configure_assistant_by_user(self, args):
         if len(args) > 0:
@@ -268,6 +333,7 @@ class CLIBot(CmdProvider, FrontBase):
         for i, item in enumerate(self.settings.order):
             if data[i] is None:
                 continue
+            self.touch(item)
             self.settings.data[item] = data[i].value
             cnt += 1
         if cnt == 0:
@@ -296,6 +362,17 @@ class CLIBot(CmdProvider, FrontBase):
         else:
             return ""
 
+    def show_stats(self, args):
+        if len(args) > 0:
+            raise ValueError
+        return self.stats.get_report()
+
+    def export_stats(self, args):
+        if len(args) != 1:
+            raise ValueError
+        num = self.stats.export(args[0])
+        return f"{num} sample(s) saved to '{args[0]}'"
+
     def show_quote(self, args):
         if len(args) > 0:
             raise ValueError
@@ -312,28 +389,31 @@ class CLIBot(CmdProvider, FrontBase):
             except ErrorWithMsg as e:
                 return e
             except ValueError as e:
+                cmd = func.__name__.replace("_", "-")
+                _, cmd_info = __self.registry.get(cmd)
                 return CLIBot.PARSING_ERROR_MSG_CMDS_FORMAT.format(
-                    CLIBot.INVALID_CMD_MSG,
-                    __self.exes[func.__name__.replace("_", "-")][1],
+                    CLIBot.INVALID_CMD_MSG, cmd_info.usage
                 )
             except Exception as e:
                 return str(e)
 
         return inner
 
-    def __unknown_cmd(self, cmd, args):
-        raise ErrorWithMsg(CLIBot.INVALID_CMD_MSG)
-
     def exit(self, args):
         self.__finish = True
         return CLIBot.BYE_MSG
 
+    def stop(self):
+        self.__finish = True
+
+    def notify(self, text):
+        CLI.print(f"\n  {text}", style=CLI.MSG_STYLE_WELCOME, highlight=False)
+
     def get_help_message(self, args):
         help_dict = OrderedDict()
         for cmd_provider in self.__list_of_cmds_providers:
-            help = cmd_provider.help()
-            for l in help:
-                help_dict[l[1]] = l[2]
+            for cmd in cmd_provider.help():
+                help_dict[cmd.usage] = cmd.description
         txt_list = list()
         txt_list.append(CLIBot.HELP_MESSAGE_HEAD)
         for h1, h2 in help_dict.items():
@@ -342,19 +422,53 @@ class CLIBot(CmdProvider, FrontBase):
         return txt_list
 
     def exe_cmd(self, cmd, args):
+        cmd_provider, cmd_info = self.registry.get(cmd)
+        if cmd_provider is None:
+            return self.__exe_cmd(cmd, args, cmd_provider, cmd_info)
+        with self.stats.measure(cmd):
+            return self.__exe_cmd(cmd, args, cmd_provider, cmd_info)
+
+    def __exe_cmd(self, cmd, args, cmd_provider, cmd_info):
         try:
             self.__is_error = True
-            ret = self.exes[cmd][0](cmd, args, self.get_extra_data_from_user)
+            if cmd_provider is None:
+                raise ErrorWithMsg(CLIBot.INVALID_CMD_MSG)
+            self.__answers = []
+            while True:
+                self.__answer_ix = 0
+                try:
+                    ret = self.__exe_locked(cmd, args, cmd_provider, cmd_info)
+                    break
+                except InputNeeded as e:
+                    # the changes are rolled back under the lock, the user
+                    # is asked without it and the command runs again
+                    del self.__answers[self.__answer_ix :]
+                    data = self.ask_user(*e.request)
+                    self.__answers.append((e.request[1], data))
             self.__is_error = False
             return ret
         except ErrorWithMsg as e:
             return e
         except (ValueError, IndexError) as e:
             return CLIBot.PARSING_ERROR_MSG_CMDS_FORMAT.format(
-                CLIBot.INVALID_CMD_MSG, self.exes[cmd.replace("_", "-")][1]
+                CLIBot.INVALID_CMD_MSG, cmd_info.usage
             )
         except Exception as e:
             return str(e)
+        finally:
+            self.__answers = None
+
+    def __exe_locked(self, cmd, args, cmd_provider, cmd_info):
+        if cmd_info.mutating:
+            # only records touched by the command are saved
+            with self.lock.write_lock(), Transaction(
+                cmd_provider, self.save_handler
+            ):
+                return cmd_provider.exe(
+                    cmd, args, self.get_extra_data_from_user
+                )
+        with self.lock.read_lock():
+            return cmd_provider.exe(cmd, args, self.get_extra_data_from_user)
 
     def cmd_input(self, msg, style=CLI.MSG_STYLE_DEFAULT):
         if "Darwin" == platform.system():
@@ -368,6 +482,18 @@ class CLIBot(CmdProvider, FrontBase):
             user_input = CLI.input(formatted_msg)
         return user_input
 
+    def arg_input(self, msg, words=None):
+        """Input of a command argument, words are offered as completions"""
+        if "Darwin" == platform.system():
+            self.use_prompt = False
+        if self.use_prompt and words:
+            return prompt(
+                msg.plain,
+                completer=WordCompleter(words),
+                reserve_space_for_menu=5,
+            )
+        return CLI.input(msg)
+
     def get_input(self, message, style=CLI.MSG_STYLE_DEFAULT):
         try:
             user_input = self.cmd_input(message, style)
@@ -378,38 +504,44 @@ class CLIBot(CmdProvider, FrontBase):
             ret = "__empty__", (None,)
         return ret
 
-    def print_all(data, style=None):
-        if not isinstance(data, (list, tuple)):
+    def print_all(data, style=None, lock=None):
+        """Prints a string or lines page by page, pages of an iterator are
+        rendered under the read lock and read without it"""
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
             CLI.print(str(data), style=style, highlight=False)
             return
+        if lock is None:
+            lock = RWLock()
         # will print in chunks
         chunk_size = CLI.console.height - 1
-        data_parts = [
-            data[x : x + chunk_size] for x in range(0, len(data), chunk_size)
-        ]
+        lines = iter(data)
         prompt = Text(
             "-- press enter for more lines ('q' or ctrl+c to skip) --",
             style=CLI.MSG_STYLE_HINT,
         )
-        index = 0
         try:
-            for part in data_parts:
+            with lock.read_lock():
+                part = [str(line) for line in islice(lines, chunk_size)]
+            while part:
                 CLI.print("\n".join(part), style=style, highlight=False)
-                index += chunk_size
-                if index >= len(data):
+                with lock.read_lock():
+                    next_line = next(lines, None)
+                if next_line is None:
                     break
                 in_data = CLI.input(prompt)
                 if in_data.lower() == "q":
                     break
+                with lock.read_lock():
+                    part = [str(next_line)] + [
+                        str(line) for line in islice(lines, chunk_size - 1)
+                    ]
         except:
             CLI.print()
             pass
-
-    def save_if_cmd(self, cmd):
-        for p in CLIBot.SAVE_PATTERNS:
-            if p in cmd:
-                self.save_to_file()
-                return
+        finally:
+            if hasattr(lines, "close"):
+                with lock.read_lock():
+                    lines.close()
 
     def run(self):
         CLI.print(
@@ -418,7 +550,8 @@ class CLIBot(CmdProvider, FrontBase):
             highlight=False,
         )
         for member in self.__list_of_cmds_providers:
-            message = member.welcome_message()
+            with self.lock.read_lock():
+                message = member.welcome_message()
             if message:
                 CLI.print(
                     f"  {message}",
@@ -449,8 +582,7 @@ class CLIBot(CmdProvider, FrontBase):
                             style = CLI.MSG_STYLE_ERROR
                         else:
                             style = CLI.MSG_STYLE_OK
-                        CLIBot.print_all(res, style=style)
-                        self.save_if_cmd(cmd)
+                        CLIBot.print_all(res, style=style, lock=self.lock)
                 except KeyboardInterrupt:
                     CLIBot.print_all(CLIBot.BYE_MSG, style=CLI.MSG_STYLE_OK)
                     self.__finish = True
@@ -1,7 +1,10 @@
 from collections import UserDict
+from copy import copy
 from datetime import datetime
 import re
 from BaseClasses import *
+from Duplicates import find_duplicates, merge_records
+from Views import SeekText, SortedView
 
 
 class Name(Field):
@@ -45,14 +48,82 @@ class Number(Field):
         return value
 
 
+class Percent(Field):
+    def validate(self, number: str):
+        try:
+            value = int(number)
+        except:
+            raise ErrorWithMsg("Must be a number")
+        if not 0 <= value <= 100:
+            raise ErrorWithMsg("Must be in a range [0..100]")
+        return value
+
+
 class Phone(Field):
-    """Class for storing a phone number. Validates the format (10 digits)."""
+    """Class for storing a phone number in any format.
+
+    Its key is E.164-style digits, the same for all formats of the number.
+    """
+
+    # local numbers (0XXXXXXXXX) get this country code in the key
+    COUNTRY_CODE = "38"
+    PATTERN = re.compile(r"\+?[\d\s\-\(\)\.]+")
+    NON_DIGITS = re.compile(r"\D")
+    INVALID_MSG = (
+        "Invalid phone number format (expecting 10 digits"
+        " or +<country code><number>)"
+    )
 
     def validate(self, number: str):
-        number = number.strip()
-        if len(number) == 10 and number.isdigit():
-            return number
-        raise ErrorWithMsg("Invalid phone number format (expecting 10 digits)")
+        number = " ".join(number.split())
+        if Phone.PATTERN.fullmatch(number):
+            if 11 <= len(Phone.get_key(number)) <= 16:
+                return number
+        raise ErrorWithMsg(Phone.INVALID_MSG)
+
+    @classmethod
+    def validate_column(cls, values):
+        # phones are mostly unique, the inlined check is faster than
+        # validate() of every value
+        fullmatch, get_key = Phone.PATTERN.fullmatch, Phone.get_key
+        results, mask, errors = [], [], []
+        for value in values:
+            if value is None:
+                results.append(None)
+                mask.append(True)
+                errors.append(None)
+                continue
+            number = " ".join(value.split())
+            if fullmatch(number) and 11 <= len(get_key(number)) <= 16:
+                results.append(number)
+                mask.append(True)
+                errors.append(None)
+            else:
+                results.append(None)
+                mask.append(False)
+                errors.append(Phone.INVALID_MSG)
+        return results, mask, errors
+
+    @staticmethod
+    def get_key(number):
+        digits = Phone.NON_DIGITS.sub("", number)
+        if len(digits) == 10 and digits[0] == "0":
+            digits = Phone.COUNTRY_CODE + digits
+        return "+" + digits
+
+    @property
+    def key(self):
+        return Phone.get_key(self.value)
+
+
+class Label(Field):
+    """Label of a phone or e-mail of a contact (mobile, work, ...)"""
+
+    def validate(self, label: str):
+        label = label.strip().lower()
+        if len(label) == 0 or len(label.split()) > 1:
+            raise ErrorWithMsg("Label must be a single word")
+        return label
 
 
 class Birthday(Field):
@@ -61,7 +132,7 @@ class Birthday(Field):
     def validate(self, birthday: str):
         birthday = birthday.strip()
         try:
-            datetime.strptime(birthday, "%d.%m.%Y")
+            parse_date(birthday)
         except:
             raise ErrorWithMsg("Invalid birthday format (DD.MM.YYYY)")
         return birthday
@@ -78,40 +149,109 @@ class Address(Field):
 class Email(Field):
     """Class for validation emails. Validate the format (Exa.maple@exam.ple)"""
 
+    PATTERN = re.compile(
+        r"\b[a-z]{1}[\w\.\-\_]+@[\w\.\-\_]+\.[a-z]{2,}"
+    )
+    INVALID_MSG = "Invalid email format"
+
     def validate(self, email):
-        email = email.strip()
-        try:
-            result = re.match(
-                r"\b[a-z]{1}[\w\.\-\_]+@[\w\.\-\_]+\.[a-z]{2,}", email.lower()
-            ).group()
-        except:
-            raise ErrorWithMsg("Invalid email format")
-        return result
+        match = Email.PATTERN.match(email.strip().lower())
+        if match is None:
+            raise ErrorWithMsg(Email.INVALID_MSG)
+        return match.group()
+
+    @classmethod
+    def validate_column(cls, values):
+        # one pass of the compiled pattern, no exceptions
+        values = list(values)
+        match = Email.PATTERN.match
+        matches = [
+            None if value is None else match(value.strip().lower())
+            for value in values
+        ]
+        results = [m.group() if m else None for m in matches]
+        mask = [
+            value is None or not m is None for value, m in zip(values, matches)
+        ]
+        errors = [None if valid else Email.INVALID_MSG for valid in mask]
+        return results, mask, errors
+
+    @property
+    def key(self):
+        return self.value.lower()
 
 
 class Contact:
     """Class for storing contact information, including name, phone, etc."""
 
+    DEFAULT_LABEL = "main"
+
     def __init__(
         self,
         name: Name,
-        phone=Phone(),
-        email=Email(),
-        birthday=Birthday(),
-        address=Address(),
+        phone=None,
+        email=None,
+        birthday=None,
+        address=None,
     ):
         self.name = name
-        self.phone = phone
-        self.email = email
+        # lists of (label, Phone) and (label, Email)
+        self.phones = []
+        self.emails = []
+        if phone and phone.value:
+            self.phones.append((Contact.DEFAULT_LABEL, phone))
+        if email and email.value:
+            self.emails.append((Contact.DEFAULT_LABEL, email))
         self.birthday = birthday
         self.address = address
 
+    def __setstate__(self, state):
+        # contacts saved before labeled phones have one phone and e-mail
+        if not "phones" in state:
+            for attr in ("phone", "email"):
+                item = state.pop(attr, None)
+                state[attr + "s"] = []
+                if item and item.value:
+                    state[attr + "s"].append((Contact.DEFAULT_LABEL, item))
+        self.__dict__.update(state)
+
+    def find_item(self, attr, key):
+        """Returns index of a phone (attr "phones") or e-mail ("emails")
+        with the key or None"""
+        for i, (_, item) in enumerate(getattr(self, attr)):
+            if item.key == key:
+                return i
+        return None
+
+    def merge_items(self, other, attr):
+        """Adds phones or e-mails of the other contact which this one does
+        not have, returns their number"""
+        keys = set(self.get_keys(attr))
+        items = getattr(self, attr)
+        num = len(items)
+        for label, item in getattr(other, attr):
+            if not item.key in keys:
+                keys.add(item.key)
+                items.append((label, item))
+        return len(items) - num
+
+    def get_keys(self, attr):
+        return [item.key for _, item in getattr(self, attr)]
+
+    def get_items_text(self, attr):
+        items = []
+        for label, item in getattr(self, attr):
+            if label != Contact.DEFAULT_LABEL:
+                item = f"{item} ({label})"
+            items.append(str(item))
+        return ", ".join(items)
+
     def __str__(self):
         text = f"Name: {self.name}"
-        if self.phone and self.phone.value:
-            text += f", phone: {self.phone}"
-        if self.email and self.email.value:
-            text += f", e-mail: {self.email}"
+        if self.phones:
+            text += f", phone: {self.get_items_text('phones')}"
+        if self.emails:
+            text += f", e-mail: {self.get_items_text('emails')}"
         if self.birthday and self.birthday.value:
             text += f", birthday: {self.birthday}"
         if self.address and self.address.value:
@@ -129,62 +269,297 @@ class Contact:
         if not name is None:
             self.name = Name(name)
         if not phone is None:
-            self.phone = Phone(phone)
+            self.phones = [(Contact.DEFAULT_LABEL, Phone(phone))]
         if not email is None:
-            self.email = Email(email)
+            self.emails = [(Contact.DEFAULT_LABEL, Email(email))]
         if not birthday is None:
             self.birthday = Birthday(birthday)
         if not address is None:
             self.address = Address(address)
 
 
+class ContactsOrder(Field):
+    ORDERS = ("name", "birthday")
+
+    def validate(self, order: str):
+        order = order.strip().lower()
+        if order in ContactsOrder.ORDERS:
+            return order
+        raise ErrorWithMsg(
+            f"Order must be one of: {', '.join(ContactsOrder.ORDERS)}"
+        )
+
+
+def next_birthday(born, today):
+    """Date of the next birthday on or after today"""
+    for year in (today.year, today.year + 1):
+        day = born.day
+        if born.month == 2 and day == 29 and not isleap(year):
+            # celebrated at 28-Feb in non leap year
+            day = 28
+        birthday = date(year, born.month, day)
+        if birthday >= today:
+            return birthday
+
+
 class Contacts(UserDict, CmdProvider):
     ERROR_MESSAGE_CONTACT_ALREADY_EXISTS = "Contact '{}' already exists"
     ERROR_MESSAGE_CONTACT_NOT_FOUND = "Contact '{}' is not found"
     ERROR_EMPTY_CONTACTS_LIST = (
         "Contacts list is empty. Please add some contacts first"
     )
+    ERROR_MESSAGE_SAME_CONTACT = "Can not merge a contact with itself"
+    ERROR_MESSAGE_EMPTY = "{} can not be empty"
+    ERROR_MESSAGE_ITEM_EXISTS = "{} already exists for '{}'"
+    ERROR_MESSAGE_WHICH_ITEM = "Contact '{}' has {} {}s, which one?"
+    ERROR_NO_DUPLICATES = "No duplicates found"
     WELCOME_BIRTHDAYS_NUM_OF_DAYS = 7
     BIRTHDAYS_NUM_OF_DAYS = 7
+    SEARCH_WEIGHTS = {
+        "name": 3,
+        "phones": 2,
+        "emails": 2,
+        "address": 1,
+        "birthday": 1,
+    }
+    # lists of upcoming birthdays kept while no birthday is changed
+    UPCOMING_CACHE_SIZE = 16
+    DUPLICATES_MIN_SCORE = 50
+    DUPLICATE_FORMAT = "{:>4.0%} {} ~ {}: {}"
+    LIST_PAGE_SIZE = 20
+    LIST_MORE_MSG = "More: start from '{}'"
+    ERROR_MESSAGE_NOTHING_TO_LIST = "No contacts from this place"
+    ERROR_MESSAGE_PAGE = "Skip must be 0 or more and limit 1 or more"
+    # fields of the bulk API, a phone or e-mail replaces all of them
+    BULK_FIELDS = {
+        "phone": Phone,
+        "email": Email,
+        "birthday": Birthday,
+        "address": Address,
+    }
     cmds_help = (
-        ("add-contact", "add-contact", "Add contact to address book"),
-        ("rename-contact", "rename-contact", "Rename existing contact"),
-        ("delete-contact", "delete-contact", "Delete existing contact"),
-        ("add-phone", "add-phone", "Add phone number to the contact"),
-        ("edit-phone", "edit-phone", "Edit phone number of the contact"),
-        ("delete-phone", "delete-phone", "Delete phone number of the contact"),
-        ("add-email", "add-email ", "Add email to the contact"),
-        ("edit-email", "edit-email", "Edit email of the contact"),
-        ("delete-email", "delete-email", "Delete email of the contact"),
-        (
+        Cmd(
+            "add-contact",
+            "add-contact",
+            "Add contact to address book",
+            mutating=True,
+            args=(
+                CmdArg("name", Name, "Name: "),
+                CmdArg("phone", Phone, "Phone: "),
+                CmdArg("email", Email, "Email: "),
+                CmdArg("birthday", Birthday, "Birthday: "),
+                CmdArg("address", Address, "Address: "),
+            ),
+        ),
+        Cmd(
+            "rename-contact",
+            "rename-contact",
+            "Rename existing contact",
+            mutating=True,
+            args=(
+                CmdArg("old_name", Name, "Old name: "),
+                CmdArg("new_name", Name, "New name: "),
+            ),
+        ),
+        Cmd(
+            "delete-contact",
+            "delete-contact",
+            "Delete existing contact",
+            mutating=True,
+            args=(CmdArg("name", Name, "Name: "),),
+        ),
+        Cmd(
+            "add-phone",
+            "add-phone",
+            "Add phone number to the contact",
+            mutating=True,
+            args=(
+                CmdArg("name", Name, "Name: "),
+                CmdArg("phone", Phone, "Phone: "),
+                CmdArg("label", Label, "Label (default main): "),
+            ),
+        ),
+        Cmd(
+            "edit-phone",
+            "edit-phone",
+            "Edit phone number of the contact",
+            mutating=True,
+            args=(
+                CmdArg("name", Name, "Name: "),
+                CmdArg("phone", Phone, "Phone: "),
+                CmdArg("new_phone", Phone, "New phone: "),
+                CmdArg("label", Label, "New label (default the same): "),
+            ),
+        ),
+        Cmd(
+            "delete-phone",
+            "delete-phone",
+            "Delete phone number of the contact",
+            mutating=True,
+            args=(
+                CmdArg("name", Name, "Name: "),
+                CmdArg("phone", Phone, "Phone (may be skipped if one): "),
+            ),
+        ),
+        Cmd(
+            "add-email",
+            "add-email ",
+            "Add email to the contact",
+            mutating=True,
+            args=(
+                CmdArg("name", Name, "Name: "),
+                CmdArg("email", Email, "Email: "),
+                CmdArg("label", Label, "Label (default main): "),
+            ),
+        ),
+        Cmd(
+            "edit-email",
+            "edit-email",
+            "Edit email of the contact",
+            mutating=True,
+            args=(
+                CmdArg("name", Name, "Name: "),
+                CmdArg("email", Email, "Email: "),
+                CmdArg("new_email", Email, "New email: "),
+                CmdArg("label", Label, "New label (default the same): "),
+            ),
+        ),
+        Cmd(
+            "delete-email",
+            "delete-email",
+            "Delete email of the contact",
+            mutating=True,
+            args=(
+                CmdArg("name", Name, "Name: "),
+                CmdArg("email", Email, "Email (may be skipped if one): "),
+            ),
+        ),
+        Cmd(
             "add-birthday",
             "add-birthday <name> <date>",
             "Add birthday to the contact",
+            mutating=True,
+            args=(
+                CmdArg("name", Name, "Name: "),
+                CmdArg("birthday", Birthday, "Birthday: "),
+            ),
+        ),
+        Cmd(
+            "edit-birthday",
+            "edit-birthday",
+            "Edit birthday of the contact",
+            mutating=True,
+            args=(
+                CmdArg("name", Name, "Name: "),
+                CmdArg("birthday", Birthday, "Birthday: "),
+            ),
         ),
-        ("edit-birthday", "edit-birthday", "Edit birthday of the contact"),
-        (
+        Cmd(
             "delete-birthday",
             "delete-birthday",
             "Delete birthday of the contact",
+            mutating=True,
+            args=(CmdArg("name", Name, "Name: "),),
+        ),
+        Cmd(
+            "add-address",
+            "add-address",
+            "Add address to the contact",
+            mutating=True,
+            args=(
+                CmdArg("name", Name, "Name: "),
+                CmdArg("address", Address, "Address: "),
+            ),
+        ),
+        Cmd(
+            "edit-address",
+            "edit-address",
+            "Edit address of the contact",
+            mutating=True,
+            args=(
+                CmdArg("name", Name, "Name: "),
+                CmdArg("address", Address, "Address: "),
+            ),
+        ),
+        Cmd(
+            "delete-address",
+            "delete-address",
+            "Delete address of the contact",
+            mutating=True,
+            args=(CmdArg("name", Name, "Name: "),),
+        ),
+        Cmd(
+            "find-contact",
+            "find-contact",
+            "Find a contact in the address book",
+            args=(CmdArg("name", Name, "Name: "),),
         ),
-        ("add-address", "add-address", "Add address to the contact"),
-        ("edit-address", "edit-address", "Edit address of the contact"),
-        ("delete-address", "delete-address", "Delete address of the contact"),
-        ("find-contact", "find-contact", "Find a contact in the address book"),
-        ("find-phone", "find-phone", "Find a phone in the address book"),
-        ("find-email", "find-email", "Find an email in the address book"),
-        (
+        Cmd(
+            "find-phone",
+            "find-phone",
+            "Find a phone in the address book",
+            args=(CmdArg("phone", Phone, "Phone: "),),
+        ),
+        Cmd(
+            "find-email",
+            "find-email",
+            "Find an email in the address book",
+            args=(CmdArg("email", Email, "Email: "),),
+        ),
+        Cmd(
             "find-birthday",
             "find-birthday",
             "Find a birthday in the address book",
+            args=(CmdArg("birthday", Birthday, "Birthday: "),),
         ),
-        (
+        Cmd(
             "find-address",
             "find-address",
             "Find an address in the address book",
+            args=(CmdArg("address", Address, "Address: "),),
+        ),
+        Cmd(
+            "birthdays",
+            "birthdays",
+            "Show birthdays for next X days",
+            args=(CmdArg("days", Number, "Days: "),),
+        ),
+        Cmd("all-contacts", "all-contacts", "Show list of contacts"),
+        Cmd(
+            "list-contacts",
+            "list-contacts",
+            "Show contacts sorted by name or next birthday page by page",
+            args=(
+                CmdArg("order", ContactsOrder, "Order (name, birthday): "),
+                CmdArg(
+                    "start", SeekText, "Start from (name or DD.MM [name]): "
+                ),
+                CmdArg("offset", Number, "Skip: "),
+                CmdArg("limit", Number, "Limit (default 20): "),
+            ),
+        ),
+        Cmd(
+            "find-duplicates",
+            "find-duplicates",
+            "Find contacts with the same phone, e-mail or similar address",
+            args=(
+                CmdArg(
+                    "min_score",
+                    Percent,
+                    f"Minimum score % (default {DUPLICATES_MIN_SCORE}): ",
+                ),
+            ),
+        ),
+        Cmd(
+            "merge-contacts",
+            "merge-contacts",
+            "Fill empty fields of a contact from a duplicate and delete it",
+            mutating=True,
+            args=(
+                CmdArg("name", Name, "Keep contact: "),
+                CmdArg("duplicate", Name, "Merge and delete contact: "),
+            ),
         ),
-        ("birthdays", "birthdays", "Show birthdays for next X days"),
-        ("all-contacts", "all-contacts", "Show list of contacts"),
     )
 
     def __init__(self) -> None:
@@ -212,6 +587,16 @@ class Contacts(UserDict, CmdProvider):
         self.cmds["find-address"] = self.find_address
         self.cmds["birthdays"] = self.birthdays
         self.cmds["all-contacts"] = self.all_contacts
+        self.cmds["list-contacts"] = self.list_contacts
+        self.cmds["find-duplicates"] = self.find_duplicates
+        self.cmds["merge-contacts"] = self.merge_contacts
+        # "phones"/"emails" -> {key: name or set of names}, built on the
+        # first search and kept up to date by commits
+        self.index = None
+        # order -> SortedView, built when it is listed for the first time
+        self.views = {}
+        self.views_day = None
+        self.upcoming = MemoCache(Contacts.UPCOMING_CACHE_SIZE)
 
     def __str__(self):
         return "\n".join(self.get_str_list_of_contacts())
@@ -230,7 +615,9 @@ class Contacts(UserDict, CmdProvider):
     def get_str_list_of_contacts(self):
         if len(self.data) == 0:
             raise ErrorWithMsg(Contacts.ERROR_EMPTY_CONTACTS_LIST)
-        return [str(note) for note in self.data.values()]
+        # contacts are rendered when they are printed, the list is copied
+        # so other frontends can change the book meanwhile
+        return (str(contact) for contact in list(self.data.values()))
 
     def help(self):
         return Contacts.cmds_help
@@ -243,6 +630,82 @@ class Contacts(UserDict, CmdProvider):
 
     def set_from_file(self, data):
         self.data = data
+        self.index = None
+        self.views = {}
+        self.upcoming.invalidate()
+
+    def __index_items(self, index, attr, name, items, add):
+        index = index[attr]
+        for _, item in items:
+            names = index.get(item.key)
+            if add:
+                if names is None:
+                    index[item.key] = name
+                elif isinstance(names, set):
+                    names.add(name)
+                elif names != name:
+                    index[item.key] = {names, name}
+            elif isinstance(names, set):
+                names.discard(name)
+                if len(names) == 1:
+                    index[item.key] = names.pop()
+            elif names == name:
+                del index[item.key]
+
+    def build_index(self):
+        index = {"phones": {}, "emails": {}}
+        for name, contact in list(self.data.items()):
+            for attr in index:
+                items = getattr(contact, attr)
+                self.__index_items(index, attr, name, items, True)
+        return index
+
+    def get_index(self):
+        return self.get_lazy_index("index", self.build_index)
+
+    def on_commit(self, events):
+        for view in self.views.values():
+            for key in {e.key for e in events if view.is_changed_by(e)}:
+                view.update(key, self.data.get(key))
+        # a birthday is shown with the whole contact
+        for event in events:
+            contact = self.data.get(event.key)
+            if event.field in ("*", "birthday") or contact.birthday:
+                self.upcoming.invalidate()
+                break
+        if self.index is None:
+            return
+        for event in events:
+            if event.field == "*":
+                # a contact was added or deleted
+                for attr in self.index:
+                    if event.old:
+                        items = getattr(event.old, attr)
+                        self.__index_items(
+                            self.index, attr, event.key, items, False
+                        )
+                    if event.new:
+                        items = getattr(event.new, attr)
+                        self.__index_items(
+                            self.index, attr, event.key, items, True
+                        )
+            elif event.field in self.index:
+                attr = event.field
+                self.__index_items(
+                    self.index, attr, event.key, event.old or [], False
+                )
+                self.__index_items(
+                    self.index, attr, event.key, event.new or [], True
+                )
+
+    def find_by_key(self, attr, key):
+        """Contacts with a phone (attr "phones") or e-mail with the key"""
+        names = self.get_index()[attr].get(key)
+        if names is None:
+            return []
+        if isinstance(names, str):
+            names = (names,)
+        return [str(self.data[name]) for name in sorted(names)]
 
     def assert_name_is_free(self, name):
         good_name = Name(name)
@@ -263,26 +726,19 @@ class Contacts(UserDict, CmdProvider):
     def add_contact(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Name, Phone, Email, Birthday, Address]
-        list_of_prompts = [
-            "Name: ",
-            "Phone: ",
-            "Email: ",
-            "Birthday: ",
-            "Address: ",
-        ]
+        list_of_types, list_of_prompts = self.cmd_args("add-contact")
         data = get_extra_data_from_user_handler(
             list_of_types, list_of_prompts, self.assert_name_is_free
         )
         name = data[0].value
+        self.touch(name)
         self.data[name] = Contact(data[0], data[1], data[2], data[3], data[4])
         return f"Contact '{name}' was added"
 
     def rename_contact(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Name, Name]
-        list_of_prompts = ["Old name: ", "New name: "]
+        list_of_types, list_of_prompts = self.cmd_args("rename-contact")
         list_of_asserts = [self.assert_name_exist, self.assert_name_is_free]
         data = get_extra_data_from_user_handler(
             list_of_types,
@@ -292,6 +748,8 @@ class Contacts(UserDict, CmdProvider):
         )
         old_name = data[0].value
         new_name = data[1].value
+        self.touch(old_name)
+        self.touch(new_name)
         contact = self.data.pop(old_name)
         contact.name = new_name
         self.data[new_name] = contact
@@ -300,83 +758,133 @@ class Contacts(UserDict, CmdProvider):
     def delete_contact(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Name]
-        list_of_prompts = ["Name: "]
+        list_of_types, list_of_prompts = self.cmd_args("delete-contact")
         data = get_extra_data_from_user_handler(
             list_of_types, list_of_prompts, self.assert_name_exist
         )
         name = data[0].value
+        self.touch(name)
         self.data.pop(name)
         return f"Contact '{name}' was deleted"
 
+    def add_item(self, cmd, attr, what, get_extra_data_from_user_handler):
+        """Adds a labeled phone or e-mail to the contact"""
+        list_of_types, list_of_prompts = self.cmd_args(cmd)
+        data = get_extra_data_from_user_handler(
+            list_of_types, list_of_prompts, self.assert_name_exist
+        )
+        if data[1] is None:
+            raise ErrorWithMsg(Contacts.ERROR_MESSAGE_EMPTY.format(what))
+        name = data[0].value
+        contact = self.data[name]
+        if not contact.find_item(attr, data[1].key) is None:
+            raise ErrorWithMsg(
+                Contacts.ERROR_MESSAGE_ITEM_EXISTS.format(what, name)
+            )
+        label = data[2].value if data[2] else Contact.DEFAULT_LABEL
+        self.touch(name)
+        getattr(contact, attr).append((label, data[1]))
+        return f"{what} for '{name}' was added"
+
+    def edit_item(self, cmd, attr, what, get_extra_data_from_user_handler):
+        list_of_types, list_of_prompts = self.cmd_args(cmd)
+        data = get_extra_data_from_user_handler(
+            list_of_types, list_of_prompts, self.assert_name_exist
+        )
+        if data[1] is None or data[2] is None:
+            raise ErrorWithMsg(Contacts.ERROR_MESSAGE_EMPTY.format(what))
+        name = data[0].value
+        contact = self.data[name]
+        ix = self.get_item_index(contact, attr, what, data[1])
+        other_ix = contact.find_item(attr, data[2].key)
+        if not other_ix is None and other_ix != ix:
+            raise ErrorWithMsg(
+                Contacts.ERROR_MESSAGE_ITEM_EXISTS.format(what, name)
+            )
+        self.touch(name)
+        items = getattr(contact, attr)
+        label = data[3].value if data[3] else items[ix][0]
+        items[ix] = (label, data[2])
+        return f"{what} for '{name}' was changed"
+
+    def delete_item(self, cmd, attr, what, get_extra_data_from_user_handler):
+        list_of_types, list_of_prompts = self.cmd_args(cmd)
+        data = get_extra_data_from_user_handler(
+            list_of_types, list_of_prompts, self.assert_name_exist
+        )
+        name = data[0].value
+        contact = self.data[name]
+        ix = self.get_item_index(contact, attr, what, data[1])
+        self.touch(name)
+        getattr(contact, attr).pop(ix)
+        return f"{what} for '{name}' was deleted"
+
+    def get_item_index(self, contact, attr, what, item):
+        """Index of the item, it may be None if the contact has one item"""
+        items = getattr(contact, attr)
+        if item is None:
+            if len(items) == 1:
+                return 0
+            raise ErrorWithMsg(
+                Contacts.ERROR_MESSAGE_WHICH_ITEM.format(
+                    contact.name, len(items), what.lower()
+                )
+            )
+        ix = contact.find_item(attr, item.key)
+        if ix is None:
+            raise ErrorWithMsg(f"{what} is not found")
+        return ix
+
     def add_phone(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Name, Phone]
-        list_of_prompts = ["Name: ", "Phone: "]
-        data = get_extra_data_from_user_handler(
-            list_of_types,
-            list_of_prompts,
-            self.assert_name_exist,
-            mandatory_all_entries=True,
+        return self.add_item(
+            "add-phone", "phones", "Phone", get_extra_data_from_user_handler
         )
-        name = data[0].value
-        self.data[name].phone = data[1]
-        return f"Phone for '{name}' was set"
 
     def edit_phone(self, args, get_extra_data_from_user_handler):
-        return self.add_phone(args, get_extra_data_from_user_handler)
+        if len(args) > 0:
+            raise ValueError
+        return self.edit_item(
+            "edit-phone", "phones", "Phone", get_extra_data_from_user_handler
+        )
 
     def delete_phone(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Name]
-        list_of_prompts = ["Name: "]
-        data = get_extra_data_from_user_handler(
-            list_of_types, list_of_prompts, self.assert_name_exist
+        return self.delete_item(
+            "delete-phone", "phones", "Phone", get_extra_data_from_user_handler
         )
-        name = data[0].value
-        self.data[name].phone = None
-        return f"Phone for '{name}' was deleted"
 
     def add_email(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Name, Email]
-        list_of_prompts = ["Name: ", "Email: "]
-        data = get_extra_data_from_user_handler(
-            list_of_types,
-            list_of_prompts,
-            self.assert_name_exist,
-            mandatory_all_entries=True,
+        return self.add_item(
+            "add-email", "emails", "Email", get_extra_data_from_user_handler
         )
-        name = data[0].value
-        self.data[name].email = data[1]
-        return f"Email for '{name}' was set"
 
     def edit_email(self, args, get_extra_data_from_user_handler):
-        return self.add_email(args)
+        if len(args) > 0:
+            raise ValueError
+        return self.edit_item(
+            "edit-email", "emails", "Email", get_extra_data_from_user_handler
+        )
 
     def delete_email(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Name]
-        list_of_prompts = ["Name: "]
-        data = get_extra_data_from_user_handler(
-            list_of_types, list_of_prompts, self.assert_name_exist
+        return self.delete_item(
+            "delete-email", "emails", "Email", get_extra_data_from_user_handler
         )
-        name = data[0].value
-        self.data[name].email = None
-        return f"Email for '{name}' was deleted"
 
     def add_birthday(self, args, get_extra_data_from_user_handler):
-        list_of_types = [Name, Birthday]
+        list_of_types, list_of_prompts = self.cmd_args("add-birthday")
         data = list()
         if len(args) > 0:
             for i in range(len(list_of_types)):
                 data.append(list_of_types[i](args[i]))
+            self.assert_name_exist(data[0].value)
         else:
-            list_of_prompts = ["Name: ", "Birthday: "]
             data = get_extra_data_from_user_handler(
                 list_of_types,
                 list_of_prompts,
@@ -385,17 +893,17 @@ class Contacts(UserDict, CmdProvider):
             )
 
         name = data[0].value
+        self.touch(name)
         self.data[name].birthday = data[1]
         return f"Birthday for '{name}' was set"
 
     def edit_birthday(self, args, get_extra_data_from_user_handler):
-        return self.add_birthday(args)
+        return self.add_birthday(args, get_extra_data_from_user_handler)
 
     def delete_birthday(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Name]
-        list_of_prompts = ["Name: "]
+        list_of_types, list_of_prompts = self.cmd_args("delete-birthday")
         data = get_extra_data_from_user_handler(
             list_of_types,
             list_of_prompts,
@@ -403,14 +911,14 @@ class Contacts(UserDict, CmdProvider):
             mandatory_all_entries=True,
         )
         name = data[0].value
+        self.touch(name)
         self.data[name].birthday = None
         return f"Birthday for '{name}' was deleted"
 
     def add_address(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Name, Address]
-        list_of_prompts = ["Name: ", "Address: "]
+        list_of_types, list_of_prompts = self.cmd_args("add-address")
         data = get_extra_data_from_user_handler(
             list_of_types,
             list_of_prompts,
@@ -418,17 +926,17 @@ class Contacts(UserDict, CmdProvider):
             mandatory_all_entries=True,
         )
         name = data[0].value
+        self.touch(name)
         self.data[name].address = data[1]
         return f"Address for '{name}' was set"
 
     def edit_address(self, args, get_extra_data_from_user_handler):
-        return self.add_address(args)
+        return self.add_address(args, get_extra_data_from_user_handler)
 
     def delete_address(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Name]
-        list_of_prompts = ["Name: "]
+        list_of_types, list_of_prompts = self.cmd_args("delete-address")
         data = get_extra_data_from_user_handler(
             list_of_types,
             list_of_prompts,
@@ -436,14 +944,14 @@ class Contacts(UserDict, CmdProvider):
             mandatory_all_entries=True,
         )
         name = data[0].value
+        self.touch(name)
         self.data[name].address = None
         return f"Address for '{name}' was deleted"
 
     def find_contact(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Name]
-        list_of_prompts = ["Name: "]
+        list_of_types, list_of_prompts = self.cmd_args("find-contact")
         data = get_extra_data_from_user_handler(
             list_of_types, list_of_prompts, self.assert_name_exist
         )
@@ -452,11 +960,9 @@ class Contacts(UserDict, CmdProvider):
     def find_phone(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Phone]
-        list_of_prompts = ["Phone: "]
+        list_of_types, list_of_prompts = self.cmd_args("find-phone")
         data = get_extra_data_from_user_handler(list_of_types, list_of_prompts)
-        phone = data[0]
-        contact_list = [str(c) for c in self.data.values() if c.phone == phone]
+        contact_list = self.find_by_key("phones", data[0].key)
         if len(contact_list) == 0:
             raise ErrorWithMsg("Phone is not found")
         return contact_list
@@ -464,11 +970,9 @@ class Contacts(UserDict, CmdProvider):
     def find_email(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Email]
-        list_of_prompts = ["Email: "]
+        list_of_types, list_of_prompts = self.cmd_args("find-email")
         data = get_extra_data_from_user_handler(list_of_types, list_of_prompts)
-        email = data[0]
-        contact_list = [str(c) for c in self.data.values() if c.email == email]
+        contact_list = self.find_by_key("emails", data[0].key)
         if len(contact_list) == 0:
             raise ErrorWithMsg("Email is not found")
         return contact_list
@@ -476,8 +980,7 @@ class Contacts(UserDict, CmdProvider):
     def find_birthday(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Birthday]
-        list_of_prompts = ["Birthday: "]
+        list_of_types, list_of_prompts = self.cmd_args("find-birthday")
         data = get_extra_data_from_user_handler(list_of_types, list_of_prompts)
         birthday = data[0]
         contact_list = [
@@ -490,8 +993,7 @@ class Contacts(UserDict, CmdProvider):
     def find_address(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Address]
-        list_of_prompts = ["Address: "]
+        list_of_types, list_of_prompts = self.cmd_args("find-address")
         data = get_extra_data_from_user_handler(list_of_types, list_of_prompts)
         address = data[0]
         contact_list = [
@@ -504,33 +1006,245 @@ class Contacts(UserDict, CmdProvider):
     def all_contacts(self, args, get_extra_data_from_user_handler):
         return self.get_str_list_of_contacts()
 
+    @staticmethod
+    def get_birthday_sort_key(today):
+        def sort_key(key, contact):
+            # days to the next birthday, contacts without it are skipped
+            if not contact.birthday:
+                return None
+            born = parse_date(contact.birthday.value)
+            return ((next_birthday(born, today) - today).days, key)
+
+        return sort_key
+
+    def get_view(self, order):
+        today = date.today()
+        if self.views_day != today:
+            # days to the next birthdays change every day
+            self.views.pop("birthday", None)
+            self.views_day = today
+        if not order in self.views:
+            if order == "birthday":
+                sort_key = Contacts.get_birthday_sort_key(today)
+                view = SortedView(sort_key, ("birthday",))
+            else:
+                view = SortedView(lambda key, contact: (key.lower(), key), ())
+            self.views[order] = view.build(self.data)
+        return self.views[order]
+
+    def get_seek_key(self, order, text):
+        """Prefix of a sort key of the view to start from"""
+        if order == "name":
+            return (text.lower(),)
+        match = re.fullmatch(r"(\d\d?)\.(\d\d?)(?: (.+))?", text)
+        try:
+            # a leap year, so 29.02 is valid
+            born = date(2000, int(match[2]), int(match[1]))
+        except:
+            raise ErrorWithMsg("Start must be DD.MM [name]")
+        days = (next_birthday(born, self.views_day) - self.views_day).days
+        return (days, match[3]) if match[3] else (days,)
+
+    def get_cursor(self, order, sort_key):
+        """Start text of a page which begins with the sort key"""
+        name = sort_key[-1]
+        if order == "name":
+            return name
+        born = parse_date(self.data[name].birthday.value)
+        return f"{born:%d.%m} {name}"
+
+    def list_contacts(self, args, get_extra_data_from_user_handler):
+        if len(args) > 0:
+            raise ValueError
+        list_of_types, list_of_prompts = self.cmd_args("list-contacts")
+        data = get_extra_data_from_user_handler(list_of_types, list_of_prompts)
+        order = data[0].value
+        offset = data[2].value if data[2] else 0
+        limit = data[3].value if data[3] else Contacts.LIST_PAGE_SIZE
+        if offset < 0 or limit < 1:
+            raise ErrorWithMsg(Contacts.ERROR_MESSAGE_PAGE)
+        view = self.get_view(order)
+        start = self.get_seek_key(order, data[1].value) if data[1] else None
+        page, after = view.page(start, offset, limit)
+        if len(page) == 0:
+            raise ErrorWithMsg(Contacts.ERROR_MESSAGE_NOTHING_TO_LIST)
+        txt_list = [str(self.data[sort_key[-1]]) for sort_key in page]
+        if after:
+            txt_list.append(
+                Contacts.LIST_MORE_MSG.format(self.get_cursor(order, after))
+            )
+        return txt_list
+
+    def find_duplicates(self, args, get_extra_data_from_user_handler):
+        if len(args) > 0:
+            raise ValueError
+        list_of_types, list_of_prompts = self.cmd_args("find-duplicates")
+        data = get_extra_data_from_user_handler(
+            list_of_types, list_of_prompts, mandatory_first_entry=False
+        )
+        min_score = Contacts.DUPLICATES_MIN_SCORE
+        if data[0]:
+            min_score = data[0].value
+        duplicates = find_duplicates(self.data, min_score / 100)
+        if len(duplicates) == 0:
+            raise ErrorWithMsg(Contacts.ERROR_NO_DUPLICATES)
+        return (
+            Contacts.DUPLICATE_FORMAT.format(
+                score, name, other, ", ".join(reasons)
+            )
+            for score, name, other, reasons in duplicates
+        )
+
+    def merge_contacts(self, args, get_extra_data_from_user_handler):
+        if len(args) > 0:
+            raise ValueError
+        list_of_types, list_of_prompts = self.cmd_args("merge-contacts")
+        data = get_extra_data_from_user_handler(
+            list_of_types,
+            list_of_prompts,
+            [self.assert_name_exist, self.assert_name_exist],
+            mandatory_all_entries=True,
+        )
+        name, other = data[0].value, data[1].value
+        if name == other:
+            raise ErrorWithMsg(Contacts.ERROR_MESSAGE_SAME_CONTACT)
+        self.touch(name)
+        self.touch(other)
+        contact, duplicate = self.data[name], self.data.pop(other)
+        taken = [
+            attr
+            for attr in ("phones", "emails")
+            if contact.merge_items(duplicate, attr)
+        ]
+        taken.extend(
+            merge_records(contact, duplicate, ("birthday", "address"))
+        )
+        taken_text = f" (taken: {', '.join(taken)})" if taken else ""
+        return f"Contact '{other}' was merged into '{name}'{taken_text}"
+
+    def set_fields(self, contact, fields):
+        for field, value in fields.items():
+            if field in ("phone", "email"):
+                items = [(Contact.DEFAULT_LABEL, value)] if value else []
+                setattr(contact, field + "s", items)
+            else:
+                setattr(contact, field, value)
+
+    def assert_names_exist(self, names):
+        for name in names:
+            if not name in self.data:
+                raise ErrorWithMsg(
+                    Contacts.ERROR_MESSAGE_CONTACT_NOT_FOUND.format(name)
+                )
+
+    def bulk_upsert(self, rows, save_handler):
+        """Adds or changes contacts of dicts {"name": ..., "phone": ...} in
+        one transaction, returns number of changed contacts"""
+        batch = self.validate_rows(rows, "name", Name, Contacts.BULK_FIELDS)
+        records = {}
+        for name, fields in batch:
+            contact = records.get(name) or self.data.get(name)
+            # the stored contact is changed only by apply_records()
+            if contact:
+                contact = copy(contact)
+            else:
+                contact = Contact(Name.from_valid(name))
+            self.set_fields(contact, fields)
+            records[name] = contact
+        self.apply_records(records, save_handler)
+        return len(records)
+
+    def bulk_delete(self, names, save_handler):
+        """Deletes contacts with the names, all of them must exist"""
+        names, _, errors = Name.validate_column(names)
+        self.raise_batch_errors(
+            {ix: error for ix, error in enumerate(errors) if error}
+        )
+        self.assert_names_exist(names)
+        self.apply_records(dict.fromkeys(names), save_handler)
+        return len(set(names))
+
+    def bulk_set_field(self, field, values, save_handler):
+        """Sets the field of contacts {name: value}, None clears it"""
+        self.assert_names_exist(values.keys())
+        batch = self.validate_rows(
+            ({"name": name, field: value} for name, value in values.items()),
+            "name",
+            Name,
+            Contacts.BULK_FIELDS,
+        )
+        records = {}
+        for name, fields in batch:
+            records[name] = copy(self.data[name])
+            self.set_fields(records[name], fields)
+        self.apply_records(records, save_handler)
+        return len(records)
+
     def repack_birthdays_for_search(self):
         birthday_list = []
         for contact in self.data.values():
             if contact.birthday:
                 entry = {
                     "text": str(contact),
-                    "event": datetime.strptime(
-                        contact.birthday.value, "%d.%m.%Y"
+                    "event": datetime.combine(
+                        parse_date(contact.birthday.value), time()
                     ),
                 }
                 birthday_list.append(entry)
         return birthday_list
 
-    def __birthdays(self, num_of_days):
-        res_birthday_list = []
-        if num_of_days > 0:
-            birthday_list = self.repack_birthdays_for_search()
-            res_birthday_list = get_entries_for_next_x_days(
-                birthday_list, num_of_days
+    def get_next_event(self, name, after):
+        contact = self.data.get(name)
+        if not contact or not contact.birthday:
+            return None
+        born = parse_date(contact.birthday.value)
+        for year in (after.year, after.year + 1):
+            day = born.day
+            if born.month == 2 and day == 29 and not isleap(year):
+                # celebrated at 28-Feb in non leap year
+                day = 28
+            due = datetime.combine(
+                date(year, born.month, day), DEFAULT_EVENT_TIME
             )
-        return res_birthday_list
+            if due > after:
+                return due, f"Birthday of {contact}"
+        return None
+
+    def get_search_fields(self, key):
+        contact = self.data.get(key)
+        if contact is None:
+            return []
+        fields = [("name", key)]
+        for _, phone in contact.phones:
+            # digits of the phone are found in any format
+            digits = Phone.NON_DIGITS.sub("", phone.value)
+            fields.append(("phones", f"{digits} {phone.key[1:]}"))
+        fields.extend(("emails", email.value) for _, email in contact.emails)
+        for attr in ("address", "birthday"):
+            field = getattr(contact, attr)
+            if field and field.value:
+                fields.append((attr, field.value))
+        return fields
+
+    def __birthdays(self, num_of_days, single_line=False):
+        if num_of_days <= 0:
+            return []
+        today = datetime.today().date()
+        return self.upcoming.get(
+            (today, num_of_days, single_line),
+            lambda: get_entries_for_next_x_days(
+                self.repack_birthdays_for_search(),
+                num_of_days,
+                single_line,
+                today=today,
+            ),
+        )
 
     def birthdays(self, args, get_extra_data_from_user_handler):
         num_of_days = Contacts.BIRTHDAYS_NUM_OF_DAYS
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Number]
+        list_of_types, _ = self.cmd_args("birthdays")
         list_of_prompts = [f"Days (default {num_of_days}): "]
         data = get_extra_data_from_user_handler(
             list_of_types, list_of_prompts, mandatory_first_entry=False
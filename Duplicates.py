@@ -0,0 +1,114 @@
+import re
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+# blocks bigger than this are too common (e.g. a street) to tell anything,
+# they are skipped so the number of compared pairs stays linear
+MAX_BLOCK_SIZE = 30
+
+# weights of matching fields, a score is capped at 1
+WEIGHTS = {
+    "phones": 0.6,
+    "emails": 0.6,
+    "address": 0.3,
+    "birthday": 0.2,
+    "name": 0.3,
+}
+
+# multi-valued fields, a shared key of any of their items is a match
+ITEMS = ("phones", "emails")
+
+
+def field_value(record, name):
+    field = getattr(record, name, None)
+    return field.value if field and field.value else None
+
+
+def item_keys(record, name):
+    """Keys of the phones or e-mails of the record"""
+    return {item.key for _, item in getattr(record, name, ())}
+
+
+def address_shingles(address):
+    """Pairs of neighbour words of the address"""
+    words = re.findall(r"\w+", address.lower())
+    if len(words) < 2:
+        return set(words)
+    return {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def get_blocking_keys(record):
+    keys = [(name, key) for name in ITEMS for key in item_keys(record, name)]
+    address = field_value(record, "address")
+    if address:
+        keys.extend(("address", s) for s in address_shingles(address))
+    return keys
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0
+    return len(a & b) / len(a | b)
+
+
+def score_pair(a, b):
+    """Returns score 0..1 of two records and list of matched fields"""
+    score, reasons = 0, []
+    for name in ITEMS:
+        if item_keys(a, name) & item_keys(b, name):
+            score += WEIGHTS[name]
+            reasons.append(name[:-1])
+    birthday_a = field_value(a, "birthday")
+    if birthday_a and birthday_a == field_value(b, "birthday"):
+        score += WEIGHTS["birthday"]
+        reasons.append("birthday")
+    address_a = field_value(a, "address")
+    address_b = field_value(b, "address")
+    if address_a and address_b:
+        similarity = jaccard(
+            address_shingles(address_a), address_shingles(address_b)
+        )
+        if similarity > 0:
+            score += WEIGHTS["address"] * similarity
+            reasons.append(f"address {similarity:.0%}")
+    name_a = str(field_value(a, "name")).lower()
+    name_b = str(field_value(b, "name")).lower()
+    similarity = SequenceMatcher(None, name_a, name_b).ratio()
+    if similarity > 0.5:
+        score += WEIGHTS["name"] * similarity
+        reasons.append(f"name {similarity:.0%}")
+    return min(score, 1), reasons
+
+
+def find_duplicates(records, min_score=0.5):
+    """Returns sorted [(score, key, other key, reasons)] of records
+    which share a blocking key"""
+    blocks = defaultdict(list)
+    for key, record in records.items():
+        for block_key in get_blocking_keys(record):
+            blocks[block_key].append(key)
+    pairs = set()
+    for keys in blocks.values():
+        if len(keys) < 2 or len(keys) > MAX_BLOCK_SIZE:
+            continue
+        for i, key in enumerate(keys):
+            for other in keys[i + 1 :]:
+                pairs.add((key, other) if key < other else (other, key))
+    duplicates = []
+    for key, other in pairs:
+        score, reasons = score_pair(records[key], records[other])
+        if score >= min_score:
+            duplicates.append((score, key, other, reasons))
+    duplicates.sort(key=lambda item: (-item[0], item[1], item[2]))
+    return duplicates
+
+
+def merge_records(record, other, fields):
+    """Fills empty fields of the record from the other one, returns names
+    of the taken fields"""
+    taken = []
+    for name in fields:
+        if not field_value(record, name) and field_value(other, name):
+            setattr(record, name, getattr(other, name))
+            taken.append(name)
+    return taken
@@ -0,0 +1,257 @@
+import asyncio
+import json
+import os
+import threading
+
+from BaseClasses import *
+
+
+class HTTPFront(FrontBase):
+    """Local HTTP/JSON frontend: POST /<cmd> takes values by CmdArg names
+    from the JSON body, GET / lists the commands"""
+
+    HOST = "127.0.0.1"
+    PORT = 8765
+    MAX_BODY_SIZE = 1024 * 1024
+    INVALID_CMD_MSG = "Invalid command!"
+    EMPTY_FIELD_MSG = "Field '{}' can not be empty"
+    REASONS = {
+        200: "OK",
+        400: "Bad Request",
+        404: "Not Found",
+        405: "Method Not Allowed",
+        413: "Payload Too Large",
+        500: "Internal Server Error",
+    }
+
+    def __init__(self, host=HOST, port=PORT, unix_socket=None):
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.save_handler = None
+        self.lock = RWLock()
+        self.registry = CmdRegistry()
+        # commands run in threads of the executor, each one has its request
+        self.__local = threading.local()
+        self.__loop = None
+        self.__stop_event = None
+        # set when the server is listening
+        self.started = threading.Event()
+
+    def set_cmd_providers(self, cmd_providers):
+        # commands of other frontends (help, exit, ...) control those
+        # frontends, so they are not exposed
+        self.registry = CmdRegistry(
+            [p for p in cmd_providers if not isinstance(p, FrontBase)]
+        )
+
+    def set_save_handler(self, handler):
+        self.save_handler = handler
+
+    def get_extra_data_from_user(
+        self,
+        list_of_types,
+        list_of_prompts,
+        assert_validator=None,
+        mandatory_first_entry=True,
+        mandatory_all_entries=False,
+        completers=None,
+    ):
+        cmd_info, body = self.__local.request
+        # a command may ask its arguments by parts, one after another
+        first = self.__local.arg_ix
+        num = min(len(list_of_types), len(list_of_prompts))
+        data = [None] * num
+        assert_validators = self.get_validators(assert_validator, num)
+        # values without CmdArg description are taken by position
+        values = body.get("values", [])
+        for i in range(num):
+            is_current_entry_mandatory = (
+                mandatory_first_entry or mandatory_all_entries
+            )
+            ix = first + i
+            if ix < len(cmd_info.args):
+                name = cmd_info.args[ix].name
+                value = body.get(name)
+            else:
+                name = str(ix)
+                value = values[ix] if ix < len(values) else None
+            if value is None or len(str(value).strip()) == 0:
+                if is_current_entry_mandatory:
+                    raise ErrorWithMsg(HTTPFront.EMPTY_FIELD_MSG.format(name))
+                continue
+            data[i] = list_of_types[i](str(value))
+            if assert_validators[i]:
+                assert_validators[i](data[i].value)
+            mandatory_first_entry = False
+        self.__local.arg_ix = first + num
+        return data
+
+    def get_cmds_list(self):
+        cmds_list = []
+        for cmd_provider, cmd_info in self.registry.cmds.values():
+            cmds_list.append(
+                {
+                    "cmd": cmd_info.name,
+                    "description": cmd_info.description,
+                    "mutating": cmd_info.mutating,
+                    "args": [arg.name for arg in cmd_info.args],
+                }
+            )
+        return cmds_list
+
+    def exe_cmd(self, cmd, body):
+        """Returns HTTP status and JSON-serializable answer"""
+        cmd_provider, cmd_info = self.registry.get(cmd)
+        if cmd_provider is None:
+            return 404, {"error": HTTPFront.INVALID_CMD_MSG}
+        self.__local.request = (cmd_info, body)
+        self.__local.arg_ix = 0
+        try:
+            if cmd_info.mutating:
+                with self.lock.write_lock(), Transaction(
+                    cmd_provider, self.save_handler
+                ):
+                    ret = self.exe_locked(cmd_provider, cmd)
+            else:
+                with self.lock.read_lock():
+                    ret = self.exe_locked(cmd_provider, cmd)
+            return 200, {"result": ret}
+        except ErrorWithMsg as e:
+            return 400, {"error": str(e)}
+        except (ValueError, IndexError) as e:
+            return 400, {
+                "error": HTTPFront.INVALID_CMD_MSG,
+                "usage": cmd_info.usage,
+            }
+        except Exception as e:
+            return 500, {"error": str(e)}
+        finally:
+            self.__local.request = None
+
+    def exe_locked(self, cmd_provider, cmd):
+        ret = cmd_provider.exe(cmd, [], self.get_extra_data_from_user)
+        # lazy output reads the records, so it is rendered under the lock
+        if not isinstance(ret, str):
+            ret = [str(line) for line in ret]
+        return ret
+
+    def handle_request(self, method, path, body):
+        cmd = path.split("?", 1)[0].strip("/")
+        if len(cmd) == 0:
+            return 200, {"result": self.get_cmds_list()}
+        if method != "POST":
+            return 405, {"error": "Use POST to call a command"}
+        try:
+            body = json.loads(body) if body else {}
+        except ValueError:
+            return 400, {"error": "Body must be a JSON object"}
+        if not isinstance(body, dict):
+            return 400, {"error": "Body must be a JSON object"}
+        return self.exe_cmd(cmd, body)
+
+    async def read_request(self, reader):
+        """Returns (method, path, headers, body) or None if connection closed"""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, path, version = request_line.decode("latin-1").split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        headers["version"] = version
+        length = int(headers.get("content-length", 0))
+        if length > HTTPFront.MAX_BODY_SIZE:
+            return method, path, headers, None
+        body = await reader.readexactly(length) if length else b""
+        return method, path, headers, body
+
+    def make_response(self, status, answer, keep_alive):
+        body = json.dumps(answer, ensure_ascii=False).encode()
+        head = (
+            f"HTTP/1.1 {status} {HTTPFront.REASONS[status]}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+        )
+        if not keep_alive:
+            head += "Connection: close\r\n"
+        return head.encode() + b"\r\n" + body
+
+    async def handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    request = await self.read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError):
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                connection = headers.get("connection", "").lower()
+                if headers["version"] == "HTTP/1.0":
+                    keep_alive = connection == "keep-alive"
+                else:
+                    keep_alive = connection != "close"
+                if body is None:
+                    status, answer = 413, {"error": "Body is too big"}
+                    keep_alive = False
+                else:
+                    # a command may wait for the lock of the store, other
+                    # connections are served meanwhile
+                    status, answer = await loop.run_in_executor(
+                        None, self.handle_request, method, path, body
+                    )
+                writer.write(self.make_response(status, answer, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            # client has gone or the server is stopping with open connections
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        self.__loop = asyncio.get_running_loop()
+        self.__stop_event = asyncio.Event()
+        if self.unix_socket:
+            if os.path.exists(self.unix_socket):
+                os.unlink(self.unix_socket)
+            server = await asyncio.start_unix_server(
+                self.handle_connection, path=self.unix_socket
+            )
+        else:
+            server = await asyncio.start_server(
+                self.handle_connection, self.host, self.port
+            )
+            self.port = server.sockets[0].getsockname()[1]
+        self.started.set()
+        async with server:
+            await self.__stop_event.wait()
+        if self.unix_socket and os.path.exists(self.unix_socket):
+            os.unlink(self.unix_socket)
+
+    def stop(self):
+        loop = self.__loop
+        # the server may have failed to start or already finished
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self.__stop_event.set)
+        except RuntimeError:
+            # the loop was closed meanwhile
+            pass
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+        if not self.save_handler is None:
+            with self.lock.read_lock():
+                self.save_handler()
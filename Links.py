@@ -0,0 +1,59 @@
+import re
+from collections import defaultdict
+
+# [[Topic]] in a text of a note is a link to the note with the topic
+LINK = re.compile(r"\[\[([^\[\]\n]+)\]\]")
+
+
+def extract_links(text):
+    """Topics of the links of the text, in their order, once"""
+    return list(dict.fromkeys(topic.strip() for topic in LINK.findall(text)))
+
+
+def rename_links(text, old, new):
+    """Text with links to the old topic changed to the new one"""
+    pattern = r"\[\[\s*" + re.escape(old) + r"\s*\]\]"
+    return re.sub(pattern, lambda match: f"[[{new}]]", text)
+
+
+class LinkIndex:
+    """Links between items and back, so linked items are found without
+    reading texts of all the items"""
+
+    def __init__(self):
+        self.links = {}
+        self.backlinks = defaultdict(set)
+
+    def update(self, key, targets):
+        """Sets targets of the links of the item, empty ones remove it"""
+        for target in self.links.pop(key, ()):
+            sources = self.backlinks[target]
+            sources.discard(key)
+            if not sources:
+                del self.backlinks[target]
+        if targets:
+            self.links[key] = set(targets)
+            for target in targets:
+                self.backlinks[target].add(key)
+
+    def get_links(self, key):
+        return self.links.get(key, set())
+
+    def get_backlinks(self, key):
+        return self.backlinks.get(key, set())
+
+    def get_neighbors(self, key, hops):
+        """Returns {key: distance} of items reachable by at most hops
+        links in any direction, without the item itself"""
+        distances = {key: 0}
+        frontier = [key]
+        for distance in range(1, hops + 1):
+            next_frontier = []
+            for item in frontier:
+                for other in self.get_links(item) | self.get_backlinks(item):
+                    if not other in distances:
+                        distances[other] = distance
+                        next_frontier.append(other)
+            frontier = next_frontier
+        del distances[key]
+        return distances
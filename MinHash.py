@@ -0,0 +1,108 @@
+import re
+import zlib
+from collections import defaultdict
+
+# a hash of a shingle puts it into one of NUM_HASHES bins (one permutation
+# hashing), a signature is the minimum of every bin: one hash per shingle
+# instead of NUM_HASHES ones
+NUM_HASHES = 16
+# signatures are split into bands of ROWS hashes, items which have an
+# equal band are candidates: 8 bands of 2 rows find a pair with
+# similarity 0.5 with probability 0.9
+ROWS = 2
+# buckets bigger than this are too common (e.g. the same tag) to tell
+# anything, they are skipped so the number of compared pairs stays linear
+MAX_BUCKET_SIZE = 30
+
+
+def get_shingles(text, tags=()):
+    """Pairs of neighbour words of the text and the tags"""
+    words = re.findall(r"\w+", text.lower())
+    shingles = set(map(" ".join, zip(words, words[1:])))
+    if len(words) == 1:
+        shingles.add(words[0])
+    shingles.update(f"#{tag.lower()}" for tag in tags)
+    return shingles
+
+
+def get_signature(shingles):
+    bins = [None] * NUM_HASHES
+    for value in map(zlib.crc32, map(str.encode, shingles)):
+        value, ix = divmod(value, NUM_HASHES)
+        if bins[ix] is None or value < bins[ix]:
+            bins[ix] = value
+    # an empty bin (a short text) takes the value of the next one with
+    # the distance added above the hash bits, so it does not match a full
+    # bin by chance
+    full = [ix for ix, value in enumerate(bins) if value is not None]
+    for ix, value in enumerate(bins):
+        if value is None:
+            distance, next_ix = min(
+                ((other - ix) % NUM_HASHES, other) for other in full
+            )
+            bins[ix] = bins[next_ix] + (distance << 32)
+    return tuple(bins)
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0
+    return len(a & b) / len(a | b)
+
+
+class MinHashIndex:
+    """Signatures of items bucketed by their bands, so similar items are
+    found without comparing all of them"""
+
+    def __init__(self):
+        self.signatures = {}
+        self.buckets = defaultdict(set)
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def get_bands(self, signature):
+        return [
+            (ix, signature[ix : ix + ROWS])
+            for ix in range(0, NUM_HASHES, ROWS)
+        ]
+
+    def update(self, key, shingles):
+        """Sets shingles of the item, None or empty ones remove it"""
+        signature = self.signatures.pop(key, None)
+        if signature is not None:
+            for band in self.get_bands(signature):
+                bucket = self.buckets[band]
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band]
+        if shingles:
+            signature = get_signature(shingles)
+            self.signatures[key] = signature
+            for band in self.get_bands(signature):
+                self.buckets[band].add(key)
+
+    def get_candidates(self, key):
+        """Keys which share a band with the item"""
+        candidates = set()
+        signature = self.signatures.get(key)
+        if signature is None:
+            return candidates
+        for band in self.get_bands(signature):
+            bucket = self.buckets[band]
+            if len(bucket) <= MAX_BUCKET_SIZE:
+                candidates.update(bucket)
+        candidates.discard(key)
+        return candidates
+
+    def get_pairs(self):
+        """Pairs of keys which share a band, each pair once"""
+        pairs = set()
+        for bucket in self.buckets.values():
+            if len(bucket) < 2 or len(bucket) > MAX_BUCKET_SIZE:
+                continue
+            keys = sorted(bucket)
+            for i, key in enumerate(keys):
+                for other in keys[i + 1 :]:
+                    pairs.add((key, other))
+        return pairs
@@ -1,14 +1,29 @@
 import re
+from calendar import monthrange
 from collections import UserDict
-from datetime import datetime
+from copy import copy
+from datetime import datetime, timedelta
 
 from BaseClasses import (
+    DEFAULT_EVENT_TIME,
+    Cmd,
+    CmdArg,
     CmdProvider,
     ErrorWithMsg,
     Field,
+    MemoCache,
     get_entries_for_next_x_days,
+    parse_date,
+    parse_time,
 )
-from Contacts import Number
+from Blobs import BlobStore
+from Contacts import Number, Percent
+from Links import LinkIndex, extract_links, rename_links
+from MinHash import MinHashIndex, get_shingles, jaccard
+from Reminders import ReminderIndex
+from Revisions import add_revision, get_revision, iter_revisions
+from TagStats import TagStats
+from Views import SeekText, SortedView
 
 
 class Topic(Field):
@@ -29,6 +44,35 @@ class Text(Field):
         return text
 
 
+class BlobText(Text):
+    """Text kept in a BlobStore, it is read when its value is used"""
+
+    def __init__(self, store, ref):
+        self.store = store
+        self.ref = ref
+
+    @property
+    def value(self):
+        return self.store.get(self.ref).decode()
+
+    def __eq__(self, other):
+        return Text(self.value) == other
+
+    def __deepcopy__(self, memo):
+        # blobs are never changed
+        return self
+
+    def __reduce__(self):
+        if BlobStore.get_persisting() is self.store:
+            return (restore_blob_text, self.ref)
+        # e.g. a sync file gets the text itself
+        return (Text, (self.value,))
+
+
+def restore_blob_text(*ref):
+    return BlobText(BlobStore.get_persisting(), ref)
+
+
 class Tags(Field):
     def validate(self, tags: str) -> [str]:
         if not isinstance(tags, str):
@@ -38,26 +82,129 @@ class Tags(Field):
 
 
 class Reminder(Field):
-    """Class for storing a reminder. Validates the format (expecting DD.MM.YYYY)."""
+    """Class for storing a reminder. Validates the format (expecting DD.MM.YYYY [HH:MM])."""
 
     def validate(self, reminder: str):
-        reminder = reminder.strip()
+        reminder = " ".join(reminder.split())
+        date_text, _, time_text = reminder.partition(" ")
         try:
-            datetime.strptime(reminder, "%d.%m.%Y")
+            parse_date(date_text)
+            if time_text:
+                parse_time(time_text)
         except:
-            raise ErrorWithMsg("Invalid reminder format (DD.MM.YYYY)")
+            raise ErrorWithMsg("Invalid reminder format (DD.MM.YYYY [HH:MM])")
         return reminder
 
+    def get_datetime(self):
+        """Time of the reminder, DEFAULT_EVENT_TIME if it has only date"""
+        date_text, _, time_text = self.value.partition(" ")
+        day = parse_date(date_text)
+        if time_text:
+            return datetime.combine(day, parse_time(time_text))
+        return datetime.combine(day, DEFAULT_EVENT_TIME)
+
+
+class Repeat(Field):
+    """Repeating of a reminder, the reminder date is the first occurrence"""
+
+    RULES = ("daily", "weekly", "monthly", "yearly")
+    DAYS = {"daily": 1, "weekly": 7}
+    # stops repeating
+    NEVER = "~"
+
+    def validate(self, repeat: str):
+        repeat = repeat.strip().lower()
+        if repeat in Repeat.RULES or repeat == Repeat.NEVER:
+            return repeat
+        raise ErrorWithMsg(
+            f"Repeat must be one of: {', '.join(Repeat.RULES)} or '~'"
+        )
+
+    def __bool__(self):
+        return not self.value in (None, Repeat.NEVER)
+
+    @staticmethod
+    def shift_months(first, months):
+        """first + months, the day is clamped to the end of short months"""
+        month_ix = first.month - 1 + months
+        year, month = first.year + month_ix // 12, month_ix % 12 + 1
+        day = min(first.day, monthrange(year, month)[1])
+        return first.replace(year=year, month=month, day=day)
+
+    def occurrences(self, first, start, end):
+        """Yields occurrences in [start, end) without walking from first"""
+        if self.value in Repeat.DAYS:
+            step = timedelta(days=Repeat.DAYS[self.value])
+            skip = max(0, -((first - start) // step))
+            due = first + skip * step
+            while due < end:
+                yield due
+                due += step
+            return
+        months = 1 if self.value == "monthly" else 12
+        ix = 0
+        if start > first:
+            ix = ((start.year - first.year) * 12 + start.month - first.month)
+            ix = max(0, ix // months - 1)
+        while True:
+            due = Repeat.shift_months(first, ix * months)
+            if due >= end:
+                return
+            if due >= start:
+                yield due
+            ix += 1
+
 
 class Note:
+    # notes saved before repeating, history or links were added have no
+    # own attributes, their links are extracted when they are used
+    repeat = None
+    history = ()
+    links = None
+
     def __init__(
-        self, topic: Topic, text: Text, tags: Tags, reminder: Reminder
+        self,
+        topic: Topic,
+        text: Text,
+        tags: Tags,
+        reminder: Reminder,
+        repeat: Repeat = None,
     ):
         self.topic = topic
         self.text = text
         self.text_tags = self.extract_hashtags(text.value) if text else []
+        # topics of [[Topic]] links in the text
+        self.links = extract_links(text.value) if text else []
         self.user_tags = tags.value if tags else []
         self.reminder = reminder
+        self.repeat = repeat
+        # previous texts, see Revisions
+        self.history = ()
+
+    def set_text(self, text: Text):
+        """Changes the text, the old one is added to the history"""
+        old = self.text
+        new_text = text.value if text else ""
+        if old and old.value and old.value != new_text:
+            self.history = add_revision(self.history, old, new_text)
+        self.text = text
+        self.text_tags = self.extract_hashtags(new_text)
+        self.links = extract_links(new_text)
+
+    def get_links(self):
+        if self.links is None:
+            return extract_links(self.text.value) if self.text else []
+        return self.links
+
+    def reminder_occurrences(self, start, end):
+        """Yields datetimes of the reminder in [start, end)"""
+        if not self.reminder:
+            return
+        first = self.reminder.get_datetime()
+        if self.repeat:
+            yield from self.repeat.occurrences(first, start, end)
+        elif start <= first < end:
+            yield first
 
     @staticmethod
     def extract_hashtags(text: str):
@@ -71,6 +218,14 @@ class Note:
             reminder_text += f", text: {self.text}"
         return reminder_text
 
+    def get_tags(self):
+        return set(self.text_tags + self.user_tags)
+
+    def get_shingles(self):
+        """Shingles of the text and the tags, see MinHash"""
+        text = self.text.value if self.text else ""
+        return get_shingles(text, self.text_tags + self.user_tags)
+
     def __str__(self):
         note_text = f"Topic: {self.topic}"
         if self.text and self.text.value:
@@ -81,54 +236,298 @@ class Note:
             note_text += f", user tags: {', '.join(self.user_tags)}"
         if self.reminder:
             note_text += f", reminder: {self.reminder}"
+        if self.repeat:
+            note_text += f", repeat: {self.repeat}"
         return note_text
 
 
+class NotesOrder(Field):
+    ORDERS = ("topic", "reminder")
+
+    def validate(self, order: str):
+        order = order.strip().lower()
+        if order in NotesOrder.ORDERS:
+            return order
+        raise ErrorWithMsg(
+            f"Order must be one of: {', '.join(NotesOrder.ORDERS)}"
+        )
+
+
 class Notes(UserDict, CmdProvider):
     ERROR_MESSAGE_TAG_NOT_FOUND = "Tag is not found"
     ERROR_EMPTY_NOTES_LIST = "Notes list is empty. Please add some notes first"
     ERROR_MESSAGE_TOPIC_ALREADY_EXISTS = "Topic {} already exists"
     ERROR_MESSAGE_TOPIC_NOT_FOUND = "Topic is not found"
+    ERROR_MESSAGE_NO_REMINDER = "Note has no reminder to repeat"
+    ERROR_MESSAGE_NOTHING_TO_LIST = "No notes from this place"
+    ERROR_MESSAGE_PAGE = "Skip must be 0 or more and limit 1 or more"
+    ERROR_MESSAGE_NO_HISTORY = "Note has no previous texts"
+    ERROR_MESSAGE_REVISION = "Revision must be from 1 to {}"
+    HISTORY_FORMAT = "  {:>8}  {:<16}  {}"
+    HISTORY_PREVIEW_SIZE = 60
+    ERROR_MESSAGE_NO_SIMILAR = "No similar notes found"
+    SIMILAR_MIN_SCORE = 50
+    SIMILAR_FORMAT = "{:>4.0%} {}"
+    # changes of these fields change the shingles of a note
+    SIMILAR_FIELDS = ("text", "text_tags", "user_tags")
+    TAG_FIELDS = ("text_tags", "user_tags")
+    # related tags offered first in the prompt of tags
+    TAG_SUGGESTIONS = 10
+    ERROR_MESSAGE_NO_BACKLINKS = "No notes link to this topic"
+    ERROR_MESSAGE_NO_LINKED = "No linked notes found"
+    ERROR_MESSAGE_HOPS = "Hops must be 1 or more"
+    LINKED_HOPS = 2
+    LINKED_FORMAT = "  {:>4}  {}{}"
+    # a linked topic without a note
+    MISSING_MARK = " (no note)"
+    LIST_PAGE_SIZE = 20
+    LIST_MORE_MSG = "More: start from '{}'"
     WELCOME_REMINDERS_NUM_OF_DAYS = 7
     REMINDERS_NUM_OF_DAYS = 7
+    SEARCH_WEIGHTS = {"topic": 3, "tags": 2, "text": 1}
+    # lists of upcoming reminders kept while no reminder is changed
+    UPCOMING_CACHE_SIZE = 16
+    # longer texts are kept in the blob store, not in memory
+    BLOB_TEXT_MIN_SIZE = 4096
+    # fields of the bulk API
+    BULK_FIELDS = {
+        "text": Text,
+        "tags": Tags,
+        "reminder": Reminder,
+        "repeat": Repeat,
+    }
 
     cmds_help = (
-        ("add-note", "add-note", "Add a note to notebook"),
-        ("rename-note", "rename-note", "Rename note topic"),
-        ("edit-note", "edit-note", "Edit note text"),
-        ("delete-note", "delete-note", "Delete a note from notebook"),
-        ("add-tag", "add-tag", "Add one or more tags to note"),
-        ("delete-tag", "delete-tag", "Delete one or more tags from note"),
-        ("add-reminder", "add-reminder", "Add reminder for note"),
-        ("edit-reminder", "edit-reminder", "Edit reminder for note"),
-        ("delete-reminder", "delete-reminder", "Delete reminder for note"),
-        ("find-note", "find-note", "Find note in notebook by its topic"),
-        ("find-tag", "find-tag", "Find note in notebook by its tag"),
-        ("all-notes", "all-notes", "Show the complete list of notes"),
-        ("reminders", "reminders", "Show reminders for next X days"),
-        (
+        Cmd(
+            "add-note",
+            "add-note",
+            "Add a note to notebook",
+            mutating=True,
+            args=(
+                CmdArg("topic", Topic, "Topic: "),
+                CmdArg("text", Text, "Text: "),
+                CmdArg("tags", Tags, "Tags: "),
+                CmdArg("reminder", Reminder, "Reminder: "),
+                CmdArg("repeat", Repeat, "Repeat: "),
+            ),
+        ),
+        Cmd(
+            "rename-note",
+            "rename-note",
+            "Rename note topic",
+            mutating=True,
+            args=(
+                CmdArg("old_topic", Topic, "Old topic: "),
+                CmdArg("new_topic", Topic, "New topic: "),
+            ),
+        ),
+        Cmd(
+            "edit-note",
+            "edit-note",
+            "Edit note text",
+            mutating=True,
+            args=(
+                CmdArg("topic", Topic, "Topic: "),
+                CmdArg("text", Text, "New text: "),
+            ),
+        ),
+        Cmd(
+            "note-history",
+            "note-history",
+            "Show previous texts of a note",
+            args=(CmdArg("topic", Topic, "Topic: "),),
+        ),
+        Cmd(
+            "note-revert",
+            "note-revert",
+            "Return a previous text of a note, the current one is kept",
+            mutating=True,
+            args=(
+                CmdArg("topic", Topic, "Topic: "),
+                CmdArg("revision", Number, "Revision: "),
+            ),
+        ),
+        Cmd(
+            "backlinks",
+            "backlinks",
+            "Show notes which link to a topic with [[Topic]]",
+            args=(CmdArg("topic", Topic, "Topic: "),),
+        ),
+        Cmd(
+            "linked-notes",
+            "linked-notes",
+            "Show notes linked with a note directly or through other notes",
+            args=(
+                CmdArg("topic", Topic, "Topic: "),
+                CmdArg("hops", Number, f"Hops (default {LINKED_HOPS}): "),
+            ),
+        ),
+        Cmd(
+            "delete-note",
+            "delete-note",
+            "Delete a note from notebook",
+            mutating=True,
+            args=(CmdArg("topic", Topic, "Topic: "),),
+        ),
+        Cmd(
+            "add-tag",
+            "add-tag",
+            "Add one or more tags to note",
+            mutating=True,
+            args=(
+                CmdArg("topic", Topic, "Topic: "),
+                CmdArg("tags", Tags, "Tag(s): "),
+            ),
+        ),
+        Cmd(
+            "delete-tag",
+            "delete-tag",
+            "Delete one or more tags from note",
+            mutating=True,
+            args=(
+                CmdArg("topic", Topic, "Topic: "),
+                CmdArg("tags", Tags, "Tag(s): "),
+            ),
+        ),
+        Cmd(
+            "add-reminder",
+            "add-reminder",
+            "Add reminder for note",
+            mutating=True,
+            args=(
+                CmdArg("topic", Topic, "Topic: "),
+                CmdArg("reminder", Reminder, "Reminder: "),
+            ),
+        ),
+        Cmd(
+            "edit-reminder",
+            "edit-reminder",
+            "Edit reminder for note",
+            mutating=True,
+            args=(
+                CmdArg("topic", Topic, "Topic: "),
+                CmdArg("reminder", Reminder, "Reminder: "),
+            ),
+        ),
+        Cmd(
+            "repeat-reminder",
+            "repeat-reminder",
+            "Repeat reminder daily|weekly|monthly|yearly ('~' to stop)",
+            mutating=True,
+            args=(
+                CmdArg("topic", Topic, "Topic: "),
+                CmdArg("repeat", Repeat, "Repeat: "),
+            ),
+        ),
+        Cmd(
+            "delete-reminder",
+            "delete-reminder",
+            "Delete reminder for note",
+            mutating=True,
+            args=(CmdArg("topic", Topic, "Topic: "),),
+        ),
+        Cmd(
+            "find-note",
+            "find-note",
+            "Find note in notebook by its topic",
+            args=(CmdArg("topic", Topic, "Topic: "),),
+        ),
+        Cmd(
+            "find-tag",
+            "find-tag",
+            "Find note in notebook by its tag",
+            args=(CmdArg("tags", Tags, "Tag(s): "),),
+        ),
+        Cmd("all-notes", "all-notes", "Show the complete list of notes"),
+        Cmd(
+            "similar-notes",
+            "similar-notes",
+            "Find notes with a similar text and tags",
+            args=(
+                CmdArg("topic", Topic, "Topic: "),
+                CmdArg(
+                    "min_score",
+                    Percent,
+                    f"Minimum similarity % (default {SIMILAR_MIN_SCORE}): ",
+                ),
+            ),
+        ),
+        Cmd(
+            "dedupe-notes",
+            "dedupe-notes",
+            "Find pairs of notes with a similar text and tags",
+            args=(
+                CmdArg(
+                    "min_score",
+                    Percent,
+                    f"Minimum similarity % (default {SIMILAR_MIN_SCORE}): ",
+                ),
+            ),
+        ),
+        Cmd(
+            "list-notes",
+            "list-notes",
+            "Show notes sorted by topic or reminder date page by page",
+            args=(
+                CmdArg("order", NotesOrder, "Order (topic, reminder): "),
+                CmdArg(
+                    "start",
+                    SeekText,
+                    "Start from (topic or DD.MM.YYYY [HH:MM] [topic]): ",
+                ),
+                CmdArg("offset", Number, "Skip: "),
+                CmdArg("limit", Number, "Limit (default 20): "),
+            ),
+        ),
+        Cmd(
+            "reminders",
+            "reminders",
+            "Show reminders for next X days",
+            args=(CmdArg("days", Number, "Days: "),),
+        ),
+        Cmd(
             "find-reminder",
             "find-reminder",
             "Find notes appropriate to reminder date",
+            args=(CmdArg("reminder", Reminder, "Reminder date: "),),
         ),
     )
 
     def __init__(self) -> None:
         super().__init__()
-        self.__current_topic = None
+        self.blobs = None
+        # order -> SortedView, built when it is listed for the first time
+        self.views = {}
+        # MinHashIndex of notes, built when it is used for the first time
+        self.similar = None
+        # TagStats of notes, built when tags are completed for the first time
+        self.tag_stats = None
+        # LinkIndex of notes, built when it is used for the first time
+        self.link_index = None
+        # ReminderIndex of notes, built when reminders are shown first time
+        self.reminder_index = None
+        self.upcoming = MemoCache(Notes.UPCOMING_CACHE_SIZE)
         self.cmds = {}
         self.cmds["add-note"] = self.add_note
         self.cmds["rename-note"] = self.rename_note
         self.cmds["edit-note"] = self.edit_note
+        self.cmds["note-history"] = self.note_history
+        self.cmds["note-revert"] = self.note_revert
         self.cmds["delete-note"] = self.delete_note
+        self.cmds["backlinks"] = self.show_backlinks
+        self.cmds["linked-notes"] = self.show_linked_notes
         self.cmds["add-tag"] = self.add_tag
         self.cmds["delete-tag"] = self.delete_tag
         self.cmds["add-reminder"] = self.add_reminder
         self.cmds["edit-reminder"] = self.edit_reminder
+        self.cmds["repeat-reminder"] = self.repeat_reminder
         self.cmds["delete-reminder"] = self.delete_reminder
         self.cmds["find-note"] = self.find_note_by_topic
         self.cmds["find-tag"] = self.mixed_search_notes_by_tags
         self.cmds["all-notes"] = self.show_all_notes
+        self.cmds["similar-notes"] = self.similar_notes
+        self.cmds["dedupe-notes"] = self.dedupe_notes
+        self.cmds["list-notes"] = self.list_notes
         self.cmds["reminders"] = self.reminders
         self.cmds["find-reminder"] = self.find_note_by_reminder
 
@@ -149,7 +548,9 @@ class Notes(UserDict, CmdProvider):
     def get_str_list_of_notes(self):
         if len(self.data) == 0:
             raise ErrorWithMsg(Notes.ERROR_EMPTY_NOTES_LIST)
-        return [str(note) for note in self.data.values()]
+        # notes are rendered when they are printed, the list is copied
+        # so other frontends can change the notebook meanwhile
+        return (str(note) for note in list(self.data.values()))
 
     def help(self):
         return Notes.cmds_help
@@ -162,6 +563,57 @@ class Notes(UserDict, CmdProvider):
 
     def set_from_file(self, data):
         self.data = data
+        self.views = {}
+        self.similar = None
+        self.tag_stats = None
+        self.link_index = None
+        self.reminder_index = None
+        self.upcoming.invalidate()
+
+    def on_commit(self, events):
+        for view in self.views.values():
+            for key in {e.key for e in events if view.is_changed_by(e)}:
+                view.update(key, self.data.get(key))
+        # a reminder is shown with the topic and the text of the note
+        for event in events:
+            note = self.data.get(event.key)
+            if event.field in ("*", "reminder", "repeat") or note.reminder:
+                self.upcoming.invalidate()
+                break
+        if self.reminder_index is not None:
+            fields = ("*", "reminder", "repeat")
+            for key in {e.key for e in events if e.field in fields}:
+                self.update_reminder_index(self.reminder_index, key)
+        if self.similar is not None:
+            fields = Notes.SIMILAR_FIELDS
+            for key in {
+                e.key for e in events if e.field == "*" or e.field in fields
+            }:
+                note = self.data.get(key)
+                self.similar.update(key, note.get_shingles() if note else None)
+        if self.tag_stats is not None:
+            fields = Notes.TAG_FIELDS
+            for key in {
+                e.key for e in events if e.field == "*" or e.field in fields
+            }:
+                note = self.data.get(key)
+                self.tag_stats.update(key, note.get_tags() if note else ())
+        if self.link_index is not None:
+            for key in {e.key for e in events if e.field in ("*", "links")}:
+                note = self.data.get(key)
+                self.link_index.update(key, note.get_links() if note else ())
+
+    def set_blob_store(self, store):
+        self.blobs = store
+
+    def store_text(self, text):
+        """Moves a long text to the blob store"""
+        if self.blobs is None or text is None:
+            return text
+        data = text.value.encode()
+        if len(data) < Notes.BLOB_TEXT_MIN_SIZE:
+            return text
+        return BlobText(self.blobs, self.blobs.put(data))
 
     def assert_topic_is_absent(self, topic: str) -> None:
         if topic in self.data:
@@ -175,37 +627,41 @@ class Notes(UserDict, CmdProvider):
             raise ErrorWithMsg(
                 Notes.ERROR_MESSAGE_TOPIC_NOT_FOUND.format(topic)
             )
-        self.__current_topic = topic
 
-    def assert_tag_exist_and_remove(self, tags: [str]) -> None:
-        if self.__current_topic is None:
-            raise ErrorWithMsg(Notes.ERROR_MESSAGE_TOPIC_NOT_FOUND)
-        note = self.data.get(self.__current_topic)
+    def assert_tags_exist(self, topic: str, tags: [str]) -> None:
+        note = self.data.get(topic)
+        if note is None:
+            raise ErrorWithMsg(
+                Notes.ERROR_MESSAGE_TOPIC_NOT_FOUND.format(topic)
+            )
         for tag in tags:
-            if tag in note.text_tags:
-                note.text_tags.remove(tag)
-            elif tag in note.user_tags:
-                note.user_tags.remove(tag)
-            else:
+            if not tag in note.text_tags and not tag in note.user_tags:
                 raise ErrorWithMsg(Notes.ERROR_MESSAGE_TAG_NOT_FOUND)
 
     def add_note(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Topic, Text, Tags, Reminder]
-        list_of_prompts = ["Topic: ", "Text: ", "Tags: ", "Reminder: "]
+        list_of_types, list_of_prompts = self.cmd_args("add-note")
         data = get_extra_data_from_user_handler(
-            list_of_types, list_of_prompts, self.assert_topic_is_absent
+            list_of_types,
+            list_of_prompts,
+            self.assert_topic_is_absent,
+            completers=[None, None, self.complete_text_tags],
         )
         topic = data[0].value
-        self.data[topic] = Note(data[0], data[1], data[2], data[3])
+        repeat = data[4] if data[4] else None
+        if repeat and not data[3]:
+            raise ErrorWithMsg(Notes.ERROR_MESSAGE_NO_REMINDER)
+        self.touch(topic)
+        self.data[topic] = Note(
+            data[0], self.store_text(data[1]), data[2], data[3], repeat
+        )
         return f"Note with topic '{topic}' was added."
 
     def rename_note(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Topic, Topic]
-        list_of_prompts = ["Old topic: ", "New topic: "]
+        list_of_types, list_of_prompts = self.cmd_args("rename-note")
         list_of_asserts = [
             self.assert_topic_exist,
             self.assert_topic_is_absent,
@@ -218,18 +674,29 @@ class Notes(UserDict, CmdProvider):
         )
         old_topic = data[0].value
         new_topic = data[1].value
+        sources = self.get_link_index().get_backlinks(old_topic)
+        self.touch(old_topic)
+        self.touch(new_topic)
         note = self.data.pop(old_topic)
         note.topic = new_topic
         self.data[new_topic] = note
-        return (
-            f"Note with topic '{old_topic}' has been renamed to '{new_topic}'."
-        )
+        # links to the note are changed to its new topic
+        sources = {new_topic if s == old_topic else s for s in sources}
+        for source in sources:
+            linking = self.data[source]
+            self.touch(source)
+            text = rename_links(linking.text.value, old_topic, new_topic)
+            linking.set_text(self.store_text(Text(text)))
+        msg = f"Note with topic '{old_topic}' has been renamed to "
+        msg += f"'{new_topic}'."
+        if sources:
+            msg += f" Links in {len(sources)} note(s) were changed."
+        return msg
 
     def edit_note(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Topic, Text]
-        list_of_prompts = ["Topic: ", "New text: "]
+        list_of_types, list_of_prompts = self.cmd_args("edit-note")
         list_of_asserts = [self.assert_topic_exist]
         data = get_extra_data_from_user_handler(
             list_of_types,
@@ -238,17 +705,60 @@ class Notes(UserDict, CmdProvider):
             mandatory_all_entries=True,
         )
         topic = data[0].value
-        new_text = data[1].value
+        self.touch(topic)
         note = self.data.get(topic)
-        note.text.value = new_text
-        note.text_tags = Note.extract_hashtags(new_text)
+        note.set_text(self.store_text(data[1]))
         return f"Text of the note '{topic}' was changed, and text tags were updated."
 
+    def note_history(self, args, get_extra_data_from_user_handler):
+        if len(args) > 0:
+            raise ValueError
+        list_of_types, list_of_prompts = self.cmd_args("note-history")
+        data = get_extra_data_from_user_handler(
+            list_of_types, list_of_prompts, self.assert_topic_exist
+        )
+        note = self.data[data[0].value]
+        if not note.history:
+            raise ErrorWithMsg(Notes.ERROR_MESSAGE_NO_HISTORY)
+        text = note.text.value if note.text else ""
+        rows = [("current", "", text)]
+        for number, time, text in iter_revisions(note.history, text):
+            rows.append((number, f"{time:%d.%m.%Y %H:%M}", text))
+        header = Notes.HISTORY_FORMAT.format("Revision", "Replaced", "Text")
+        txt_list = [header]
+        for number, time, text in rows:
+            preview = " ".join(text.split())[: Notes.HISTORY_PREVIEW_SIZE]
+            txt_list.append(Notes.HISTORY_FORMAT.format(number, time, preview))
+        return txt_list
+
+    def note_revert(self, args, get_extra_data_from_user_handler):
+        if len(args) > 0:
+            raise ValueError
+        list_of_types, list_of_prompts = self.cmd_args("note-revert")
+        data = get_extra_data_from_user_handler(
+            list_of_types,
+            list_of_prompts,
+            self.assert_topic_exist,
+            mandatory_all_entries=True,
+        )
+        topic = data[0].value
+        number = data[1].value
+        note = self.data[topic]
+        if not 1 <= number <= len(note.history):
+            raise ErrorWithMsg(
+                Notes.ERROR_MESSAGE_REVISION.format(len(note.history))
+            )
+        text = note.text.value if note.text else ""
+        self.touch(topic)
+        note.set_text(
+            self.store_text(Text(get_revision(note.history, number, text)))
+        )
+        return f"Text of the note '{topic}' was reverted to revision {number}"
+
     def delete_note(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Topic]
-        list_of_prompts = ["Topic: "]
+        list_of_types, list_of_prompts = self.cmd_args("delete-note")
         list_of_asserts = [self.assert_topic_exist]
         data = get_extra_data_from_user_handler(
             list_of_types,
@@ -257,23 +767,92 @@ class Notes(UserDict, CmdProvider):
             mandatory_all_entries=True,
         )
         topic = data[0].value
+        self.touch(topic)
         self.data.pop(topic)
         return f"Note with topic '{topic}' was removed."
 
+    def build_tag_stats(self):
+        tag_stats = TagStats()
+        for topic, note in list(self.data.items()):
+            tag_stats.update(topic, note.get_tags())
+        return tag_stats
+
+    def get_tag_stats(self):
+        return self.get_lazy_index("tag_stats", self.build_tag_stats)
+
+    def get_tag_completions(self, tags):
+        """Tags met most often with the tags go first, then all other tags
+        from the most used ones"""
+        tag_stats = self.get_tag_stats()
+        related = tag_stats.related(tags, Notes.TAG_SUGGESTIONS)
+        skip = set(tags).union(related)
+        return related + [t for t in tag_stats.popular() if not t in skip]
+
+    def complete_text_tags(self, data):
+        """Completions of tags of a new note, data[1] is its text"""
+        text = data[1].value if data[1] else ""
+        return self.get_tag_completions(Note.extract_hashtags(text))
+
+    def complete_note_tags(self, data):
+        """Completions of tags added to the note with topic data[0]"""
+        return self.get_tag_completions(self.data[data[0].value].get_tags())
+
+    def build_link_index(self):
+        link_index = LinkIndex()
+        for topic, note in list(self.data.items()):
+            link_index.update(topic, note.get_links())
+        return link_index
+
+    def get_link_index(self):
+        return self.get_lazy_index("link_index", self.build_link_index)
+
+    def show_backlinks(self, args, get_extra_data_from_user_handler):
+        if len(args) > 0:
+            raise ValueError
+        list_of_types, list_of_prompts = self.cmd_args("backlinks")
+        data = get_extra_data_from_user_handler(list_of_types, list_of_prompts)
+        sources = self.get_link_index().get_backlinks(data[0].value)
+        if len(sources) == 0:
+            raise ErrorWithMsg(Notes.ERROR_MESSAGE_NO_BACKLINKS)
+        return [str(self.data[source]) for source in sorted(sources)]
+
+    def show_linked_notes(self, args, get_extra_data_from_user_handler):
+        if len(args) > 0:
+            raise ValueError
+        list_of_types, list_of_prompts = self.cmd_args("linked-notes")
+        data = get_extra_data_from_user_handler(list_of_types, list_of_prompts)
+        hops = data[1].value if data[1] else Notes.LINKED_HOPS
+        if hops < 1:
+            raise ErrorWithMsg(Notes.ERROR_MESSAGE_HOPS)
+        neighbors = self.get_link_index().get_neighbors(data[0].value, hops)
+        if len(neighbors) == 0:
+            raise ErrorWithMsg(Notes.ERROR_MESSAGE_NO_LINKED)
+        return [
+            Notes.LINKED_FORMAT.format(
+                distance,
+                topic,
+                "" if topic in self.data else Notes.MISSING_MARK,
+            )
+            for topic, distance in sorted(
+                neighbors.items(), key=lambda item: (item[1], item[0])
+            )
+        ]
+
     def add_tag(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Topic, Tags]
-        list_of_prompts = ["Topic: ", "Tag(s): "]
+        list_of_types, list_of_prompts = self.cmd_args("add-tag")
         list_of_asserts = [self.assert_topic_exist]
         data = get_extra_data_from_user_handler(
             list_of_types,
             list_of_prompts,
             list_of_asserts,
             mandatory_all_entries=True,
+            completers=[None, self.complete_note_tags],
         )
         topic = data[0].value
         tags = data[1].value
+        self.touch(topic)
         note = self.data[topic]
         cleaned_tags = [tag.replace("#", "") for tag in tags]
         note.user_tags += cleaned_tags
@@ -282,27 +861,37 @@ class Notes(UserDict, CmdProvider):
     def delete_tag(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Topic, Tags]
-        list_of_prompts = ["Topic: ", "Tag(s): "]
-        list_of_asserts = [
-            self.assert_topic_exist,
-            self.assert_tag_exist_and_remove,
-        ]
+        list_of_types, list_of_prompts = self.cmd_args("delete-tag")
         data = get_extra_data_from_user_handler(
-            list_of_types,
-            list_of_prompts,
-            list_of_asserts,
+            list_of_types[:1],
+            list_of_prompts[:1],
+            self.assert_topic_exist,
             mandatory_all_entries=True,
         )
         topic = data[0].value
-        tags = data[1].value
+        # tags are checked against the note with the topic
+        data = get_extra_data_from_user_handler(
+            list_of_types[1:],
+            list_of_prompts[1:],
+            lambda tags: self.assert_tags_exist(topic, tags),
+            mandatory_all_entries=True,
+        )
+        tags = data[0].value
+        self.touch(topic)
+        note = self.data[topic]
+        for tag in tags:
+            if tag in note.text_tags:
+                note.text_tags.remove(tag)
+            elif tag in note.user_tags:
+                note.user_tags.remove(tag)
+            else:
+                raise ErrorWithMsg(Notes.ERROR_MESSAGE_TAG_NOT_FOUND)
         return f"Tag(s) {', '.join(tags)} removed from the note with topic '{topic}'."
 
     def find_note_by_topic(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Topic]
-        list_of_prompts = ["Topic: "]
+        list_of_types, list_of_prompts = self.cmd_args("find-note")
         list_of_asserts = [self.assert_topic_exist]
         data = get_extra_data_from_user_handler(
             list_of_types,
@@ -318,14 +907,14 @@ class Notes(UserDict, CmdProvider):
     ):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Tags]
-        list_of_prompts = ["Tag(s): "]
+        list_of_types, list_of_prompts = self.cmd_args("find-tag")
         list_of_asserts = []
         data = get_extra_data_from_user_handler(
             list_of_types,
             list_of_prompts,
             list_of_asserts,
             mandatory_all_entries=True,
+            completers=[lambda data: self.get_tag_completions(())],
         )
         search_tags = data[0].value
         relevant_notes = []
@@ -355,8 +944,7 @@ class Notes(UserDict, CmdProvider):
     def add_reminder(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Topic, Reminder]
-        list_of_prompts = ["Topic: ", "Reminder: "]
+        list_of_types, list_of_prompts = self.cmd_args("add-reminder")
         data = get_extra_data_from_user_handler(
             list_of_types,
             list_of_prompts,
@@ -364,56 +952,313 @@ class Notes(UserDict, CmdProvider):
             mandatory_all_entries=True,
         )
         topic = data[0].value
+        self.touch(topic)
         self.data[topic].reminder = data[1]
         return f"Reminder for '{topic}' was set"
 
     def edit_reminder(self, args, get_extra_data_from_user_handler):
-        return self.add_reminder(args)
+        return self.add_reminder(args, get_extra_data_from_user_handler)
 
     def delete_reminder(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Topic]
-        list_of_prompts = ["Topic: "]
+        list_of_types, list_of_prompts = self.cmd_args("delete-reminder")
         data = get_extra_data_from_user_handler(
             list_of_types, list_of_prompts, self.assert_topic_exist
         )
         topic = data[0].value
+        self.touch(topic)
         self.data[topic].reminder = None
+        self.data[topic].repeat = None
         return f"Reminder for '{topic}' was deleted"
 
+    def repeat_reminder(self, args, get_extra_data_from_user_handler):
+        if len(args) > 0:
+            raise ValueError
+        list_of_types, list_of_prompts = self.cmd_args("repeat-reminder")
+        data = get_extra_data_from_user_handler(
+            list_of_types,
+            list_of_prompts,
+            self.assert_topic_exist,
+            mandatory_all_entries=True,
+        )
+        topic = data[0].value
+        note = self.data[topic]
+        if not note.reminder:
+            raise ErrorWithMsg(Notes.ERROR_MESSAGE_NO_REMINDER)
+        repeat = data[1] if data[1] else None
+        self.touch(topic)
+        note.repeat = repeat
+        if repeat is None:
+            return f"Reminder for '{topic}' will not repeat"
+        return f"Reminder for '{topic}' will repeat {repeat}"
+
+    def set_fields(self, note, fields):
+        for field, value in fields.items():
+            if field == "text":
+                note.set_text(value)
+            elif field == "tags":
+                note.user_tags = value.value if value else []
+            else:
+                setattr(note, field, value)
+        if note.repeat and not note.reminder:
+            raise ErrorWithMsg(
+                f"{Notes.ERROR_MESSAGE_NO_REMINDER}: {note.topic}"
+            )
+
+    def assert_topics_exist(self, topics):
+        for topic in topics:
+            if not topic in self.data:
+                raise ErrorWithMsg(
+                    f"{Notes.ERROR_MESSAGE_TOPIC_NOT_FOUND}: {topic}"
+                )
+
+    def apply_notes(self, batch, save_handler):
+        """Applies validated (topic, fields), long texts are stored last
+        so a rejected batch does not write blobs"""
+        records = {}
+        for topic, fields in batch:
+            note = records.get(topic) or self.data.get(topic)
+            # the stored note is changed only by apply_records()
+            note = copy(note) if note else Note(Topic(topic), *[None] * 3)
+            self.set_fields(note, fields)
+            records[topic] = note
+        texts = {topic for topic, fields in batch if fields.get("text")}
+        for topic in texts:
+            records[topic].text = self.store_text(records[topic].text)
+        self.apply_records(records, save_handler)
+        return len(records)
+
+    def bulk_upsert(self, rows, save_handler):
+        """Adds or changes notes of dicts {"topic": ..., "text": ...} in
+        one transaction, returns number of changed notes"""
+        batch = self.validate_rows(rows, "topic", Topic, Notes.BULK_FIELDS)
+        return self.apply_notes(batch, save_handler)
+
+    def bulk_delete(self, topics, save_handler):
+        """Deletes notes with the topics, all of them must exist"""
+        topics, _, errors = Topic.validate_column(topics)
+        self.raise_batch_errors(
+            {ix: error for ix, error in enumerate(errors) if error}
+        )
+        self.assert_topics_exist(topics)
+        self.apply_records(dict.fromkeys(topics), save_handler)
+        return len(set(topics))
+
+    def bulk_set_field(self, field, values, save_handler):
+        """Sets the field of notes {topic: value}, None clears it"""
+        self.assert_topics_exist(values.keys())
+        batch = self.validate_rows(
+            ({"topic": t, field: value} for t, value in values.items()),
+            "topic",
+            Topic,
+            Notes.BULK_FIELDS,
+        )
+        return self.apply_notes(batch, save_handler)
+
     def show_all_notes(self, args, get_extra_data_from_user_handler):
         if len(args) > 0:
             raise ValueError
         return self.get_str_list_of_notes()
 
-    def repack_reminders_for_search(self):
+    def build_similar_index(self):
+        similar = MinHashIndex()
+        for topic, note in list(self.data.items()):
+            similar.update(topic, note.get_shingles())
+        return similar
+
+    def get_similar_index(self):
+        return self.get_lazy_index("similar", self.build_similar_index)
+
+    def score_similar(self, pairs, min_score):
+        """Returns sorted list of (similarity, topic, other topic) of the
+        candidate pairs, similarity is Jaccard of their shingles"""
+        shingles = {}
+        similar = []
+        for pair in pairs:
+            for topic in pair:
+                if not topic in shingles:
+                    shingles[topic] = self.data[topic].get_shingles()
+            score = jaccard(shingles[pair[0]], shingles[pair[1]])
+            if score >= min_score:
+                similar.append((score, *pair))
+        similar.sort(key=lambda item: (-item[0], item[1], item[2]))
+        return similar
+
+    def similar_notes(self, args, get_extra_data_from_user_handler):
+        if len(args) > 0:
+            raise ValueError
+        list_of_types, list_of_prompts = self.cmd_args("similar-notes")
+        data = get_extra_data_from_user_handler(
+            list_of_types, list_of_prompts, self.assert_topic_exist
+        )
+        topic = data[0].value
+        min_score = data[1].value if data[1] else Notes.SIMILAR_MIN_SCORE
+        candidates = self.get_similar_index().get_candidates(topic)
+        similar = self.score_similar(
+            ((topic, other) for other in candidates), min_score / 100
+        )
+        if len(similar) == 0:
+            raise ErrorWithMsg(Notes.ERROR_MESSAGE_NO_SIMILAR)
+        return [
+            Notes.SIMILAR_FORMAT.format(score, other)
+            for score, _, other in similar
+        ]
+
+    def dedupe_notes(self, args, get_extra_data_from_user_handler):
+        if len(args) > 0:
+            raise ValueError
+        list_of_types, list_of_prompts = self.cmd_args("dedupe-notes")
+        data = get_extra_data_from_user_handler(
+            list_of_types, list_of_prompts, mandatory_first_entry=False
+        )
+        min_score = data[0].value if data[0] else Notes.SIMILAR_MIN_SCORE
+        pairs = self.get_similar_index().get_pairs()
+        similar = self.score_similar(pairs, min_score / 100)
+        if len(similar) == 0:
+            raise ErrorWithMsg(Notes.ERROR_MESSAGE_NO_SIMILAR)
+        return (
+            Notes.SIMILAR_FORMAT.format(score, f"{topic} ~ {other}")
+            for score, topic, other in similar
+        )
+
+    def get_view(self, order):
+        if not order in self.views:
+            if order == "reminder":
+                view = SortedView(
+                    lambda key, note: (
+                        (note.reminder.get_datetime(), key)
+                        if note.reminder
+                        else None
+                    ),
+                    ("reminder",),
+                )
+            else:
+                view = SortedView(lambda key, note: (key.lower(), key), ())
+            self.views[order] = view.build(self.data)
+        return self.views[order]
+
+    def get_seek_key(self, order, text):
+        """Prefix of a sort key of the view to start from"""
+        if order == "topic":
+            return (text.lower(),)
+        match = re.fullmatch(r"(\S+)(?: (\d\d?:\d\d?))?(?: (.+))?", text)
+        try:
+            start = datetime.combine(
+                parse_date(match[1]),
+                parse_time(match[2]) if match[2] else datetime.min.time(),
+            )
+        except:
+            raise ErrorWithMsg("Start must be DD.MM.YYYY [HH:MM] [topic]")
+        return (start, match[3]) if match[3] else (start,)
+
+    def get_cursor(self, order, sort_key):
+        """Start text of a page which begins with the sort key"""
+        if order == "topic":
+            return sort_key[-1]
+        return f"{sort_key[0]:%d.%m.%Y %H:%M} {sort_key[-1]}"
+
+    def list_notes(self, args, get_extra_data_from_user_handler):
+        if len(args) > 0:
+            raise ValueError
+        list_of_types, list_of_prompts = self.cmd_args("list-notes")
+        data = get_extra_data_from_user_handler(list_of_types, list_of_prompts)
+        order = data[0].value
+        offset = data[2].value if data[2] else 0
+        limit = data[3].value if data[3] else Notes.LIST_PAGE_SIZE
+        if offset < 0 or limit < 1:
+            raise ErrorWithMsg(Notes.ERROR_MESSAGE_PAGE)
+        view = self.get_view(order)
+        start = self.get_seek_key(order, data[1].value) if data[1] else None
+        page, after = view.page(start, offset, limit)
+        if len(page) == 0:
+            raise ErrorWithMsg(Notes.ERROR_MESSAGE_NOTHING_TO_LIST)
+        txt_list = [str(self.data[sort_key[-1]]) for sort_key in page]
+        if after:
+            txt_list.append(
+                Notes.LIST_MORE_MSG.format(self.get_cursor(order, after))
+            )
+        return txt_list
+
+    def repack_reminders_for_search(self, num_of_days):
+        # repeating reminders are expanded only inside the searched days,
+        # 2 days before today are for the weekend shown on Monday
+        today = datetime.combine(datetime.today().date(), datetime.min.time())
+        start = today - timedelta(days=2)
+        end = today + timedelta(days=num_of_days)
         reminders_list = []
-        for note in self.data.values():
-            if note.reminder:
+        # only notes with reminders in the days are read
+        topics = self.get_reminder_index().get_candidates(start, end)
+        for topic in sorted(topics):
+            note = self.data[topic]
+            if note.repeat:
+                events = note.reminder_occurrences(start, end)
+            else:
+                events = [note.reminder.get_datetime()]
+            for event in events:
                 entry = {
                     "text": note.get_reminder_string(),
-                    "event": datetime.strptime(
-                        note.reminder.value, "%d.%m.%Y"
-                    ),
+                    "event": event,
                 }
                 reminders_list.append(entry)
         return reminders_list
 
-    def __reminders(self, num_of_days):
-        res_reminders_list = []
-        if num_of_days > 0:
-            reminders_list = self.repack_reminders_for_search()
-            res_reminders_list = get_entries_for_next_x_days(
-                reminders_list, num_of_days
-            )
-        return res_reminders_list
+    def update_reminder_index(self, index, topic):
+        note = self.data.get(topic)
+        if note is None or not note.reminder:
+            index.update(topic)
+        else:
+            rule = note.repeat.value if note.repeat else None
+            index.update(topic, note.reminder.get_datetime(), rule)
+
+    def build_reminder_index(self):
+        index = ReminderIndex()
+        for topic in list(self.data.keys()):
+            self.update_reminder_index(index, topic)
+        return index
+
+    def get_reminder_index(self):
+        return self.get_lazy_index(
+            "reminder_index", self.build_reminder_index
+        )
+
+    def get_next_event(self, topic, after):
+        note = self.data.get(topic)
+        if not note:
+            return None
+        start = after + timedelta(microseconds=1)
+        for due in note.reminder_occurrences(start, datetime.max):
+            return due, f"Reminder: {note.get_reminder_string()}"
+        return None
+
+    def get_search_fields(self, key):
+        note = self.data.get(key)
+        if note is None:
+            return []
+        fields = [("topic", key), ("tags", " ".join(note.get_tags()))]
+        if note.text and note.text.value:
+            fields.append(("text", note.text.value))
+        return fields
+
+    def __reminders(self, num_of_days, single_line=False):
+        if num_of_days <= 0:
+            return []
+        today = datetime.today().date()
+        return self.upcoming.get(
+            (today, num_of_days, single_line),
+            lambda: get_entries_for_next_x_days(
+                self.repack_reminders_for_search(num_of_days),
+                num_of_days,
+                single_line,
+                today=today,
+            ),
+        )
 
     def reminders(self, args, get_extra_data_from_user_handler):
         num_of_days = Notes.REMINDERS_NUM_OF_DAYS
         if len(args) > 0:
             raise ValueError
-        list_of_types = [Number]
+        list_of_types, _ = self.cmd_args("reminders")
         list_of_prompts = [f"Days (default {num_of_days}): "]
         data = get_extra_data_from_user_handler(
             list_of_types, list_of_prompts, mandatory_first_entry=False
@@ -429,13 +1274,16 @@ class Notes(UserDict, CmdProvider):
         if len(args) > 0:
             raise ValueError
         relevant_notes = []
-        list_of_types = [Reminder]
-        list_of_prompts = ["Reminder date: "]
+        list_of_types, list_of_prompts = self.cmd_args("find-reminder")
         data = get_extra_data_from_user_handler(list_of_types, list_of_prompts)
-        reminder_date = data[0]
-        for note in self.data.values():
-            if note.reminder == reminder_date:
+        start = datetime.combine(data[0].get_datetime(), datetime.min.time())
+        end = start + timedelta(days=1)
+        topics = self.get_reminder_index().get_candidates(start, end)
+        for topic in sorted(topics):
+            note = self.data[topic]
+            for _ in note.reminder_occurrences(start, end):
                 relevant_notes.append(str(note))
+                break
         if relevant_notes:
             return relevant_notes
         else:
@@ -0,0 +1,93 @@
+from calendar import monthrange
+from datetime import timedelta
+
+from Views import SortedList
+
+# these rules have occurrences in almost every window of days
+FREQUENT_RULES = ("daily", "weekly")
+
+
+def get_day_ranges(start, end):
+    """Inclusive ((month, day), (month, day)) ranges of the days in
+    [start, end), a range does not cross the end of a year"""
+    last = end - timedelta(days=1)
+    if (last - start).days >= 365:
+        return [((1, 1), (12, 31))]
+    first_day, last_day = (start.month, start.day), (last.month, last.day)
+    # 29.02 is shown at 28.02 in a non leap year
+    if last_day == (2, 28):
+        last_day = (2, 29)
+    if first_day <= last_day:
+        return [(first_day, last_day)]
+    return [(first_day, (12, 31)), ((1, 1), last_day)]
+
+
+def get_month_day_ranges(start, end):
+    """Inclusive (day, day) ranges of the days of months in [start, end)"""
+    last = end - timedelta(days=1)
+    months = (last.year - start.year) * 12 + last.month - start.month
+    if months > 1:
+        return [(1, 31)]
+    last_day = last.day
+    # a day which a short month has not is at its last day
+    if last_day == monthrange(last.year, last.month)[1]:
+        last_day = 31
+    if months == 0:
+        return [(start.day, last_day)]
+    return [(start.day, 31), (1, last_day)]
+
+
+class ReminderIndex:
+    """Reminders by their days, daily and weekly ones are always
+    candidates"""
+
+    def __init__(self):
+        self.yearly = SortedList()
+        self.monthly = SortedList()
+        self.frequent = set()
+        # key -> where the item is kept
+        self.items = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def update(self, key, first=None, rule=None):
+        """Sets the first occurrence (datetime) and the repeat rule of the
+        reminder of the item, first None removes it"""
+        old = self.items.pop(key, None)
+        if old == "frequent":
+            self.frequent.discard(key)
+        elif old is not None:
+            getattr(self, old[0]).remove(old[1])
+        if first is None:
+            return
+        if rule in FREQUENT_RULES:
+            self.frequent.add(key)
+            self.items[key] = "frequent"
+        elif rule == "monthly":
+            entry = (first.day, key)
+            self.monthly.add(entry)
+            self.items[key] = ("monthly", entry)
+        else:
+            entry = (first.month, first.day, key)
+            self.yearly.add(entry)
+            self.items[key] = ("yearly", entry)
+
+    def get_candidates(self, start, end):
+        """Keys of the items which may have reminders in [start, end)"""
+        keys = set(self.frequent)
+        for first, last in get_day_ranges(start, end):
+            entries = self.yearly.iter_from(self.yearly.bisect_left(first))
+            for month, day, key in entries:
+                if (month, day) > last:
+                    break
+                keys.add(key)
+        for first, last in get_month_day_ranges(start, end):
+            entries = self.monthly.iter_from(
+                self.monthly.bisect_left((first,))
+            )
+            for day, key in entries:
+                if day > last:
+                    break
+                keys.add(key)
+        return keys
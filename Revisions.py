@@ -0,0 +1,99 @@
+import re
+from datetime import datetime
+from difflib import SequenceMatcher
+
+from BaseClasses import Field
+
+# words with their trailing spaces are the units of a delta
+TOKEN = re.compile(r"\S+\s*|\s+")
+# a revision is kept whole when deltas to reconstruct it from the newer
+# keyframe or the current text would be bigger than the text itself, or
+# when there would be more of them than this
+MAX_CHAIN = 50
+
+
+def make_delta(text, old):
+    """Returns ops which turn the text into the old one: a positive int
+    copies chars, a negative one skips them, a str is inserted"""
+    prefix = 0
+    end = min(len(text), len(old))
+    while prefix < end and text[prefix] == old[prefix]:
+        prefix += 1
+    suffix = 0
+    end -= prefix
+    while suffix < end and text[-suffix - 1] == old[-suffix - 1]:
+        suffix += 1
+    a = TOKEN.findall(text[prefix : len(text) - suffix])
+    b = TOKEN.findall(old[prefix : len(old) - suffix])
+    ops = [prefix] if prefix else []
+    matcher = SequenceMatcher(None, a, b)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(sum(map(len, a[i1:i2])))
+            continue
+        if i2 > i1:
+            ops.append(-sum(map(len, a[i1:i2])))
+        if j2 > j1:
+            ops.append("".join(b[j1:j2]))
+    if suffix:
+        ops.append(suffix)
+    return tuple(ops)
+
+
+def apply_delta(text, delta):
+    parts, pos = [], 0
+    for op in delta:
+        if isinstance(op, str):
+            parts.append(op)
+        elif op > 0:
+            parts.append(text[pos : pos + op])
+            pos += op
+        else:
+            pos -= op
+    return "".join(parts)
+
+
+def delta_size(delta):
+    return sum(len(op) if isinstance(op, str) else 1 for op in delta)
+
+
+def add_revision(history, old, text):
+    """Returns history of (time, keyframe Text or delta from the next
+    revision), the oldest first, with the old Text replaced by the text"""
+    old_text = old.value
+    delta = make_delta(text, old_text)
+    chain, num = delta_size(delta), 1
+    for _, data in reversed(history):
+        if isinstance(data, Field):
+            break
+        chain += delta_size(data)
+        num += 1
+    if chain > len(old_text) or num > MAX_CHAIN:
+        # the Text is kept itself, e.g. a long one stays in the blob store
+        delta = old
+    return history + ((datetime.now(), delta),)
+
+
+def iter_revisions(history, text):
+    """Yields (number, time, text) of the revisions, the newest first,
+    numbers start from 1"""
+    for ix in range(len(history) - 1, -1, -1):
+        time, data = history[ix]
+        if isinstance(data, Field):
+            text = data.value
+        else:
+            text = apply_delta(text, data)
+        yield ix + 1, time, text
+
+
+def get_revision(history, number, text):
+    """Text of the revision, it is restored from the nearest newer
+    keyframe or the current text"""
+    ix = k = number - 1
+    while k < len(history) and not isinstance(history[k][1], Field):
+        k += 1
+    if k < len(history):
+        text = history[k][1].value
+    for j in range(k - 1, ix - 1, -1):
+        text = apply_delta(text, history[j][1])
+    return text
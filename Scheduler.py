@@ -0,0 +1,143 @@
+import heapq
+import itertools
+import threading
+from datetime import datetime
+
+from BaseClasses import RWLock
+
+
+class Scheduler:
+    """Calls notify(text) when an event of a record is due, next events
+    of records are kept in a heap and updated on changes"""
+
+    # wake up from time to time in case the system clock was changed
+    MAX_WAIT = 60
+
+    def __init__(self, lock=None, notify=None):
+        self.lock = lock if lock else RWLock()
+        self.notify = notify
+        self.cmd_providers = {}
+        self.heap = []
+        # (provider name, record key) -> (due, seq) of the pending event
+        self.events = {}
+        self.__seq = itertools.count()
+        self.__cond = threading.Condition()
+        self.__thread = None
+        self.__finish = False
+
+    def __len__(self):
+        return len(self.events)
+
+    def __push(self, event_key, due, text):
+        seq = next(self.__seq)
+        self.events[event_key] = (due, seq)
+        heapq.heappush(self.heap, (due, seq, event_key, text))
+
+    def __schedule(self, name, key, after):
+        event = self.cmd_providers[name].get_next_event(key, after)
+        if event is not None:
+            self.__push((name, key), *event)
+
+    def __compact(self):
+        if len(self.heap) > 2 * len(self.events) + 1024:
+            self.heap = [
+                item
+                for item in self.heap
+                if self.events.get(item[2]) == (item[0], item[1])
+            ]
+            heapq.heapify(self.heap)
+
+    def add_provider(self, name, cmd_provider):
+        """Schedules next events of all records of the provider"""
+        now = datetime.now()
+        with self.__cond:
+            self.cmd_providers[name] = cmd_provider
+            for key in list(cmd_provider.get_for_file().keys()):
+                event = cmd_provider.get_next_event(key, now)
+                if event is not None:
+                    seq = next(self.__seq)
+                    self.events[(name, key)] = (event[0], seq)
+                    self.heap.append((event[0], seq, (name, key), event[1]))
+            heapq.heapify(self.heap)
+            self.__cond.notify()
+
+    def remove_provider(self, name):
+        """Cancels events of the provider, e.g. of an unloaded book"""
+        with self.__cond:
+            self.cmd_providers.pop(name, None)
+            for event_key in [k for k in self.events if k[0] == name]:
+                del self.events[event_key]
+            self.__compact()
+            self.__cond.notify()
+
+    def update(self, name, keys):
+        """Reschedules records with the keys, caller holds the store lock"""
+        if not name in self.cmd_providers:
+            return
+        now = datetime.now()
+        with self.__cond:
+            for key in keys:
+                self.events.pop((name, key), None)
+                self.__schedule(name, key, now)
+            self.__compact()
+            self.__cond.notify()
+
+    def pop_due(self, now=None):
+        """Returns (event key, text) of the events which are due"""
+        now = now if now else datetime.now()
+        due_events = []
+        with self.__cond:
+            while self.heap and self.heap[0][0] <= now:
+                due, seq, event_key, text = heapq.heappop(self.heap)
+                if self.events.get(event_key) != (due, seq):
+                    continue
+                del self.events[event_key]
+                due_events.append((event_key, due, text))
+        return due_events
+
+    def __next_due(self):
+        while self.heap:
+            due, seq, event_key, _ = self.heap[0]
+            if self.events.get(event_key) == (due, seq):
+                return due
+            heapq.heappop(self.heap)
+        return None
+
+    def __run(self):
+        while True:
+            with self.__cond:
+                if self.__finish:
+                    return
+                due = self.__next_due()
+                delay = Scheduler.MAX_WAIT
+                if due is not None:
+                    delay = (due - datetime.now()).total_seconds()
+                if delay > 0:
+                    self.__cond.wait(min(delay, Scheduler.MAX_WAIT))
+                    continue
+            due_events = self.pop_due()
+            for _, _, text in due_events:
+                if self.notify:
+                    self.notify(text)
+            # recurring events (e.g. birthdays) get their next occurrence
+            with self.lock.read_lock(), self.__cond:
+                for (name, key), due, _ in due_events:
+                    if not name in self.cmd_providers:
+                        continue
+                    if not (name, key) in self.events:
+                        self.__schedule(name, key, due)
+
+    def start(self):
+        self.__finish = False
+        self.__thread = threading.Thread(
+            target=self.__run, name="scheduler", daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self):
+        with self.__cond:
+            self.__finish = True
+            self.__cond.notify()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
@@ -0,0 +1,214 @@
+import re
+import threading
+from collections import defaultdict
+
+from BaseClasses import *
+from Views import SortedList
+
+# a token is an exact match of a query word when it is equal to it, a
+# prefix match when it starts with it
+EXACT_MATCH_BONUS = 2
+TOKEN = re.compile(r"\w+")
+
+
+def get_tokens(text):
+    return TOKEN.findall(text.lower())
+
+
+class SearchText(Field):
+    def validate(self, text: str):
+        text = text.strip()
+        if len(text) == 0:
+            raise ErrorWithMsg("Search text can not be empty")
+        return text
+
+
+class SearchIndex:
+    """Inverted index of words of records, words are kept sorted, so a
+    query word is looked up as a prefix"""
+
+    def __init__(self):
+        # token -> {(source, key): weight}
+        self.postings = defaultdict(dict)
+        self.tokens = SortedList()
+        # (source, key) -> tokens of the record
+        self.records = {}
+
+    def update(self, source, key, fields):
+        """Sets [(weight, text)] of the record, empty ones remove it"""
+        record = (source, key)
+        for token in self.records.pop(record, ()):
+            postings = self.postings[token]
+            del postings[record]
+            if not postings:
+                del self.postings[token]
+                self.tokens.remove(token)
+        weights = {}
+        for weight, text in fields:
+            for token in get_tokens(text):
+                weights[token] = max(weight, weights.get(token, 0))
+        if weights:
+            self.records[record] = tuple(weights)
+        for token, weight in weights.items():
+            if not token in self.postings:
+                self.tokens.add(token)
+            self.postings[token][record] = weight
+
+    def remove_source(self, source):
+        for record in [r for r in self.records if r[0] == source]:
+            self.update(source, record[1], ())
+
+    def lookup(self, word):
+        """Returns {(source, key): score} of records with a word which
+        starts with the word"""
+        scores = {}
+        for token in self.tokens.iter_from(self.tokens.bisect_left(word)):
+            if not token.startswith(word):
+                break
+            bonus = EXACT_MATCH_BONUS if token == word else 1
+            for record, weight in self.postings[token].items():
+                score = weight * bonus
+                if score > scores.get(record, 0):
+                    scores[record] = score
+        return scores
+
+    def query(self, text):
+        """Returns [(score, source, key)] of records which have all words
+        of the text, the best first"""
+        scores = None
+        for word in dict.fromkeys(get_tokens(text)):
+            found = self.lookup(word)
+            if scores is None:
+                scores = found
+            else:
+                scores = {
+                    record: score + found[record]
+                    for record, score in scores.items()
+                    if record in found
+                }
+            if not scores:
+                return []
+        if scores is None:
+            return []
+        results = [(score, *record) for record, score in scores.items()]
+        results.sort(key=lambda item: (-item[0], item[1], str(item[2])))
+        return results
+
+
+class Search(CmdProvider):
+    """One search over records of all loaded books, indexes are built on
+    the first search and updated by changes"""
+
+    NOT_FOUND_MSG = "Nothing found in loaded books"
+    NOT_LOADED_MSG = "Not loaded (not searched): {}"
+    RESULT_FORMAT = "{:>4} [{}] {}"
+
+    cmds_help = (
+        Cmd(
+            "search",
+            "search <text>",
+            "Find contacts and notes with all words of a text, best first",
+            args=(CmdArg("text", SearchText, "Text: "),),
+        ),
+    )
+
+    def __init__(self, books):
+        self.books = books
+        # (book name, provider name) -> command provider
+        self.cmd_providers = {}
+        self.indexed = set()
+        self.index = SearchIndex()
+        # readers share the store lock
+        self.lock = threading.Lock()
+        self.cmds = {"search": self.search_cmd}
+
+    def help(self):
+        return Search.cmds_help
+
+    def exe(self, cmd, args, get_extra_data_from_user_handler):
+        return self.cmds[cmd](args, get_extra_data_from_user_handler)
+
+    def get_for_file(self):
+        return {}
+
+    def set_from_file(self, data):
+        pass
+
+    def add_provider(self, name, cmd_provider):
+        with self.lock:
+            self.cmd_providers[name] = cmd_provider
+
+    def remove_provider(self, name):
+        with self.lock:
+            self.cmd_providers.pop(name, None)
+            if name in self.indexed:
+                self.indexed.discard(name)
+                self.index.remove_source(name)
+
+    def drop_book(self, book_name):
+        """Forgets the index of a reloaded book, it is built again"""
+        with self.lock:
+            for name in [n for n in self.indexed if n[0] == book_name]:
+                self.indexed.discard(name)
+                self.index.remove_source(name)
+
+    def update_record(self, name, key):
+        cmd_provider = self.cmd_providers[name]
+        weights = cmd_provider.SEARCH_WEIGHTS
+        fields = [
+            (weights.get(field, 1), text)
+            for field, text in cmd_provider.get_search_fields(key)
+        ]
+        self.index.update(name, key, fields)
+
+    def update(self, name, keys):
+        """Reindexes records with the keys, caller holds the store lock"""
+        with self.lock:
+            if not name in self.indexed:
+                return
+            for key in keys:
+                self.update_record(name, key)
+
+    def build(self):
+        """Indexes providers which were not searched yet"""
+        for name, cmd_provider in self.cmd_providers.items():
+            if name in self.indexed or not cmd_provider.SEARCH_WEIGHTS:
+                continue
+            for key in list(cmd_provider.get_for_file().keys()):
+                self.update_record(name, key)
+            self.indexed.add(name)
+
+    def query(self, text):
+        """Returns [(score, (book, provider name), key)], the best first"""
+        with self.lock:
+            self.build()
+            return self.index.query(text)
+
+    def search_cmd(self, args, get_extra_data_from_user_handler):
+        if len(args) > 0:
+            text = SearchText(" ".join(args)).value
+        else:
+            list_of_types, list_of_prompts = self.cmd_args("search")
+            data = get_extra_data_from_user_handler(
+                list_of_types, list_of_prompts
+            )
+            text = data[0].value
+        results = self.query(text)
+        if len(results) == 0:
+            raise ErrorWithMsg(Search.NOT_FOUND_MSG)
+        # records are rendered while the command holds the store lock
+        txt_list = self.render(results, self.books.data["active"])
+        names = self.books.get_names()
+        not_loaded = [n for n in names if not n in self.books.loaded]
+        if not_loaded:
+            not_loaded = ", ".join(not_loaded)
+            txt_list.append(Search.NOT_LOADED_MSG.format(not_loaded))
+        return txt_list
+
+    def render(self, results, active):
+        txt_list = []
+        for score, (book, name), key in results:
+            record = self.cmd_providers[(book, name)].get_for_file()[key]
+            label = name if book == active else f"{book}/{name}"
+            txt_list.append(Search.RESULT_FORMAT.format(score, label, record))
+        return txt_list
@@ -0,0 +1,175 @@
+import json
+import math
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+class Sample:
+    """Measurements of a single command execution"""
+
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.started = time.time()
+        self.wall = 0.0
+        self.wait = 0.0
+        self.save = 0.0
+        self.save_bytes = 0
+        self.alloc_kb = None
+        self.peak_kb = None
+
+    @property
+    def exe(self):
+        """Time of the command without waiting for the user"""
+        return self.wall - self.wait
+
+    def to_dict(self):
+        return {
+            "cmd": self.cmd,
+            "started": self.started,
+            "wall": self.wall,
+            "wait": self.wait,
+            "exe": self.exe,
+            "save": self.save,
+            "save_bytes": self.save_bytes,
+            "alloc_kb": self.alloc_kb,
+            "peak_kb": self.peak_kb,
+        }
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if len(sorted_values) == 0:
+        return 0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class CmdStats:
+    """Latency, user wait, save and allocation samples of commands"""
+
+    MAX_SAMPLES_PER_CMD = 10000
+    REPORT_HEAD = "    {:<18} {:>6} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9}"
+    REPORT_LINE = (
+        "    {:<18} {:>6} {:>9.2f} {:>9.2f} {:>9.2f}"
+        " {:>9.2f} {:>9.2f} {:>9.2f} {:>9}"
+    )
+    NO_STATS_MSG = "No commands were executed yet"
+
+    def __init__(self):
+        self.samples = defaultdict(
+            lambda: deque(maxlen=CmdStats.MAX_SAMPLES_PER_CMD)
+        )
+        self.trace_allocations = False
+        self.__local = threading.local()
+
+    def current(self):
+        """Sample of the command executed by this thread or None"""
+        return getattr(self.__local, "sample", None)
+
+    @contextmanager
+    def measure(self, cmd):
+        sample = Sample(cmd)
+        self.__local.sample = sample
+        tracing = self.trace_allocations
+        if tracing:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            mem_start = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield sample
+        finally:
+            sample.wall = time.perf_counter() - start
+            if tracing and tracemalloc.is_tracing():
+                mem_now, mem_peak = tracemalloc.get_traced_memory()
+                sample.alloc_kb = round((mem_now - mem_start) / 1024, 1)
+                sample.peak_kb = round((mem_peak - mem_start) / 1024, 1)
+            self.__local.sample = None
+            self.samples[cmd].append(sample)
+
+    @contextmanager
+    def waiting(self):
+        """Time spent inside is counted as waiting for the user"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            sample = self.current()
+            if sample is not None:
+                sample.wait += time.perf_counter() - start
+
+    def wrap_save_handler(self, handler):
+        """Counts duration and bytes returned by the save handler"""
+
+        def save_handler(*args, **kwargs):
+            start = time.perf_counter()
+            written = handler(*args, **kwargs)
+            sample = self.current()
+            if sample is not None:
+                sample.save += time.perf_counter() - start
+                sample.save_bytes += written or 0
+            return written
+
+        return save_handler
+
+    def set_trace_allocations(self, enabled):
+        self.trace_allocations = enabled
+        if not enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def get_report(self):
+        if len(self.samples) == 0:
+            return CmdStats.NO_STATS_MSG
+        txt_list = [
+            CmdStats.REPORT_HEAD.format(
+                "command", "count", "p50 ms", "p95 ms", "p99 ms",
+                "exe p50", "wait p50", "save p50", "save B",
+            )
+        ]
+        # other frontends may add samples meanwhile
+        for cmd, samples in sorted(list(self.samples.items())):
+            samples = list(samples)
+            wall = sorted(s.wall * 1000 for s in samples)
+            exe = sorted(s.exe * 1000 for s in samples)
+            wait = sorted(s.wait * 1000 for s in samples)
+            save = sorted(s.save * 1000 for s in samples)
+            save_bytes = sum(s.save_bytes for s in samples) // len(samples)
+            txt_list.append(
+                CmdStats.REPORT_LINE.format(
+                    cmd,
+                    len(samples),
+                    percentile(wall, 50),
+                    percentile(wall, 95),
+                    percentile(wall, 99),
+                    percentile(exe, 50),
+                    percentile(wait, 50),
+                    percentile(save, 50),
+                    save_bytes,
+                )
+            )
+        allocs = [
+            s
+            for samples in list(self.samples.values())
+            for s in list(samples)
+            if s.alloc_kb is not None
+        ]
+        if allocs:
+            txt_list.append(
+                f"    allocation samples: {len(allocs)}, "
+                f"max peak: {max(s.peak_kb for s in allocs)} KB"
+            )
+        return txt_list
+
+    def export(self, filename):
+        """Writes all samples to the file as JSON lines, returns their number"""
+        num = 0
+        with open(filename, "w") as f:
+            for samples in list(self.samples.values()):
+                for sample in list(samples):
+                    f.write(json.dumps(sample.to_dict()) + "\n")
+                    num += 1
+        return num
@@ -0,0 +1,366 @@
+import os
+import pickle
+import struct
+import zlib
+from hashlib import blake2b
+from pathlib import Path
+
+from BaseClasses import *
+
+
+class SyncFilename(Field):
+    def validate(self, filename: str):
+        filename = filename.strip()
+        if len(filename) == 0:
+            raise ErrorWithMsg("File name can not be empty")
+        return filename
+
+
+def bucket_of(key):
+    """Bucket of a record, stable between runs unlike hash()"""
+    return zlib.crc32(str(key).encode()) % SyncIndex.NUM_OF_BUCKETS
+
+
+def canonical(value):
+    """Value with Fields replaced by their values, also inside lists"""
+    if isinstance(value, Field):
+        return value.value
+    if isinstance(value, (list, tuple)):
+        return type(value)(canonical(item) for item in value)
+    return value
+
+
+def record_hash(key, record):
+    """64-bit hash of the key and the fields with values of the record"""
+    items = [key]
+    for name, value in sorted(vars(record).items()):
+        value = canonical(value)
+        if value is None:
+            continue
+        items.append((name, value))
+    digest = blake2b(repr(items).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class SyncIndex:
+    """Merkle-style summary of a section: a bucket digest is XOR of
+    hashes of its records, only different buckets are compared"""
+
+    NUM_OF_BUCKETS = 4096
+
+    def __init__(self, records=None):
+        self.buckets = [{} for _ in range(SyncIndex.NUM_OF_BUCKETS)]
+        self.digests = [0] * SyncIndex.NUM_OF_BUCKETS
+        for key, record in (records or {}).items():
+            self.set(key, record)
+
+    def set(self, key, record):
+        """Updates hash of the record, None removes it"""
+        ix = bucket_of(key)
+        bucket = self.buckets[ix]
+        old = bucket.pop(key, None)
+        if old is not None:
+            self.digests[ix] ^= old
+        if record is not None:
+            new = record_hash(key, record)
+            bucket[key] = new
+            self.digests[ix] ^= new
+
+
+class BucketFile:
+    """File of pickled buckets, changed ones are appended with a new
+    index, the file is rewritten when most of it is stale"""
+
+    MAGIC = b"ASSYNC1\n"
+    TRAILER = struct.Struct("<Q8s")
+    DAMAGED_MSG = "File '{}' is not a sync file or it is damaged"
+
+    def __init__(self, filename):
+        self.filename = Path(filename)
+        # section -> list of (digest, offset, length) of every bucket
+        self.index = {}
+        self.size = 0
+
+    def exists(self):
+        return self.filename.exists()
+
+    def read_index(self):
+        try:
+            with open(self.filename, "rb") as f:
+                magic = f.read(len(BucketFile.MAGIC))
+                f.seek(-BucketFile.TRAILER.size, os.SEEK_END)
+                self.size = f.tell() + BucketFile.TRAILER.size
+                offset, end_magic = BucketFile.TRAILER.unpack(
+                    f.read(BucketFile.TRAILER.size)
+                )
+                if magic != BucketFile.MAGIC or end_magic != BucketFile.MAGIC:
+                    raise ValueError
+                f.seek(offset)
+                index = pickle.loads(f.read(self.size - offset))
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+            raise ErrorWithMsg(BucketFile.DAMAGED_MSG.format(self.filename))
+        if index["num_of_buckets"] != SyncIndex.NUM_OF_BUCKETS:
+            raise ErrorWithMsg(BucketFile.DAMAGED_MSG.format(self.filename))
+        self.index = index["sections"]
+        return self.index
+
+    def get_digests(self, section):
+        entries = self.index.get(section)
+        if entries is None:
+            return [0] * SyncIndex.NUM_OF_BUCKETS
+        return [entry[0] for entry in entries]
+
+    def read_bucket(self, section, ix):
+        entries = self.index.get(section)
+        if entries is None or entries[ix][2] == 0:
+            return {}
+        _, offset, length = entries[ix]
+        with open(self.filename, "rb") as f:
+            f.seek(offset)
+            return pickle.loads(f.read(length))
+
+    def write(self, buckets):
+        """Writes {section: {ix: (digest, bucket)}}, returns written bytes"""
+        live_size = sum(
+            entry[2] for entries in self.index.values() for entry in entries
+        )
+        if not self.exists() or self.size > 2 * live_size + 1024 * 1024:
+            return self.__rewrite(buckets)
+        with open(self.filename, "r+b") as f:
+            f.seek(0, os.SEEK_END)
+            start = f.tell()
+            self.__write_buckets(f, buckets)
+            written = f.tell() - start
+        self.size += written
+        return written
+
+    def __write_buckets(self, f, buckets):
+        empty = [(0, 0, 0)] * SyncIndex.NUM_OF_BUCKETS
+        for section, section_buckets in buckets.items():
+            entries = self.index.setdefault(section, list(empty))
+            for ix, (digest, bucket) in section_buckets.items():
+                if len(bucket) == 0:
+                    entries[ix] = (0, 0, 0)
+                    continue
+                data = pickle.dumps(bucket)
+                entries[ix] = (digest, f.tell(), len(data))
+                f.write(data)
+        index_offset = f.tell()
+        pickle.dump(
+            {
+                "num_of_buckets": SyncIndex.NUM_OF_BUCKETS,
+                "sections": self.index,
+            },
+            f,
+        )
+        f.write(BucketFile.TRAILER.pack(index_offset, BucketFile.MAGIC))
+
+    def __rewrite(self, buckets):
+        # buckets which are not changed are copied from the old file
+        all_buckets = {}
+        for section, entries in self.index.items():
+            all_buckets[section] = {
+                ix: (entries[ix][0], self.read_bucket(section, ix))
+                for ix in range(SyncIndex.NUM_OF_BUCKETS)
+                if entries[ix][2] > 0
+            }
+        for section, section_buckets in buckets.items():
+            all_buckets.setdefault(section, {}).update(section_buckets)
+        self.index = {}
+        tmp_filename = self.filename.with_name(self.filename.name + ".tmp")
+        with open(tmp_filename, "wb") as f:
+            f.write(BucketFile.MAGIC)
+            self.__write_buckets(f, all_buckets)
+            self.size = f.tell()
+        os.replace(tmp_filename, self.filename)
+        return self.size
+
+
+class Sync(CmdProvider):
+    """Three-way sync of the book in use with a sync file, only buckets
+    with different digests are merged"""
+
+    SYNC_DONE_MSG = "Synced with '{}':"
+    SECTION_MSG = "  {}: {} received, {} sent, {} conflict(s)"
+    CONFLICT_MSG = "  Conflict in {} '{}', kept {}: {}"
+
+    cmds_help = (
+        Cmd(
+            "sync",
+            "sync <file>",
+            "Merge the book in use with a sync file, the file is created",
+            mutating=True,
+            args=(CmdArg("file", SyncFilename, "File: "),),
+        ),
+    )
+
+    def __init__(self, books):
+        self.books = books
+        self.save_handler = None
+        # (book name, section) -> SyncIndex, kept up to date by update()
+        self.indexes = {}
+        self.cmds = {"sync": self.sync}
+
+    def set_save_handler(self, handler):
+        self.save_handler = handler
+
+    def help(self):
+        return Sync.cmds_help
+
+    def exe(self, cmd, args, get_extra_data_from_user_handler):
+        return self.cmds[cmd](args, get_extra_data_from_user_handler)
+
+    def get_for_file(self):
+        return {}
+
+    def set_from_file(self, data):
+        pass
+
+    def get_index(self, book, section):
+        key = (book.name, section)
+        if not key in self.indexes:
+            records = book.cmd_providers[section].get_for_file()
+            self.indexes[key] = SyncIndex(records)
+        return self.indexes[key]
+
+    def add_book(self, book):
+        """Builds indexes of a loaded book synced before, so its next sync
+        does not hash all the records"""
+        pattern = f"{book.filename.name}.*.base"
+        if next(book.filename.parent.glob(pattern), None) is None:
+            return
+        for section in self.books.book_items:
+            if section in book.cmd_providers:
+                self.get_index(book, section)
+
+    def update(self, book_name, section, records, keys):
+        """Updates hashes of committed records of a built index"""
+        index = self.indexes.get((book_name, section))
+        if index is None:
+            return
+        for key in keys:
+            index.set(key, records.get(key))
+
+    def drop_book(self, book_name):
+        for key in [k for k in self.indexes if k[0] == book_name]:
+            del self.indexes[key]
+
+    def get_base_file(self, book, filename):
+        # one base per book and sync file
+        path_id = zlib.crc32(str(Path(filename).resolve()).encode())
+        return BucketFile(
+            book.filename.with_name(f"{book.filename.name}.{path_id:08x}.base")
+        )
+
+    def merge_bucket(self, local, remote, base):
+        """Returns received {key: record or None}, number of sent records
+        and conflicts"""
+        received, sent, conflicts = {}, 0, []
+        for key in local.keys() | remote.keys():
+            l_hash = local.get(key)
+            r_hash, r_record = remote.get(key, (None, None))
+            if l_hash == r_hash:
+                continue
+            b_hash = base.get(key)
+            if l_hash == b_hash:
+                received[key] = r_record
+            elif r_hash == b_hash:
+                sent += 1
+            elif l_hash is None:
+                # a change wins over a deletion
+                received[key] = r_record
+                conflicts.append((key, "remote", r_record))
+            else:
+                sent += 1
+                conflicts.append((key, "local", r_record))
+        return received, sent, conflicts
+
+    def sync_section(self, book, section, remote_file, base_file):
+        """Merges records of the section, returns received records, number
+        of sent ones, conflicts and buckets to write to both files"""
+        cmd_provider = book.cmd_providers[section]
+        index = self.get_index(book, section)
+        remote_digests = remote_file.get_digests(section)
+        received, sent, conflicts = {}, 0, []
+        if index.digests != remote_digests:
+            for ix in range(SyncIndex.NUM_OF_BUCKETS):
+                if index.digests[ix] == remote_digests[ix]:
+                    continue
+                bucket_received, bucket_sent, bucket_conflicts = (
+                    self.merge_bucket(
+                        index.buckets[ix],
+                        remote_file.read_bucket(section, ix),
+                        base_file.read_bucket(section, ix),
+                    )
+                )
+                received.update(bucket_received)
+                sent += bucket_sent
+                conflicts.extend(bucket_conflicts)
+        if received:
+            cmd_provider.apply_records(received, self.save_handler)
+            # the bus has updated the index already unless there is none,
+            # hashes of the same records do not change
+            records = cmd_provider.get_for_file()
+            self.update(book.name, section, records, received.keys())
+        # both sides have the local records now
+        records = cmd_provider.get_for_file()
+        base_digests = base_file.get_digests(section)
+        remote_buckets, base_buckets = {}, {}
+        for ix in range(SyncIndex.NUM_OF_BUCKETS):
+            digest = index.digests[ix]
+            if digest != remote_digests[ix]:
+                remote_buckets[ix] = (
+                    digest,
+                    {
+                        key: (key_hash, records[key])
+                        for key, key_hash in index.buckets[ix].items()
+                    },
+                )
+            if digest != base_digests[ix]:
+                base_buckets[ix] = (digest, dict(index.buckets[ix]))
+        return received, sent, conflicts, remote_buckets, base_buckets
+
+    def sync(self, args, get_extra_data_from_user_handler):
+        if len(args) > 1:
+            raise ValueError
+        if len(args) == 1:
+            filename = SyncFilename(args[0]).value
+        else:
+            list_of_types, list_of_prompts = self.cmd_args("sync")
+            data = get_extra_data_from_user_handler(
+                list_of_types, list_of_prompts
+            )
+            filename = data[0].value
+        book = self.books.active
+        remote_file = BucketFile(filename)
+        base_file = self.get_base_file(book, filename)
+        # a new sync file gets all records, an old base is not used then
+        if remote_file.exists():
+            remote_file.read_index()
+            if base_file.exists():
+                base_file.read_index()
+        else:
+            base_file.filename.unlink(missing_ok=True)
+        txt_list = [Sync.SYNC_DONE_MSG.format(filename)]
+        remote_buckets, base_buckets = {}, {}
+        for section in self.books.book_items:
+            received, sent, conflicts, remote, base = self.sync_section(
+                book, section, remote_file, base_file
+            )
+            remote_buckets[section] = remote
+            base_buckets[section] = base
+            txt_list.append(
+                Sync.SECTION_MSG.format(
+                    section, len(received), sent, len(conflicts)
+                )
+            )
+            for key, kept, record in conflicts:
+                if kept == "local":
+                    record = f"remote {record if record else 'was deleted'}"
+                txt_list.append(
+                    Sync.CONFLICT_MSG.format(section, key, kept, record)
+                )
+        # the base is written last, a sync broken before it is repeated
+        remote_file.write(remote_buckets)
+        base_file.write(base_buckets)
+        return txt_list
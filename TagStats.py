@@ -0,0 +1,150 @@
+from collections import defaultdict
+from heapq import nlargest
+
+
+class RankedCounter:
+    """Counts of keys sorted by count, add and discard are O(1), top(k)
+    is O(k)"""
+
+    def __init__(self):
+        self.keys = []
+        self.counts = []
+        self.pos = {}
+        # count -> [first index, last index] of the keys with this count
+        self.runs = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.pos
+
+    def get(self, key):
+        ix = self.pos.get(key)
+        return 0 if ix is None else self.counts[ix]
+
+    def swap(self, i, j):
+        keys = self.keys
+        keys[i], keys[j] = keys[j], keys[i]
+        self.pos[keys[i]] = i
+        self.pos[keys[j]] = j
+
+    def add(self, key):
+        """Increments the count of the key"""
+        ix = self.pos.get(key)
+        if ix is None:
+            ix = len(self.keys)
+            self.keys.append(key)
+            self.counts.append(1)
+            self.pos[key] = ix
+            if 1 in self.runs:
+                self.runs[1][1] = ix
+            else:
+                self.runs[1] = [ix, ix]
+            return
+        count = self.counts[ix]
+        run = self.runs[count]
+        first = run[0]
+        self.swap(ix, first)
+        if first == run[1]:
+            del self.runs[count]
+        else:
+            run[0] = first + 1
+        self.counts[first] = count + 1
+        if count + 1 in self.runs:
+            self.runs[count + 1][1] = first
+        else:
+            self.runs[count + 1] = [first, first]
+
+    def discard(self, key):
+        """Decrements the count of the key, it is removed at 0"""
+        ix = self.pos.get(key)
+        if ix is None:
+            return
+        count = self.counts[ix]
+        run = self.runs[count]
+        last = run[1]
+        self.swap(ix, last)
+        if last == run[0]:
+            del self.runs[count]
+        else:
+            run[1] = last - 1
+        if count == 1:
+            # the smallest count is at the end
+            del self.pos[key]
+            self.keys.pop()
+            self.counts.pop()
+            return
+        self.counts[last] = count - 1
+        if count - 1 in self.runs:
+            self.runs[count - 1][0] = last
+        else:
+            self.runs[count - 1] = [last, last]
+
+    def top(self, k=None):
+        """[(key, count)] of the k biggest counts"""
+        return list(zip(self.keys[:k], self.counts[:k]))
+
+
+class TagStats:
+    """Numbers of notes with every tag and with every pair of tags"""
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+        self.counts = RankedCounter()
+        self.rows = defaultdict(RankedCounter)
+        # key -> set of the counted tag ids of the item
+        self.items = {}
+
+    def get_id(self, tag):
+        tag_id = self.ids.get(tag)
+        if tag_id is None:
+            tag_id = self.ids[tag] = len(self.names)
+            self.names.append(tag)
+        return tag_id
+
+    def update_pairs(self, changed, tags, update):
+        """Calls update(a, b) for every pair of the tags with a changed
+        one, both ways"""
+        for a in changed:
+            for b in tags:
+                if a != b and not (b in changed and b < a):
+                    update(self.rows[a], b)
+                    update(self.rows[b], a)
+
+    def update(self, key, tags):
+        """Sets tags of the item, empty ones remove it"""
+        old = self.items.pop(key, set())
+        new = {self.get_id(tag) for tag in tags}
+        if new:
+            self.items[key] = new
+        removed, added = old - new, new - old
+        self.update_pairs(removed, old, RankedCounter.discard)
+        for tag_id in removed:
+            self.counts.discard(tag_id)
+            if not self.rows[tag_id]:
+                del self.rows[tag_id]
+        self.update_pairs(added, new, RankedCounter.add)
+        for tag_id in added:
+            self.counts.add(tag_id)
+
+    def related(self, tags, k):
+        """k tags met most often with the tags, without them, O(k) for
+        one tag"""
+        ids = {self.ids[tag] for tag in tags if tag in self.ids}
+        scores = defaultdict(int)
+        for tag_id in ids:
+            row = self.rows.get(tag_id)
+            if row is None:
+                continue
+            # k + len(ids) are enough to skip the tags themselves
+            for other, count in row.top(k + len(ids)):
+                if not other in ids:
+                    scores[other] += count
+        best = nlargest(k, scores.items(), key=lambda item: item[1])
+        return [self.names[tag_id] for tag_id, _ in best]
+
+    def popular(self, k=None):
+        """Tags of the most notes first"""
+        return [self.names[tag_id] for tag_id, _ in self.counts.top(k)]
@@ -0,0 +1,171 @@
+from bisect import bisect_left, insort
+
+from BaseClasses import *
+
+
+class SeekText(Field):
+    """Where a sorted list starts: a prefix of a name, a date, a cursor"""
+
+    def validate(self, text: str):
+        text = " ".join(text.split())
+        if len(text) == 0:
+            raise ErrorWithMsg("Start can not be empty")
+        return text
+
+
+class SortedList:
+    """List kept sorted in sublists with a Fenwick tree of their lengths,
+    so seeks are O(log n)"""
+
+    LOAD = 1000
+
+    def __init__(self, items=()):
+        items = sorted(items)
+        load = SortedList.LOAD
+        self.lists = [items[i : i + load] for i in range(0, len(items), load)]
+        self.maxes = [sublist[-1] for sublist in self.lists]
+        self.len = len(items)
+        self.build_tree()
+
+    def __len__(self):
+        return self.len
+
+    def build_tree(self):
+        """Fenwick tree of lengths of the sublists, it is rebuilt only
+        when a sublist is split or removed"""
+        tree = [0] + [len(sublist) for sublist in self.lists]
+        for i in range(1, len(tree)):
+            j = i + (i & -i)
+            if j < len(tree):
+                tree[j] += tree[i]
+        self.tree = tree
+
+    def tree_add(self, ix, delta):
+        i = ix + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def get_position(self, ix):
+        """Number of items in the sublists before the sublist"""
+        position = 0
+        while ix > 0:
+            position += self.tree[ix]
+            ix -= ix & -ix
+        return position
+
+    def locate(self, index):
+        """Returns (sublist, position in it) of the item with the index"""
+        ix = 0
+        bit = 1 << (len(self.tree).bit_length() - 1)
+        while bit:
+            next_ix = ix + bit
+            if next_ix < len(self.tree) and self.tree[next_ix] <= index:
+                ix = next_ix
+                index -= self.tree[next_ix]
+            bit >>= 1
+        return ix, index
+
+    def add(self, item):
+        if not self.lists:
+            self.lists.append([item])
+            self.maxes.append(item)
+            self.len = 1
+            self.build_tree()
+            return
+        ix = min(bisect_left(self.maxes, item), len(self.lists) - 1)
+        sublist = self.lists[ix]
+        insort(sublist, item)
+        self.maxes[ix] = sublist[-1]
+        self.len += 1
+        if len(sublist) > 2 * SortedList.LOAD:
+            half = len(sublist) // 2
+            self.lists[ix : ix + 1] = [sublist[:half], sublist[half:]]
+            self.maxes[ix : ix + 1] = [sublist[half - 1], sublist[-1]]
+            self.build_tree()
+        else:
+            self.tree_add(ix, 1)
+
+    def remove(self, item):
+        ix = bisect_left(self.maxes, item)
+        if ix == len(self.maxes):
+            raise ValueError(f"{item!r} is not in list")
+        sublist = self.lists[ix]
+        pos = bisect_left(sublist, item)
+        if sublist[pos] != item:
+            raise ValueError(f"{item!r} is not in list")
+        del sublist[pos]
+        self.len -= 1
+        if sublist:
+            self.maxes[ix] = sublist[-1]
+            self.tree_add(ix, -1)
+        else:
+            del self.lists[ix]
+            del self.maxes[ix]
+            self.build_tree()
+
+    def bisect_left(self, item):
+        """Index of the first item which is not less than the item"""
+        ix = bisect_left(self.maxes, item)
+        if ix == len(self.maxes):
+            return self.len
+        return self.get_position(ix) + bisect_left(self.lists[ix], item)
+
+    def iter_from(self, index):
+        """Yields items starting from the index"""
+        if index >= self.len:
+            return
+        ix, pos = self.locate(index)
+        yield from self.lists[ix][pos:]
+        for ix in range(ix + 1, len(self.lists)):
+            yield from self.lists[ix]
+
+
+class SortedView:
+    """Keys of records in the order of sort_key(key, record), a tuple
+    ending with the key or None, a page is found by a seek"""
+
+    def __init__(self, sort_key, fields=("*",)):
+        self.sort_key = sort_key
+        # only changes of these fields move a record in the view
+        self.fields = fields
+        self.entries = SortedList()
+        self.keys = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def build(self, records):
+        self.keys = {}
+        for key, record in records.items():
+            sort_key = self.sort_key(key, record)
+            if sort_key is not None:
+                self.keys[key] = sort_key
+        self.entries = SortedList(self.keys.values())
+        return self
+
+    def is_changed_by(self, event):
+        return event.field == "*" or event.field in self.fields
+
+    def update(self, key, record):
+        """Moves the record to its place, None removes it"""
+        old = self.keys.pop(key, None)
+        if old is not None:
+            self.entries.remove(old)
+        new = None if record is None else self.sort_key(key, record)
+        if new is not None:
+            self.keys[key] = new
+            self.entries.add(new)
+
+    def page(self, start=None, offset=0, limit=None):
+        """Returns sort keys of a page which starts from the first entry not
+        less than the start (a prefix of a sort key) and the sort key
+        after the page or None"""
+        index = 0 if start is None else self.entries.bisect_left(start)
+        entries = self.entries.iter_from(index + offset)
+        page = []
+        for entry in entries:
+            if limit is not None and len(page) == limit:
+                return page, entry
+            page.append(entry)
+        return page, None
@@ -0,0 +1,61 @@
+"""Benchmarks of the assistant hot paths
+
+Run from the project root:
+    python -m benchmarks --contacts 100000 --notes 100000 -o new.json
+    python -m benchmarks --compare new.json   # exit code 1 on regression
+"""
+
+import argparse
+import json
+import sys
+
+from benchmarks.suite import Suite, compare
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--contacts", type=int, default=10000)
+    parser.add_argument("--notes", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--no-memory", action="store_true", help="skip tracemalloc peaks"
+    )
+    parser.add_argument(
+        "--only", nargs="*", help="run only cases containing these words"
+    )
+    parser.add_argument("-o", "--output", help="write JSON results to file")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="allowed slowdown against --compare (0.2 = 20%%)",
+    )
+    args = parser.parse_args(argv)
+
+    suite = Suite(args.contacts, args.notes, args.seed)
+    try:
+        results = suite.run(args.repeat, not args.no_memory, args.only)
+    finally:
+        suite.close()
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, old, new in regressions:
+            print(f"REGRESSION {name}: {old:.6f}s -> {new:.6f}s", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
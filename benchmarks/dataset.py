@@ -0,0 +1,86 @@
+"""Synthetic address books and notebooks for benchmarks"""
+
+import random
+from datetime import date, timedelta
+
+from Contacts import Address, Birthday, Contact, Email, Name, Phone
+from Notes import Note, Reminder, Tags, Text, Topic
+
+FIRST_NAMES = (
+    "Olena", "Taras", "Iryna", "Andrii", "Oksana", "Dmytro", "Nataliia",
+    "Serhii", "Yulia", "Maksym", "Sofiia", "Bohdan", "Anna", "Ivan",
+)
+STREETS = ("Shevchenka", "Franka", "Khreshchatyk", "Sadova", "Lesi Ukrainky")
+CITIES = ("Kyiv", "Lviv", "Odesa", "Kharkiv", "Dnipro", "Poltava")
+DOMAINS = ("gmail.com", "ukr.net", "example.com", "company.ua")
+WORDS = (
+    "meeting", "call", "project", "budget", "review", "plan", "idea",
+    "report", "deadline", "client", "release", "travel", "doctor", "gift",
+)
+
+BIRTHDAY_SHARE = 0.7
+ADDRESS_SHARE = 0.6
+EMAIL_SHARE = 0.8
+REMINDER_SHARE = 0.3
+NUM_OF_TAGS = 1000
+MAX_USER_TAGS = 4
+
+
+def make_contacts(num, seed=0):
+    """Returns dict name -> Contact with realistic share of empty fields"""
+    rnd = random.Random(seed)
+    today = date.today()
+    contacts = {}
+    for i in range(num):
+        name = f"{FIRST_NAMES[i % len(FIRST_NAMES)]}{i}"
+        phone = f"0{rnd.randrange(10**9):09}"
+        # fields skipped by the user are stored as None
+        email = None
+        if rnd.random() < EMAIL_SHARE:
+            email = Email(f"{name.lower()}@{rnd.choice(DOMAINS)}")
+        birthday = None
+        if rnd.random() < BIRTHDAY_SHARE:
+            # ages 1..90, days are spread over the whole year
+            born = today - timedelta(days=rnd.randrange(365, 90 * 365))
+            birthday = Birthday(born.strftime("%d.%m.%Y"))
+        address = None
+        if rnd.random() < ADDRESS_SHARE:
+            address = Address(
+                f"{rnd.choice(CITIES)}, {rnd.choice(STREETS)} {rnd.randrange(1, 200)}"
+            )
+        contacts[name] = Contact(
+            Name(name), Phone(phone), email, birthday, address
+        )
+    return contacts
+
+
+def make_notes(num, seed=0, words_per_note=30):
+    """Returns dict topic -> Note with Zipf-distributed text and user tags"""
+    rnd = random.Random(seed)
+    today = date.today()
+    notes = {}
+    vocabulary = list(range(NUM_OF_TAGS))
+    weights = [1 / (rank + 1) for rank in vocabulary]
+    for i in range(num):
+        topic = f"Topic{i}"
+        words = rnd.choices(WORDS, k=words_per_note)
+        for ix in rnd.choices(vocabulary, weights, k=rnd.randrange(3)):
+            words[rnd.randrange(len(words))] = f"#tag{ix}"
+        user_tags = [
+            f"tag{ix}"
+            for ix in rnd.choices(
+                vocabulary, weights, k=rnd.randrange(MAX_USER_TAGS + 1)
+            )
+        ]
+        reminder = None
+        if rnd.random() < REMINDER_SHARE:
+            # most of reminders are in the nearest weeks
+            days = int(rnd.expovariate(1 / 30)) - 7
+            reminder = Reminder((today + timedelta(days)).strftime("%d.%m.%Y"))
+        notes[topic] = Note(
+            Topic(topic),
+            Text(" ".join(words)),
+            Tags(" ".join(user_tags)),
+            reminder,
+        )
+    return notes
@@ -0,0 +1,93 @@
+"""Requests per second of HTTPFront
+
+Run from the project root: python -m benchmarks.http_rps [requests] [pipeline]
+Prints the result as JSON.
+"""
+
+import asyncio
+import json
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from Assistant import Assistant
+
+
+def make_request(cmd, body):
+    data = json.dumps(body).encode()
+    return (
+        f"POST /{cmd} HTTP/1.1\r\n"
+        "Host: localhost\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(data)}\r\n\r\n"
+    ).encode() + data
+
+
+async def read_response(reader):
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line == b"\r\n":
+            break
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+    return await reader.readexactly(length)
+
+
+async def send_requests(port, requests, pipeline):
+    """Sends requests over one keep-alive connection, pipeline at a time"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for i in range(0, len(requests), pipeline):
+        batch = requests[i : i + pipeline]
+        writer.write(b"".join(batch))
+        for _ in batch:
+            await read_response(reader)
+    writer.close()
+
+
+def bench(num_of_requests=10000, pipeline=16):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        assistant = Assistant(str(Path(tmp_dir) / "bench.data"))
+        front = assistant.items["http"]
+        front.port = 0
+        thread = threading.Thread(target=front.run, daemon=True)
+        thread.start()
+        front.started.wait()
+
+        setup = [
+            make_request("add-contact", {"name": f"Name{i}"})
+            for i in range(100)
+        ]
+        asyncio.run(send_requests(front.port, setup, pipeline))
+
+        results = {}
+        workloads = {
+            "find-contact": lambda i: {"name": f"Name{i % 100}"},
+            "add-phone": lambda i: {
+                "name": f"Name{i % 100}",
+                "phone": f"{i:010}",
+            },
+        }
+        for cmd, body in workloads.items():
+            requests = [
+                make_request(cmd, body(i)) for i in range(num_of_requests)
+            ]
+            start = time.perf_counter()
+            asyncio.run(send_requests(front.port, requests, pipeline))
+            elapsed = time.perf_counter() - start
+            results[cmd] = {
+                "requests": num_of_requests,
+                "pipeline": pipeline,
+                "seconds": round(elapsed, 4),
+                "rps": round(num_of_requests / elapsed),
+            }
+        front.stop()
+        thread.join()
+    return results
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    print(json.dumps(bench(*args), indent=2))
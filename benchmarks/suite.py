@@ -0,0 +1,166 @@
+"""Hot paths of the assistant measured on a synthetic store"""
+
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from rich.console import Console
+
+from Assistant import Assistant
+from BaseClasses import get_entries_for_next_x_days
+from CLIBot import CLI, CLIBot
+from benchmarks.dataset import make_contacts, make_notes
+
+
+def answers(*values):
+    """get_extra_data_from_user handler which answers with given values"""
+
+    def handler(
+        list_of_types,
+        list_of_prompts,
+        assert_validator=None,
+        mandatory_first_entry=True,
+        mandatory_all_entries=False,
+        completers=None,
+    ):
+        data = [None] * min(len(list_of_types), len(list_of_prompts))
+        for i, value in enumerate(values[: len(data)]):
+            if not value is None:
+                data[i] = list_of_types[i](value)
+        return data
+
+    return handler
+
+
+def consume(result):
+    """Renders lazy results of a command"""
+    if isinstance(result, str):
+        return result
+    return list(result)
+
+
+class Suite:
+    def __init__(self, num_of_contacts, num_of_notes, seed=0):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        filename = Path(self.tmp_dir.name) / "bench.data"
+        self.assistant = Assistant(str(filename))
+        self.contacts = self.assistant.items["contacts"]
+        self.notes = self.assistant.items["notes"]
+        self.contacts.set_from_file(make_contacts(num_of_contacts, seed))
+        self.notes.set_from_file(make_notes(num_of_notes, seed))
+        self.meta = {
+            "contacts": num_of_contacts,
+            "notes": num_of_notes,
+            "seed": seed,
+            "python": platform.python_version(),
+        }
+
+    def close(self):
+        self.tmp_dir.cleanup()
+
+    def sample(self, records, attr):
+        """Value of a field of a record in the middle of the store"""
+        values = list(records.values())
+        for record in values[len(values) // 2 :] + values:
+            field = getattr(record, attr)
+            if isinstance(field, list):
+                # labeled phones or e-mails
+                field = field[0][1] if field else None
+            if field and field.value:
+                return field.value
+        return None
+
+    def cmd(self, provider, cmd, *values):
+        return lambda: consume(provider.exe(cmd, [], answers(*values)))
+
+    def save(self):
+        # the file is removed to force a full save every time
+        self.assistant.filename.unlink(missing_ok=True)
+        self.assistant.save_all_to_file()
+
+    def print_all(self, cmd):
+        def run():
+            CLIBot.print_all(self.contacts.exe(cmd, [], answers()))
+
+        return run
+
+    def cases(self):
+        contacts, notes = self.contacts, self.notes
+        birthdays = contacts.repack_birthdays_for_search()
+        name = self.sample(contacts.data, "name")
+        tag = next(
+            (n.user_tags[0] for n in notes.data.values() if n.user_tags), "tag0"
+        )
+        yield "save_to_file", self.save
+        yield "load_from_file", self.assistant.load_from_file
+        yield "find-contact", self.cmd(contacts, "find-contact", name)
+        for field, attr in (
+            ("phone", "phones"),
+            ("email", "emails"),
+            ("birthday", "birthday"),
+            ("address", "address"),
+        ):
+            value = self.sample(contacts.data, attr)
+            yield f"find-{field}", self.cmd(contacts, f"find-{field}", value)
+        yield "find-note", self.cmd(notes, "find-note", "Topic0")
+        yield "find-tag", self.cmd(notes, "find-tag", tag)
+        yield "find-reminder", self.cmd(
+            notes, "find-reminder", self.sample(notes.data, "reminder")
+        )
+        yield "birthdays", self.cmd(contacts, "birthdays", "30")
+        yield "reminders", self.cmd(notes, "reminders", "30")
+        yield "get_entries_for_next_x_days", lambda: (
+            get_entries_for_next_x_days(birthdays, 7)
+        )
+        yield "contacts.welcome_message", contacts.welcome_message
+        yield "notes.welcome_message", notes.welcome_message
+        yield "all-contacts", self.cmd(contacts, "all-contacts")
+        yield "all-notes", self.cmd(notes, "all-notes")
+        yield "print_all all-contacts", self.print_all("all-contacts")
+
+    def measure(self, func, repeat=3, memory=True):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        result = {
+            "best": round(min(times), 6),
+            "mean": round(sum(times) / len(times), 6),
+        }
+        if memory:
+            tracemalloc.start()
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+            result["peak_kb"] = round(peak / 1024)
+            tracemalloc.stop()
+        return result
+
+    def run(self, repeat=3, memory=True, only=None):
+        # pages are printed to nowhere and "enter" is pressed for every page
+        cli_print, cli_input = CLI.print, CLI.input
+        results = {}
+        with open(os.devnull, "w") as devnull:
+            CLI.print = Console(file=devnull, height=50).print
+            CLI.input = lambda prompt="": ""
+            try:
+                for name, func in self.cases():
+                    if only and not any(p in name for p in only):
+                        continue
+                    results[name] = self.measure(func, repeat, memory)
+            finally:
+                CLI.print, CLI.input = cli_print, cli_input
+        return {"meta": dict(self.meta, repeat=repeat), "results": results}
+
+
+def compare(current, baseline, tolerance=0.2):
+    """Returns list of (case, baseline, current) which became slower"""
+    regressions = []
+    for name, result in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if old and result["best"] > old["best"] * (1 + tolerance):
+            regressions.append((name, old["best"], result["best"]))
+    return regressions
@@ -0,0 +1,86 @@
+"""Thin client of the assistant daemon
+
+~$ assistant daemon &
+~$ assistant-cmd find-contact name=Bob
+
+Forwards a command to the daemon over a Unix socket and prints the result.
+Only the standard library is imported here, so a call takes milliseconds.
+"""
+
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+
+SOCKET_ENV = "ASSISTANT_SOCKET"
+USAGE_MSG = "Usage: assistant-cmd <command> [field=value ...]"
+NOT_RUNNING_MSG = "Assistant daemon is not running (start it by 'assistant daemon')"
+
+
+def get_socket_path():
+    default = Path(__file__).parent / "assistant.sock"
+    return os.environ.get(SOCKET_ENV, str(default))
+
+
+def send_cmd(cmd, fields, socket_path=None):
+    """Returns HTTP status and decoded JSON answer of the daemon"""
+    body = json.dumps(fields).encode()
+    request = (
+        f"POST /{cmd} HTTP/1.1\r\n"
+        "Host: localhost\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n"
+    ).encode() + body
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path or get_socket_path())
+        sock.sendall(request)
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    head, _, body = b"".join(chunks).partition(b"\r\n\r\n")
+    status = int(head.split(maxsplit=2)[1])
+    return status, json.loads(body)
+
+
+def is_running(socket_path=None):
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path or get_socket_path())
+        return True
+    except OSError:
+        return False
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) == 0:
+        print(USAGE_MSG, file=sys.stderr)
+        return 2
+    cmd, fields = argv[0], {}
+    for arg in argv[1:]:
+        name, sep, value = arg.partition("=")
+        if not sep:
+            print(USAGE_MSG, file=sys.stderr)
+            return 2
+        fields[name] = value
+    try:
+        status, answer = send_cmd(cmd, fields)
+    except OSError:
+        print(NOT_RUNNING_MSG, file=sys.stderr)
+        return 2
+    if status != 200:
+        print(answer.get("error"), file=sys.stderr)
+        if "usage" in answer:
+            print(f"Expected format: {answer['usage']}", file=sys.stderr)
+        return 1
+    result = answer["result"]
+    print(result if isinstance(result, str) else "\n".join(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,12 @@
+import sys
 from Assistant import Assistant
 
 
 def main():
+    # assistant [cli_bot|http|all|daemon]
+    front_name = sys.argv[1] if len(sys.argv) > 1 else "cli_bot"
     assistant = Assistant("assistant.data")
-    assistant.run()
+    assistant.run(front_name)
     pass
 
 
@@ -4,6 +4,7 @@ import shutil
 
 project_name = "assistant"
 project_util = "assistant"
+project_client_util = "assistant-cmd"
 project_author = "PyPellasBand"
 project_description = "Personal assistant"
 project_url = "https://github.com/maximus-ms/project-pyfellas"
@@ -11,8 +12,24 @@ project_files = (
     "BaseClasses.py",
     "Assistant.py",
     "CLIBot.py",
+    "Books.py",
+    "Blobs.py",
     "Contacts.py",
+    "Duplicates.py",
+    "Views.py",
+    "Backup.py",
+    "Revisions.py",
+    "MinHash.py",
+    "TagStats.py",
+    "Links.py",
+    "Reminders.py",
+    "Search.py",
     "Notes.py",
+    "HTTPFront.py",
+    "Stats.py",
+    "Scheduler.py",
+    "Sync.py",
+    "client.py",
     "main.py",
 )
 project_main = "main.py"
@@ -30,7 +47,8 @@ setup(name='{project_name}',
       license='MIT',
       packages=['{packages}'],
       install_requires={required_packages},
-      entry_points={{'console_scripts': ['{project_util} = {project_name}.main:main']}})
+      entry_points={{'console_scripts': ['{project_util} = {project_name}.main:main',
+                                         '{project_client_util} = {project_name}.client:main']}})
 """
 
 
@@ -129,6 +147,7 @@ def make_setup_file(required_packages):
                 packages=project_name,
                 required_packages=required_packages,
                 project_util=project_util,
+                project_client_util=project_client_util,
             )
         )
 
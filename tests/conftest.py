@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# modules of the assistant are imported by their names
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from Assistant import Assistant
+
+
+@pytest.fixture
+def new_assistant(tmp_path):
+    """Returns a function which opens the assistant of a data file in
+    tmp_path, a new one loads what the previous one with the same name
+    saved"""
+
+    def new_assistant(name="assistant"):
+        path = tmp_path / name
+        path.mkdir(exist_ok=True)
+        return Assistant(str(path / "assistant.data"))
+
+    return new_assistant
+
+
+def exe(assistant, cmd, **body):
+    """Runs a command like a POST request, returns the result"""
+    status, answer = assistant.items["http"].exe_cmd(cmd, body)
+    assert status == 200, answer
+    return answer["result"]
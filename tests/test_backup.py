@@ -0,0 +1,25 @@
+from Backup import list_snapshots, restore_snapshot
+from conftest import exe
+
+
+def read_files(backup):
+    return {path.name: path.read_bytes() for path in backup.get_files()}
+
+
+def test_snapshot_is_restored(new_assistant, tmp_path):
+    assistant = new_assistant()
+    backup = assistant.items["backup"]
+    for i in range(200):
+        exe(assistant, "add-contact", name=f"Name{i}", phone=f"{i:010}")
+    first, _ = backup.take_snapshot()
+    saved = read_files(backup)
+    exe(assistant, "add-contact", name="Last", phone="0987654321")
+    second, snapshot = backup.take_snapshot()
+    # unchanged chunks are not written again
+    assert snapshot["written"] < snapshot["size"]
+    assert list(list_snapshots(backup.directory)) == [first, second]
+    files = restore_snapshot(backup.directory, first, tmp_path / "restored")
+    restored = {
+        name: (tmp_path / "restored" / name).read_bytes() for name in files
+    }
+    assert restored == saved
@@ -0,0 +1,67 @@
+from BaseClasses import ErrorWithMsg, Transaction
+from Contacts import Contact, Name
+from conftest import exe
+
+
+def get_names(assistant):
+    return sorted(assistant.books.active.cmd_providers["contacts"].data)
+
+
+def test_commit_is_journaled_and_replayed(new_assistant):
+    assistant = new_assistant()
+    exe(assistant, "add-contact", name="Alice", phone="0501234567")
+    book = assistant.books.active
+    assert book.journal_filename.exists()
+    # a crash: the journal is not merged into the data file
+    assert get_names(new_assistant()) == ["Alice"]
+
+
+def test_full_save_merges_the_journal(new_assistant):
+    assistant = new_assistant()
+    exe(assistant, "add-contact", name="Alice", phone="0501234567")
+    assert assistant.save_all_to_file() > 0
+    assert not assistant.books.active.journal_filename.exists()
+    assert assistant.save_all_to_file() == 0
+    assert get_names(new_assistant()) == ["Alice"]
+
+
+def test_replayed_journal_is_merged_by_the_next_full_save(new_assistant):
+    exe(new_assistant(), "add-contact", name="Alice", phone="0501234567")
+    assistant = new_assistant()
+    assert assistant.save_all_to_file() > 0
+    assert not assistant.books.active.journal_filename.exists()
+    assert get_names(new_assistant()) == ["Alice"]
+
+
+def test_commit_without_journal_is_saved(new_assistant):
+    assistant = new_assistant()
+    assistant.save_all_to_file()
+    contacts = assistant.books.active.cmd_providers["contacts"]
+    # a commit which nobody journaled is kept by the full save
+    with assistant.lock.write_lock(), Transaction(contacts):
+        contacts.touch("Bob")
+        contacts.data["Bob"] = Contact(Name("Bob"))
+    assert assistant.save_all_to_file() > 0
+    assert get_names(new_assistant()) == ["Bob"]
+
+
+def test_failed_command_is_rolled_back(new_assistant):
+    assistant = new_assistant()
+    exe(assistant, "add-contact", name="Alice", phone="0501234567")
+    contacts = assistant.books.active.cmd_providers["contacts"]
+    journal = assistant.books.active.journal_filename
+    journal_size = journal.stat().st_size
+    try:
+        with assistant.lock.write_lock(), Transaction(
+            contacts, assistant.save_to_file
+        ):
+            contacts.touch("Alice")
+            contacts.touch("Bob")
+            del contacts.data["Alice"]
+            contacts.data["Bob"] = Contact(Name("Bob"))
+            raise ErrorWithMsg("failed")
+    except ErrorWithMsg:
+        pass
+    assert get_names(assistant) == ["Alice"]
+    assert journal.stat().st_size == journal_size
+    assert get_names(new_assistant()) == ["Alice"]
@@ -0,0 +1,58 @@
+import pytest
+
+from BaseClasses import ErrorWithMsg
+
+
+def get_providers(assistant):
+    providers = assistant.books.active.cmd_providers
+    return providers["contacts"], providers["notes"]
+
+
+def test_bulk_changes_survive_a_restart(new_assistant):
+    assistant = new_assistant()
+    contacts, notes = get_providers(assistant)
+    save = assistant.save_to_file
+    with assistant.lock.write_lock():
+        contacts.bulk_upsert(
+            [
+                {"name": "Alice", "phone": "0501234567"},
+                {"name": "Bob", "birthday": "01.02.1990"},
+            ],
+            save,
+        )
+        notes.bulk_upsert([{"topic": "Plan", "text": "Buy milk"}], save)
+    # the journal keeps them after a crash
+    contacts, notes = get_providers(new_assistant())
+    assert sorted(contacts.data) == ["Alice", "Bob"]
+    assert notes.data["Plan"].text.value == "Buy milk"
+
+    assistant = new_assistant()
+    contacts, notes = get_providers(assistant)
+    save = assistant.save_to_file
+    with assistant.lock.write_lock():
+        contacts.bulk_set_field("address", {"Alice": "Kyiv"}, save)
+        contacts.bulk_delete(["Bob"], save)
+    assistant.save_all_to_file()
+    contacts, _ = get_providers(new_assistant())
+    assert sorted(contacts.data) == ["Alice"]
+    assert contacts.data["Alice"].address.value == "Kyiv"
+
+
+def test_invalid_batch_changes_nothing(new_assistant):
+    assistant = new_assistant()
+    contacts, _ = get_providers(assistant)
+    rows = [
+        {"name": "Alice", "phone": "0501234567"},
+        {"name": "Bob", "phone": "12"},
+    ]
+    with pytest.raises(ErrorWithMsg, match="1 invalid"):
+        contacts.bulk_upsert(rows, assistant.save_to_file)
+    assert len(contacts.data) == 0
+    assert not assistant.books.active.journal_filename.exists()
+
+
+def test_bulk_changes_need_a_save_handler(new_assistant):
+    contacts, _ = get_providers(new_assistant())
+    with pytest.raises(ErrorWithMsg):
+        contacts.bulk_upsert([{"name": "Alice"}], None)
+    assert len(contacts.data) == 0
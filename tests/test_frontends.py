@@ -0,0 +1,157 @@
+import threading
+
+import requests
+
+from CLIBot import CLI, CLIBot
+from conftest import exe
+
+
+def test_cli_asks_without_the_lock(new_assistant, monkeypatch):
+    assistant = new_assistant()
+    cli = assistant.items["cli_bot"]
+    answers = iter(["Alice", "0501234567", "", "", ""])
+
+    def arg_input(prompt, words=None):
+        if prompt.plain == "Phone: ":
+            # another frontend adds the name while the user is typing
+            thread = threading.Thread(
+                target=exe,
+                args=(assistant, "add-contact"),
+                kwargs={"name": "Alice", "phone": "0670000000"},
+            )
+            thread.start()
+            thread.join(5)
+            assert not thread.is_alive()
+        return next(answers)
+
+    monkeypatch.setattr(cli, "arg_input", arg_input)
+    result = cli.exe_cmd("add-contact", [])
+    assert "already exists" in str(result)
+    contacts = assistant.books.active.cmd_providers["contacts"]
+    assert contacts.data["Alice"].phones[0][1].value.endswith("670000000")
+
+
+def start_http(front):
+    thread = threading.Thread(target=front.run, daemon=True)
+    thread.start()
+    assert front.started.wait(5)
+    return thread
+
+
+def test_http_serves_while_a_command_waits_for_the_lock(new_assistant):
+    assistant = new_assistant()
+    front = assistant.items["http"]
+    front.port = 0
+    thread = start_http(front)
+    url = f"http://{front.host}:{front.port}/"
+    try:
+        with assistant.lock.write_lock():
+            waiting = threading.Thread(
+                target=requests.post,
+                args=(url + "add-contact",),
+                kwargs={"json": {"name": "Alice", "phone": "0501234567"}},
+            )
+            waiting.start()
+            # the list of commands does not need the lock
+            assert requests.get(url, timeout=5).status_code == 200
+            assert waiting.is_alive()
+        waiting.join(5)
+        answer = requests.post(url + "all-contacts", timeout=5).json()
+        assert "Alice" in "\n".join(answer["result"])
+    finally:
+        front.stop()
+        thread.join(5)
+    assert not thread.is_alive()
+    # the loop is closed now
+    front.stop()
+
+
+def test_http_stop_after_a_failed_start(new_assistant):
+    assistant = new_assistant()
+    front = assistant.items["http"]
+    front.unix_socket = "/nonexistent/dir/assistant.sock"
+    errors = []
+
+    def run():
+        try:
+            front.run()
+        except OSError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join(5)
+    assert errors
+    front.stop()
+
+
+def test_cli_deletes_tags_of_the_asked_note(new_assistant, monkeypatch):
+    assistant = new_assistant()
+    exe(assistant, "add-note", topic="T", text="Text", tags="a b")
+    exe(assistant, "add-note", topic="Other", text="Text", tags="a")
+    cli = assistant.items["cli_bot"]
+    answers = iter(["T", "a"])
+
+    def arg_input(prompt, words=None):
+        if prompt.plain == "Tag(s): ":
+            # other frontends read and change notes while the user types
+            exe(assistant, "find-note", topic="Other")
+            exe(assistant, "add-tag", topic="T", tags="c")
+        return next(answers)
+
+    monkeypatch.setattr(cli, "arg_input", arg_input)
+    result = cli.exe_cmd("delete-tag", [])
+    assert "removed" in str(result)
+    notes = new_assistant().books.active.cmd_providers["notes"]
+    assert notes.data["T"].user_tags == ["b", "c"]
+    assert notes.data["Other"].user_tags == ["a"]
+    exe(assistant, "delete-tag", topic="Other", tags="a")
+    notes = new_assistant().books.active.cmd_providers["notes"]
+    assert notes.data["Other"].user_tags == []
+
+
+def test_cli_renders_pages_under_the_lock(new_assistant, monkeypatch):
+    assistant = new_assistant()
+    writer = threading.Thread(
+        target=exe,
+        args=(assistant, "add-contact"),
+        kwargs={"name": "Alice", "phone": "0501234567"},
+    )
+    # errors are not raised out of the pager
+    waits = []
+
+    def lines():
+        writer.start()
+        writer.join(0.2)
+        # the page is rendered, the change waits
+        waits.append(writer.is_alive())
+        for i in range(1000):
+            yield f"line {i}"
+
+    def wait_for_key(prompt):
+        # the user reads the page, the change is done
+        writer.join(5)
+        waits.append(writer.is_alive())
+        return "q"
+
+    monkeypatch.setattr(CLI, "input", wait_for_key)
+    CLIBot.print_all(lines(), lock=assistant.lock)
+    assert waits == [True, False]
+    assert "Alice" in "\n".join(exe(assistant, "all-contacts"))
+
+
+def test_frontends_share_validators(new_assistant):
+    assistant = new_assistant()
+    check = lambda value: None
+    for name in ("cli_bot", "http"):
+        front = assistant.items[name]
+        assert front.get_validators(check, 0) == []
+        assert front.get_validators(check, 2) == [check, None]
+        assert front.get_validators([None, check], 3) == [None, check, None]
+
+
+def test_book_in_use_is_shared_by_frontends(new_assistant):
+    assistant = new_assistant()
+    assert "all frontends" in exe(assistant, "use", book="work")
+    books = assistant.items["cli_bot"].exe_cmd("books", [])
+    assert "* work" in "\n".join(books)
@@ -0,0 +1,40 @@
+from datetime import date, datetime, timedelta
+
+from conftest import exe
+
+
+def get_day(days):
+    return (date.today() + timedelta(days=days)).strftime("%d.%m.%Y")
+
+
+def test_reminders_follow_changes_of_notes(new_assistant):
+    assistant = new_assistant()
+    exe(assistant, "add-note", topic="Call", text="Call Bob")
+    exe(assistant, "add-note", topic="Trip", reminder=get_day(-40))
+    assert "No reminders" in exe(assistant, "reminders", days="7")
+    exe(assistant, "add-reminder", topic="Call", reminder=get_day(3))
+    assert "Call Bob" in "\n".join(exe(assistant, "reminders", days="7"))
+    exe(assistant, "repeat-reminder", topic="Trip", repeat="daily")
+    exe(assistant, "delete-reminder", topic="Call")
+    found = "\n".join(exe(assistant, "reminders", days="7"))
+    assert "Trip" in found and not "Call" in found
+
+
+def test_find_reminder_reads_only_matching_notes(new_assistant):
+    assistant = new_assistant()
+    exe(assistant, "add-note", topic="Once", reminder=get_day(3))
+    exe(assistant, "add-note", topic="Daily", reminder=get_day(-5))
+    exe(assistant, "repeat-reminder", topic="Daily", repeat="daily")
+    exe(assistant, "add-note", topic="Monthly", reminder=get_day(-400))
+    exe(assistant, "repeat-reminder", topic="Monthly", repeat="monthly")
+    exe(assistant, "add-note", topic="None", text="No reminder")
+    notes = assistant.books.active.cmd_providers["notes"]
+    for days in range(-10, 40):
+        day = date.today() + timedelta(days=days)
+        found = exe(assistant, "find-reminder", reminder=get_day(days))
+        found = "\n".join(found) if isinstance(found, list) else ""
+        for topic, note in notes.data.items():
+            start = datetime.combine(day, datetime.min.time())
+            end = start + timedelta(days=1)
+            expected = any(note.reminder_occurrences(start, end))
+            assert (f"Topic: {topic}" in found) == expected, (topic, day)
@@ -0,0 +1,54 @@
+import random
+
+from BaseClasses import Field
+from Notes import Text
+from Revisions import MAX_CHAIN, add_revision, get_revision, iter_revisions
+from conftest import exe
+
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa".split()
+
+
+def get_texts(num, seed=0):
+    rnd = random.Random(seed)
+    words = rnd.choices(WORDS, k=50)
+    texts = []
+    for _ in range(num):
+        ix = rnd.randrange(len(words))
+        action = rnd.randrange(3)
+        if action == 0:
+            words.insert(ix, rnd.choice(WORDS))
+        elif action == 1 and len(words) > 1:
+            del words[ix]
+        else:
+            words[ix] = rnd.choice(WORDS)
+        texts.append(" ".join(words))
+    return texts
+
+
+def test_every_revision_is_restored():
+    texts = get_texts(3 * MAX_CHAIN)
+    history = ()
+    for old, new in zip(texts, texts[1:]):
+        history = add_revision(history, Text(old), new)
+    current = texts[-1]
+    # long chains are cut by keyframes
+    assert any(isinstance(data, Field) for _, data in history)
+    for number in range(1, len(history) + 1):
+        assert get_revision(history, number, current) == texts[number - 1]
+    revisions = [text for _, _, text in iter_revisions(history, current)]
+    assert revisions == texts[-2::-1]
+
+
+def test_revert_is_saved(new_assistant):
+    assistant = new_assistant()
+    texts = get_texts(5, seed=1)
+    exe(assistant, "add-note", topic="Plan", text=texts[0])
+    for text in texts[1:]:
+        exe(assistant, "edit-note", topic="Plan", text=text)
+    exe(assistant, "note-revert", topic="Plan", revision="2")
+    notes = new_assistant().books.active.cmd_providers["notes"]
+    note = notes.data["Plan"]
+    assert note.text.value == texts[1]
+    # the revert is a revision itself
+    assert get_revision(note.history, 5, note.text.value) == texts[4]
+    assert get_revision(note.history, 1, note.text.value) == texts[0]
@@ -0,0 +1,18 @@
+from conftest import exe
+
+
+def test_search_follows_changes_in_all_loaded_books(new_assistant):
+    assistant = new_assistant()
+    exe(assistant, "add-contact", name="Smith", phone="0501234567")
+    exe(assistant, "add-note", topic="Smithy", text="Visit the smith")
+    assert len(exe(assistant, "search", text="smith")) == 2
+    exe(assistant, "use", book="work")
+    exe(assistant, "add-contact", name="Smithson", phone="0671234567")
+    found = exe(assistant, "search", text="smith")
+    # an exact word ranks before prefixes, other books are labeled
+    assert len(found) == 3
+    assert "[default/contacts] Name: Smith," in found[0]
+    assert "[contacts] Name: Smithson," in found[2]
+    exe(assistant, "delete-contact", name="Smithson")
+    assert len(exe(assistant, "search", text="smith")) == 2
+    assert len(exe(assistant, "search", text="050123")) == 1
@@ -0,0 +1,56 @@
+from conftest import exe
+
+
+def get_contacts(assistant):
+    return assistant.books.active.cmd_providers["contacts"].data
+
+
+def get_address(assistant, name):
+    address = get_contacts(assistant)[name].address
+    return address.value if address else None
+
+
+def test_three_way_merge(new_assistant, tmp_path):
+    sync_file = str(tmp_path / "book.sync")
+    a, b = new_assistant("a"), new_assistant("b")
+    exe(a, "add-contact", name="Alice", phone="0501234567")
+    exe(a, "add-contact", name="Bob", phone="0507654321")
+    exe(a, "sync", file=sync_file)
+    exe(b, "sync", file=sync_file)
+    assert sorted(get_contacts(b)) == ["Alice", "Bob"]
+
+    # changes of one side are taken, changes of both sides are kept
+    exe(a, "add-address", name="Alice", address="Kyiv")
+    exe(b, "delete-contact", name="Bob")
+    exe(b, "add-contact", name="Carol", phone="0671112233")
+    exe(b, "sync", file=sync_file)
+    exe(a, "sync", file=sync_file)
+    exe(b, "sync", file=sync_file)
+    for assistant in (a, b):
+        assert sorted(get_contacts(assistant)) == ["Alice", "Carol"]
+        assert get_address(assistant, "Alice") == "Kyiv"
+
+    # a record changed on both sides is a conflict, the local one is kept
+    exe(a, "edit-address", name="Alice", address="Lviv")
+    exe(b, "edit-address", name="Alice", address="Odesa")
+    exe(a, "sync", file=sync_file)
+    result = "\n".join(exe(b, "sync", file=sync_file))
+    assert "Conflict in contacts 'Alice', kept local" in result
+    assert get_address(a, "Alice") == "Lviv"
+    assert get_address(b, "Alice") == "Odesa"
+
+
+def test_synced_book_is_indexed_when_it_is_loaded(new_assistant, tmp_path):
+    sync_file = str(tmp_path / "book.sync")
+    a = new_assistant("a")
+    exe(a, "add-contact", name="Alice", phone="0501234567")
+    assert a.sync.indexes == {}
+    exe(a, "sync", file=sync_file)
+    a.save_all_to_file()
+    a = new_assistant("a")
+    index = a.sync.indexes[("default", "contacts")]
+    # commits keep the index up to date
+    exe(a, "add-contact", name="Bob", phone="0507654321")
+    assert sum(map(len, index.buckets)) == 2
+    result = exe(a, "sync", file=sync_file)
+    assert result[1] == "  contacts: 0 received, 1 sent, 0 conflict(s)"